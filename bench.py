@@ -0,0 +1,396 @@
+"""Load-test bot.py against a local fake Bot API.
+
+Starts a stand-in for api.telegram.org (records calls, adds latency, injects 429s),
+runs the real application against it, replays a synthetic mix of /start, button
+presses, screenshot uploads and admin /approve, and reports throughput, latency
+percentiles and memory growth:
+
+    python bench.py --updates 10000 --users 2000 --mode both
+    python bench.py --mode polling --api-latency 50 --flood-rate 0.01
+
+Nothing is sent to Telegram; the fake API listens on --api-port.
+"""
+import io
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import logging
+import argparse
+import subprocess
+from collections import Counter, deque
+
+import httpx
+import tornado.web
+import tornado.httpserver
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+BOT_TOKEN = '123456:BENCH'
+ADMIN_ID = 1
+USER_BASE = 10_000_000
+BOT_USER = {'id': 123456, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+
+
+class FakeBotAPI:
+    """Just enough of the Bot API for bot.py: canned results, optional latency and 429s."""
+
+    def __init__(self, latency: float, flood_rate: float, seed: int):
+        self.latency = latency
+        self.flood_rate = flood_rate
+        self.random = random.Random(seed)
+        self.calls = Counter()
+        self.floods = 0
+        self.updates = deque()
+        self.new_updates = asyncio.Event()
+        self.images = {}
+        self.message_id = 0
+        self.webhook = {'url': ''}
+
+    def app(self) -> tornado.web.Application:
+        return tornado.web.Application([
+            (r'/bot[^/]+/(\w+)', BotMethodHandler, {'api': self}),
+            (r'/file/bot[^/]+/(.+)', FileHandler, {'api': self}),
+        ])
+
+    def push(self, update: dict) -> None:
+        self.updates.append(update)
+        self.new_updates.set()
+
+    async def get_updates(self, params: dict) -> list:
+        offset = int(params.get('offset') or 0)
+        while self.updates and self.updates[0]['update_id'] < offset:
+            self.updates.popleft()
+        if not self.updates:
+            self.new_updates.clear()
+            try:
+                await asyncio.wait_for(self.new_updates.wait(), min(float(params.get('timeout') or 0), 1.0))
+            except (asyncio.TimeoutError, asyncio.CancelledError):  # cancelled when the bot stops polling
+                return []
+        return list(self.updates)[:int(params.get('limit') or 100)]
+
+    def message(self, chat_id) -> dict:
+        self.message_id += 1
+        return {
+            'message_id': self.message_id, 'date': int(time.time()), 'from': BOT_USER,
+            'chat': {'id': int(chat_id or ADMIN_ID), 'type': 'private'},
+        }
+
+    def image(self, name: str) -> bytes:
+        if name not in self.images:
+            if Image is None:
+                self.images[name] = b'\x89PNG\r\n\x1a\n' + name.encode()
+            else:
+                buffer = io.BytesIO()
+                Image.frombytes('L', (32, 32), self.random.randbytes(32 * 32)).save(buffer, 'PNG')
+                self.images[name] = buffer.getvalue()
+        return self.images[name]
+
+
+class BotMethodHandler(tornado.web.RequestHandler):
+    def initialize(self, api: FakeBotAPI) -> None:
+        self.api = api
+
+    async def post(self, method: str) -> None:
+        api = self.api
+        api.calls[method] += 1
+        if self.request.headers.get('Content-Type', '').startswith('application/json'):
+            params = json.loads(self.request.body or b'{}')
+        else:
+            params = {key: values[0].decode() for key, values in self.request.body_arguments.items()}
+
+        if method == 'getUpdates':
+            self.write({'ok': True, 'result': await api.get_updates(params)})
+            return
+        if api.latency:
+            await asyncio.sleep(api.latency)
+        if method not in ('getMe', 'getWebhookInfo', 'setWebhook', 'deleteWebhook') and api.random.random() < api.flood_rate:
+            api.floods += 1
+            self.set_status(429)
+            self.write({
+                'ok': False, 'error_code': 429, 'description': 'Too Many Requests: retry after 1',
+                'parameters': {'retry_after': 1},
+            })
+            return
+
+        if method == 'getMe':
+            result = {**BOT_USER, 'can_join_groups': True, 'can_read_all_group_messages': False,
+                      'supports_inline_queries': False}
+        elif method == 'getFile':
+            file_id = params.get('file_id', 'file')
+            result = {'file_id': file_id, 'file_unique_id': file_id, 'file_size': 2048,
+                      'file_path': f'photos/{file_id}.png'}
+        elif method == 'getWebhookInfo':
+            result = {**api.webhook, 'has_custom_certificate': False, 'pending_update_count': 0}
+        elif method == 'setWebhook':
+            allowed = params.get('allowed_updates')
+            api.webhook = {'url': params.get('url', ''),
+                           'allowed_updates': json.loads(allowed) if isinstance(allowed, str) else allowed}
+            result = True
+        elif method in ('sendMessage', 'editMessageText', 'copyMessage'):
+            result = api.message(params.get('chat_id'))
+            if method == 'copyMessage':
+                result = {'message_id': result['message_id']}
+        elif method in ('sendPhoto', 'sendDocument'):
+            result = api.message(params.get('chat_id'))
+            result['photo'] = [{'file_id': 'bench-photo', 'file_unique_id': 'bench-photo', 'width': 32, 'height': 32}]
+        else:
+            result = True
+        self.write({'ok': True, 'result': result})
+
+
+class FileHandler(tornado.web.RequestHandler):
+    def initialize(self, api: FakeBotAPI) -> None:
+        self.api = api
+
+    async def get(self, path: str) -> None:
+        self.api.calls['fileDownload'] += 1
+        self.write(self.api.image(path))
+
+
+class UpdateStream:
+    """Synthetic updates: each kind is picked by weight; /approve targets users who sent a screenshot."""
+
+    CALLBACKS = ('how', 'sub:tier3', 'tips', 'cancel', 'upl:tier3')
+
+    def __init__(self, users: int, mix: dict, seed: int):
+        self.users = users
+        self.kinds = list(mix)
+        self.weights = [mix[kind] for kind in self.kinds]
+        self.random = random.Random(seed)
+        self.update_id = 0
+        self.screenshots = []
+        self.seen = set()
+
+    def _user(self, user_id: int) -> dict:
+        return {'id': user_id, 'is_bot': False, 'first_name': f'u{user_id}', 'username': f'u{user_id}',
+                'language_code': 'en'}
+
+    def _message(self, user_id: int, **fields) -> dict:
+        self.update_id += 1
+        return {
+            'message_id': self.update_id, 'date': int(time.time()), 'from': self._user(user_id),
+            'chat': {'id': user_id, 'type': 'private'}, **fields,
+        }
+
+    def _command(self, user_id: int, text: str) -> dict:
+        command = text.split()[0]
+        return self._message(user_id, text=text, entities=[{'type': 'bot_command', 'offset': 0, 'length': len(command)}])
+
+    def next(self) -> tuple:
+        kind = self.random.choices(self.kinds, self.weights)[0]
+        user_id = USER_BASE + self.random.randrange(self.users)
+        self.seen.add(user_id)
+        if kind == 'approve' and self.screenshots:
+            message = self._command(ADMIN_ID, f'/approve {self.random.choice(self.screenshots)}')
+        elif kind == 'screenshot':
+            self.screenshots.append(user_id)
+            file_id = f'shot{self.update_id}'
+            message = self._message(user_id, photo=[
+                {'file_id': file_id, 'file_unique_id': file_id, 'width': 32, 'height': 32, 'file_size': 2048},
+            ])
+        elif kind == 'callback':
+            message = self._message(user_id, text='menu')
+            message['from'] = BOT_USER
+            return kind, {'update_id': self.update_id, 'callback_query': {
+                'id': str(self.update_id), 'from': self._user(user_id), 'chat_instance': str(user_id),
+                'message': message, 'data': self.random.choice(self.CALLBACKS),
+            }}
+        else:
+            kind = 'start'
+            message = self._command(user_id, '/start')
+        return kind, {'update_id': self.update_id, 'message': message}
+
+
+def _percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def _rss() -> int:
+    """Resident set size in bytes (Linux); falls back to peak RSS elsewhere."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+async def run(args) -> dict:
+    os.environ.update({
+        'TELEGRAM_BOT_TOKEN': BOT_TOKEN,
+        'ADMIN_ID': str(ADMIN_ID),
+        'TELEGRAM_API_URL': f'http://127.0.0.1:{args.api_port}',
+        'PORT': str(args.port),
+        'STORAGE_BACKEND': args.storage,
+        'DATABASE_PATH': args.database,
+        'DUPLICATE_REPORT_DELAY': '0',
+    })
+    if args.mode == 'webhook':
+        os.environ['WEBHOOK_URL'] = f'http://127.0.0.1:{args.port}'
+    else:
+        os.environ.pop('WEBHOOK_URL', None)
+    if args.storage == 'sqlite':
+        for path in (args.database, f'{args.database}.sessions.journal', f'{args.database}.sessions.snapshot'):
+            if os.path.exists(path):
+                os.remove(path)
+
+    import bot
+    logging.getLogger().setLevel(logging.INFO if args.verbose else logging.ERROR)
+    if not args.verbose:
+        logging.getLogger('telegram').setLevel(logging.CRITICAL)
+
+    api = FakeBotAPI(args.api_latency / 1000, args.flood_rate, args.seed)
+    api_server = tornado.httpserver.HTTPServer(api.app())
+    api_server.listen(args.api_port, '127.0.0.1')
+
+    application = bot.build_application()
+    injected, finished, handler_times = {}, [], []
+    done = asyncio.Event()
+
+    def timed(callback):
+        async def wrapper(update, context):
+            started = time.perf_counter()
+            try:
+                return await callback(update, context)
+            finally:
+                handler_times.append(time.perf_counter() - started)
+        return wrapper
+
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            handler.callback = timed(handler.callback)
+
+    process_update = application.process_update
+
+    async def tracked(update):
+        try:
+            await process_update(update)
+        finally:
+            sent = injected.pop(getattr(update, 'update_id', None), None)
+            if sent is not None:
+                finished.append(time.perf_counter() - sent)
+                if len(finished) == args.updates:
+                    done.set()
+
+    application.process_update = tracked
+
+    stop = asyncio.Event()
+    serving = asyncio.create_task(bot._serve(application, stop))
+    while not application.running:
+        await asyncio.sleep(0.05)
+
+    stream = UpdateStream(args.users, args.mix, args.seed)
+    kinds = Counter()
+    rss_before = _rss()
+    started = time.perf_counter()
+    async with httpx.AsyncClient(limits=httpx.Limits(max_connections=args.concurrency)) as client:
+        slots = asyncio.Semaphore(args.concurrency)
+
+        async def post(update: dict) -> None:
+            async with slots:
+                await client.post(f'http://127.0.0.1:{args.port}/{BOT_TOKEN}', json=update, timeout=30)
+
+        posts = []
+        for _ in range(args.updates):
+            kind, update = stream.next()
+            kinds[kind] += 1
+            injected[update['update_id']] = time.perf_counter()
+            if args.mode == 'webhook':
+                posts.append(asyncio.create_task(post(update)))
+            else:
+                api.push(update)
+            if args.rate:
+                await asyncio.sleep(1 / args.rate)
+        await asyncio.gather(*posts)
+        try:
+            await asyncio.wait_for(done.wait(), args.timeout)
+        except asyncio.TimeoutError:
+            pass
+    elapsed = time.perf_counter() - started
+    rss_after = _rss()
+
+    stop.set()
+    await serving
+    api_server.stop()
+
+    return {
+        'mode': args.mode,
+        'storage': args.storage,
+        'updates': args.updates,
+        'processed': len(finished),
+        'elapsed_s': round(elapsed, 2),
+        'throughput_per_s': round(len(finished) / elapsed, 1) if elapsed else 0.0,
+        'e2e_p50_ms': round(_percentile(finished, 0.50) * 1000, 2),
+        'e2e_p99_ms': round(_percentile(finished, 0.99) * 1000, 2),
+        'handler_p50_ms': round(_percentile(handler_times, 0.50) * 1000, 2),
+        'handler_p99_ms': round(_percentile(handler_times, 0.99) * 1000, 2),
+        'users': len(stream.seen),
+        'rss_growth_mb_per_10k_users': round((rss_after - rss_before) / 2**20 / max(len(stream.seen), 1) * 10_000, 2),
+        'mix': dict(kinds),
+        'api_calls': dict(api.calls.most_common()),
+        'injected_429s': api.floods,
+    }
+
+
+def _print_report(result: dict) -> None:
+    print(f"\n== {result['mode']} ({result['storage']}) ==")
+    for key, value in result.items():
+        if key not in ('mode', 'storage'):
+            print(f"  {key:<30} {value}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--mode', choices=('webhook', 'polling', 'both'), default='both')
+    parser.add_argument('--updates', type=int, default=5000)
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--mix', default='start=40,callback=30,screenshot=20,approve=10',
+                        help='weights per update kind (start, callback, screenshot, approve)')
+    parser.add_argument('--rate', type=float, default=0, help='updates per second to inject; 0 = as fast as possible')
+    parser.add_argument('--concurrency', type=int, default=64, help='parallel webhook POSTs')
+    parser.add_argument('--api-latency', type=float, default=0, help='fake Bot API latency in ms')
+    parser.add_argument('--flood-rate', type=float, default=0, help='fraction of API calls answered with 429')
+    parser.add_argument('--storage', choices=('memory', 'sqlite'), default='memory')
+    parser.add_argument('--database', default='bench.db')
+    parser.add_argument('--port', type=int, default=18443)
+    parser.add_argument('--api-port', type=int, default=18081)
+    parser.add_argument('--timeout', type=float, default=300, help='give up waiting for updates after N seconds')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    parser.add_argument('--verbose', action='store_true')
+    args = parser.parse_args()
+    args.mix = {kind: float(weight) for kind, weight in (item.split('=') for item in args.mix.split(','))}
+
+    if args.mode == 'both':
+        # Separate processes: bot.py keeps module-level state and memory numbers must not mix
+        results = []
+        for mode in ('webhook', 'polling'):
+            argv = [arg for arg in sys.argv[1:] if not arg.startswith('--mode=')]
+            if '--mode' in argv:
+                del argv[argv.index('--mode'):argv.index('--mode') + 2]
+            output = subprocess.run(
+                [sys.executable, __file__, *argv, '--mode', mode, '--json'],
+                check=True, capture_output=True, text=True,
+            ).stdout
+            results.append(json.loads(output.strip().splitlines()[-1]))
+    else:
+        results = [asyncio.run(run(args))]
+
+    for result in results:
+        if args.json:
+            print(json.dumps(result))
+        else:
+            _print_report(result)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,49 @@
+import io
 import os
+import gzip
+import shutil
+import tempfile
+import re
+import html
+import hmac
+import json
+import base64
+import time
+BOOT_STARTED = time.perf_counter()  # the startup timing log measures from here
+import signal
+import string
+import hashlib
+import sqlite3
+import asyncio
+import heapq
+import bisect
 import logging
-from datetime import datetime
+import weakref
+import uuid
+import functools
+import importlib
+import contextlib
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+import tornado.web
+import tornado.httpserver
 from dotenv import load_dotenv
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, BotCommand
+from telegram import (
+    Update, InlineKeyboardButton, InlineKeyboardMarkup, BotCommand, InputMediaDocument, InputMediaPhoto,
+)
+from telegram.error import BadRequest, Forbidden, RetryAfter, TelegramError
+from telegram.request import BaseRequest, HTTPXRequest
 from telegram.ext import (
     Application,
+    ApplicationHandlerStop,
+    BasePersistence,
+    PersistenceInput,
     CommandHandler,
     MessageHandler,
     CallbackQueryHandler,
+    TypeHandler,
     ContextTypes,
     filters,
 )
@@ -21,19 +57,75 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+
+# Optional dependencies load on first use rather than at startup: Pillow (perceptual hashing;
+# exact duplicate matching works without it), pytesseract (OCR) and redis (STORAGE_BACKEND=redis)
+@functools.cache
+def _optional_module(name: str):
+    try:
+        return importlib.import_module(name)
+    except ImportError:
+        return None
+
+
 # Env
 BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
 WEBHOOK_URL = os.getenv('WEBHOOK_URL')  # e.g. https://mybot-1-vovk.onrender.com
 PORT = int(os.getenv('PORT', '10000'))
-ADMIN_ID = os.getenv('ADMIN_ID')
+ADMIN_ID = os.getenv('ADMIN_ID')  # the owner: every permission, and system notices (reports, dead letters)
+ADMIN_IDS = os.getenv('ADMIN_IDS', '')  # more admins, e.g. "123:reviewer,456:owner" (role defaults to reviewer)
 
 if not BOT_TOKEN:
     raise ValueError('TELEGRAM_BOT_TOKEN not found in environment variables')
 
-# In-memory storage
-users_db = {}
-pending_payments = {}
-pending_game_targets = {}
+# Admins and roles
+ROLE_PERMISSIONS = {
+    'owner': {'review', 'deliver', 'broadcast', 'manage'},
+    'reviewer': {'review', 'deliver'},  # approve/reject payments and send games
+}
+ADMINS = {}  # telegram id -> role, in dispatch order
+for _item in filter(None, ADMIN_IDS.split(',')):
+    _admin, _, _role = _item.strip().partition(':')
+    if (_role or 'reviewer') not in ROLE_PERMISSIONS:
+        raise ValueError(f'Unknown admin role in ADMIN_IDS: {_role}')
+    ADMINS[int(_admin)] = _role or 'reviewer'
+if ADMIN_ID:
+    ADMINS[int(ADMIN_ID)] = 'owner'
+ADMIN_DISPATCH = os.getenv('ADMIN_DISPATCH', 'least_loaded')  # or round_robin
+ADMIN_CLAIM_LEASE = float(os.getenv('ADMIN_CLAIM_LEASE', '900'))  # seconds a payment stays with the admin handling it
+CALLBACK_SECRET = os.getenv('CALLBACK_SECRET')  # signs admin buttons; derived from the bot token if unset
+
+# Bot API client
+TELEGRAM_API_URL = os.getenv('TELEGRAM_API_URL', 'https://api.telegram.org').rstrip('/')  # e.g. a local fake for benchmarks
+TELEGRAM_POOL_SIZE = int(os.getenv('TELEGRAM_POOL_SIZE', '256'))  # outbound connections kept open to the Bot API
+TELEGRAM_POOL_TIMEOUT = float(os.getenv('TELEGRAM_POOL_TIMEOUT', '5'))  # wait for a free connection before failing
+TELEGRAM_TIMEOUT = float(os.getenv('TELEGRAM_TIMEOUT', '10'))  # connect/read/write, unless set per method below
+TELEGRAM_HTTP_VERSION = os.getenv('TELEGRAM_HTTP_VERSION', '1.1')  # '2' multiplexes; needs python-telegram-bot[http2]
+# Per-method read/write timeouts, overridable as TELEGRAM_METHOD_TIMEOUTS="sendPhoto=90,answerCallbackQuery=2"
+TELEGRAM_METHOD_TIMEOUTS = {
+    'sendPhoto': 60.0,
+    'sendDocument': 60.0,
+    'sendMediaGroup': 60.0,
+    'fileDownload': 60.0,
+    'answerCallbackQuery': 3.0,
+}
+for _item in filter(None, os.getenv('TELEGRAM_METHOD_TIMEOUTS', '').split(',')):
+    _method, _seconds = _item.split('=')
+    TELEGRAM_METHOD_TIMEOUTS[_method.strip()] = float(_seconds)
+
+# Storage backend
+STORAGE_BACKEND = os.getenv('STORAGE_BACKEND', 'sqlite')  # sqlite, memory or redis
+DATABASE_PATH = os.getenv('DATABASE_PATH', 'bot.db')
+REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+REDIS_PREFIX = os.getenv('REDIS_PREFIX', 'bot:')
+REDIS_LOCK_TIMEOUT = float(os.getenv('REDIS_LOCK_TIMEOUT', '30'))
+SHARED_PERSISTENCE_INTERVAL = float(os.getenv('SHARED_PERSISTENCE_INTERVAL', '1'))
+SQLITE_COMMIT_INTERVAL = float(os.getenv('SQLITE_COMMIT_INTERVAL', '0.05'))
+# Conversation state (PTB user_data) with STORAGE_BACKEND=sqlite: <path>.snapshot plus <path>.journal
+SESSION_STATE_PATH = os.getenv('SESSION_STATE_PATH') or f'{DATABASE_PATH}.sessions'
+SESSION_FLUSH_INTERVAL = float(os.getenv('SESSION_FLUSH_INTERVAL', '1'))  # how often PTB hands over changed user_data
+SESSION_JOURNAL_MAX = int(os.getenv('SESSION_JOURNAL_MAX', '5000'))  # journal records before compacting into a snapshot
+LEGACY_DATA_FILE = os.getenv('LEGACY_DATA_FILE')  # JSON dump of the old in-memory dicts
 
 # Config
 PAYMENT_METHOD = os.getenv('PAYMENT_METHOD', 'TELECEL CASH/VODAFONE CASH')
@@ -41,517 +133,4469 @@ PAYMENT_NUMBER = os.getenv('PAYMENT_NUMBER', '0503013078')
 PAYMENT_NAME = os.getenv('PAYMENT_NAME', 'Emmanuel Kwaku Kyere')
 BOT_OWNER = os.getenv('BOT_OWNER', 'PRO AI TIPSTER')
 PAYSTACK_LINK = os.getenv('PAYSTACK_LINK', 'https://paystack.shop/pay/gar9gazycx')
+PAYSTACK_SECRET_KEY = os.getenv('PAYSTACK_SECRET_KEY')
+PAYSTACK_WEBHOOK_PATH = os.getenv('PAYSTACK_WEBHOOK_PATH', '/paystack/webhook')
 
 # Only one plan
 SUBSCRIPTION_TIERS = {
     'tier3': {'price': 100, 'odds': 10, 'name': '10 Odds'}
 }
 
+# Message templates: optional JSON overriding tiers and texts per locale, reloaded when it changes
+TEMPLATES_FILE = os.getenv('TEMPLATES_FILE')
+TEMPLATES_RELOAD_INTERVAL = float(os.getenv('TEMPLATES_RELOAD_INTERVAL', '10'))
+DEFAULT_LOCALE = os.getenv('DEFAULT_LOCALE', 'en')
+DEFAULT_TIER = 'tier3'
 
-async def _set_bot_commands(app: Application) -> None:
-    commands = [
-        BotCommand("start", "Open main menu"),
-        BotCommand("pay", "Pay with Paystack"),
-        BotCommand("status", "View your status"),
-        BotCommand("tips", "Get today's tips"),
-        BotCommand("help", "Help and info"),
-    ]
-    await app.bot.set_my_commands(commands)
+# Subscriptions: a plan lasts SUBSCRIPTION_DAYS (or the tier's 'days') and carries the tier's odds as credits
+SUBSCRIPTION_DAYS = float(os.getenv('SUBSCRIPTION_DAYS', '30'))
+SUBSCRIPTION_CHECK_INTERVAL = float(os.getenv('SUBSCRIPTION_CHECK_INTERVAL', '300'))
+SUBSCRIPTION_EXPIRY_BATCH = int(os.getenv('SUBSCRIPTION_EXPIRY_BATCH', '500'))
 
+# Broadcast limits (Telegram allows ~30 msg/s overall and ~1 msg/s per chat)
+BROADCAST_GLOBAL_RATE = float(os.getenv('BROADCAST_GLOBAL_RATE', '30'))
+BROADCAST_CHAT_RATE = float(os.getenv('BROADCAST_CHAT_RATE', '1'))
+BROADCAST_WORKERS = int(os.getenv('BROADCAST_WORKERS', '8'))
+BROADCAST_MAX_RETRIES = int(os.getenv('BROADCAST_MAX_RETRIES', '3'))
+BROADCAST_TARGET = 'broadcast'
 
-# Commands
-async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    user = update.effective_user
-    user_id = user.id
+# Outbound queue: notifications and one-off deliveries are stored first, then sent (and retried) by workers
+OUTBOX_WORKERS = int(os.getenv('OUTBOX_WORKERS', '8'))
+OUTBOX_MAX_ATTEMPTS = int(os.getenv('OUTBOX_MAX_ATTEMPTS', '6'))  # failures before a job is dead-lettered
+OUTBOX_RETRY_BASE = float(os.getenv('OUTBOX_RETRY_BASE', '5'))  # seconds before the first retry; doubles each time
+OUTBOX_RETRY_MAX = float(os.getenv('OUTBOX_RETRY_MAX', '900'))
+OUTBOX_LEASE = float(os.getenv('OUTBOX_LEASE', '120'))  # a claimed job is retried after this if its worker died
+OUTBOX_POLL_INTERVAL = float(os.getenv('OUTBOX_POLL_INTERVAL', '5'))
+OUTBOX_KEEP = float(os.getenv('OUTBOX_KEEP', '86400'))  # sent jobs are kept this long so duplicates are dropped
 
-    if user_id not in users_db:
-        users_db[user_id] = {
-            'username': user.username or user.first_name,
-            'is_premium': False,
-            'tips_received': 0,
-            'joined_date': datetime.now().isoformat(),
-            'pending_payment': None,
-        }
-        if str(user_id) == str(ADMIN_ID):
-            await update.message.reply_html(
-                "<b>👋 Welcome Admin!</b>\n\n"
-                "You are now set up to receive payment screenshots and notifications.\n\n"
-                "Commands:\n/pending, /approve [user_id], /test"
-            )
+# Scheduled tip releases (needs python-telegram-bot[job-queue])
+RELEASE_TIMEZONE = ZoneInfo(os.getenv('RELEASE_TIMEZONE', 'Africa/Accra'))
+RELEASE_WAVE_SIZE = int(os.getenv('RELEASE_WAVE_SIZE', '300'))  # recipients per wave; progress is saved between waves
+RELEASE_MISSED_GRACE = float(os.getenv('RELEASE_MISSED_GRACE', '21600'))  # still release this many seconds late
+RELEASE_TARGET_PREFIX = 'release:'
+RELEASE_HISTORY = 20
 
-    keyboard = [
-        [InlineKeyboardButton("💳 Pay with Paystack", url=PAYSTACK_LINK)],
-        [InlineKeyboardButton("💳 100 GHS - 10 Odds", callback_data='subscribe_tier3')],
-        [InlineKeyboardButton("ℹ️ How It Works", callback_data='how_it_works')],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
+# Admin pending queue
+PENDING_PAGE_SIZE = int(os.getenv('PENDING_PAGE_SIZE', '5'))
+BULK_APPROVE_CONCURRENCY = int(os.getenv('BULK_APPROVE_CONCURRENCY', '20'))
 
-    await update.message.reply_html(
-        f"<b>Welcome to {BOT_OWNER}! 🎲</b>\n\n"
-        f"Hi {user.mention_html()}!\n\n"
-        f"<b>Available Plan:</b>\n💰 100 GHS - 10 Odds\n\n"
-        f"<b>Features:</b>\n"
-        f"✅ Daily betting odds\n✅ Expert analysis\n✅ Multiple sports covered\n✅ High accuracy predictions\n\n"
-        f"Subscribe now to unlock premium tips!",
-        reply_markup=reply_markup,
-    )
+# Duplicate screenshot detection
+DUPLICATE_HASH_DISTANCE = int(os.getenv('DUPLICATE_HASH_DISTANCE', '6'))  # max differing bits of 64
+DUPLICATE_REPORT_DELAY = float(os.getenv('DUPLICATE_REPORT_DELAY', '30'))
+SCREENSHOT_MAX_DOWNLOAD = int(os.getenv('SCREENSHOT_MAX_DOWNLOAD', str(10 * 1024 * 1024)))
 
+# Albums: each photo of an album arrives as its own update, sharing a media_group_id
+MEDIA_GROUP_DELAY = float(os.getenv('MEDIA_GROUP_DELAY', '1.5'))  # seconds of quiet before an album is complete
 
-async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    help_text = (
-        f"<b>{BOT_OWNER} - Help</b>\n\n"
-        "<b>Commands:</b>\n"
-        "/start, /pay, /status, /tips, /help\n\n"
-        "<b>Available Plan:</b>\n💰 100 GHS - 10 Odds\n\n"
-        "<b>How to subscribe:</b>\n"
-        "1. Open /start\n"
-        "2. Tap 'Pay with Paystack' or pay via MoMo\n"
-        f"3. MOMO Number: {PAYMENT_NUMBER}\n"
-        "4. Send screenshot if you didn't use Paystack\n"
-        "5. Wait for approval and receive your odds\n\n"
-        "<b>Contact Support:</b> Reply with 'support'"
-    )
-    await update.message.reply_html(help_text)
+# OCR pre-verification of MoMo screenshots (needs pytesseract and the tesseract binary)
+OCR_ENABLED = os.getenv('OCR_ENABLED', 'false').lower() in ('1', 'true', 'yes')
+OCR_WORKERS = int(os.getenv('OCR_WORKERS', '1'))
+OCR_VERIFIED_THRESHOLD = float(os.getenv('OCR_VERIFIED_THRESHOLD', '0.7'))
+OCR_AUTO_APPROVE = float(os.getenv('OCR_AUTO_APPROVE', '0'))  # confidence to approve without the admin; 0 = off
 
+# Update processing: different users run in parallel, one user's updates run in order
+UPDATE_CONCURRENCY = int(os.getenv('UPDATE_CONCURRENCY', '16'))  # handlers running at once
+UPDATE_MAX_PENDING = int(os.getenv('UPDATE_MAX_PENDING', '1024'))  # updates accepted (running or waiting)
 
-async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    user_id = update.effective_user.id
-    if user_id not in users_db:
-        await update.message.reply_text("Please use /start first to initialize your account.")
-        return
+# Flood protection: per-user token buckets by kind of update, as burst/seconds (the bucket holds
+# `burst` updates and refills completely over `seconds`); admins are exempt.
+# Overridable as RATE_LIMITS="upload=12/120,command=8/20"
+RATE_LIMITS = {
+    'command': (8, 20),
+    'callback': (20, 20),
+    'upload': (12, 120),  # an album is up to 10 files
+    'message': (10, 20),
+}
+for _item in filter(None, os.getenv('RATE_LIMITS', '').split(',')):
+    _kind, _limit = _item.split('=')
+    _burst, _seconds = _limit.split('/')
+    RATE_LIMITS[_kind.strip()] = (int(_burst), float(_seconds))
+RATE_LIMIT_USERS = int(os.getenv('RATE_LIMIT_USERS', '10000'))  # users tracked; least recently seen are forgotten
+RATE_LIMIT_STRIKES = int(os.getenv('RATE_LIMIT_STRIKES', '5'))  # dropped updates within the window that earn a mute
+RATE_LIMIT_WINDOW = float(os.getenv('RATE_LIMIT_WINDOW', '60'))
+RATE_LIMIT_MUTE = float(os.getenv('RATE_LIMIT_MUTE', '300'))  # first mute; each further one doubles
+RATE_LIMIT_BAN_AFTER = int(os.getenv('RATE_LIMIT_BAN_AFTER', '3'))  # mutes in a row that turn into a ban
+RATE_LIMIT_BAN = float(os.getenv('RATE_LIMIT_BAN', '86400'))  # also how long past mutes are remembered
 
-    user = users_db[user_id]
-    status = "✅ Premium" if user['is_premium'] else "❌ Free"
-    message = (
-        f"<b>Your Account Status</b>\n\n"
-        f"Status: {status}\n"
-        f"Tips Received: {user['tips_received']}\n"
-        f"Joined: {user['joined_date'][:10]}\n"
-    )
+# Metrics (Prometheus text format, served on the webhook server)
+METRICS_PATH = os.getenv('METRICS_PATH', '/metrics')
 
-    if not user['is_premium']:
-        keyboard = [
-            [InlineKeyboardButton("💳 Pay with Paystack", url=PAYSTACK_LINK)],
-            [InlineKeyboardButton("🔔 Subscribe Now", callback_data='subscribe_tier3')],
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.message.reply_html(message, reply_markup=reply_markup)
-    else:
-        await update.message.reply_html(message)
+# Analytics: append-only event log (one JSONL file per day) and per-day counters for /stats
+EVENTS_DIR = os.getenv('EVENTS_DIR') or os.path.join(os.path.dirname(os.path.abspath(DATABASE_PATH)), 'events')
+EVENTS_FLUSH_INTERVAL = float(os.getenv('EVENTS_FLUSH_INTERVAL', '5'))
+EVENTS_KEEP_DAYS = int(os.getenv('EVENTS_KEEP_DAYS', '365'))
+EXPORT_MAX_BYTES = int(os.getenv('EXPORT_MAX_BYTES', str(49 * 1024 * 1024)))  # Bot API upload limit is 50 MB
 
+# Health probes: liveness answers as soon as the HTTP server listens, readiness once updates are handled
+HEALTH_PATH = os.getenv('HEALTH_PATH', '/healthz')
+READY_PATH = os.getenv('READY_PATH', '/readyz')  # point Render's healthCheckPath here
 
-async def tips_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    user_id = update.effective_user.id
-    if user_id not in users_db:
-        await update.message.reply_text("Please use /start first to initialize your account.")
-        return
 
-    user = users_db[user_id]
-    if not user['is_premium']:
-        keyboard = [
-            [InlineKeyboardButton("💳 Pay with Paystack", url=PAYSTACK_LINK)],
-            [InlineKeyboardButton("🔔 Subscribe", callback_data='subscribe_tier3')],
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await update.message.reply_html(
-            "<b>Premium Content</b>\n\n"
-            "Subscribe to get access to today's betting tips!\n\n"
-            "Our premium members receive:\n"
-            "🎯 Daily expert predictions\n"
-            "📊 Detailed analysis\n"
-            "💰 High-value betting opportunities",
-            reply_markup=reply_markup,
-        )
-        return
+# Storage
+def _new_user(tg_user, pending_payment=None) -> dict:
+    return {
+        'username': tg_user.username or tg_user.first_name,
+        'is_premium': False,
+        'tips_received': 0,
+        'joined_date': datetime.now().isoformat(),
+        'pending_payment': pending_payment,
+    }
 
-    await update.message.reply_html(
-        "<b>🎯 Premium Tips Delivery</b>\n\n"
-        "Your odds will be sent to you as an image by the admin shortly.\n\n"
-        f"If you haven't received it, reply with 'support' to contact {BOT_OWNER}."
-    )
 
+def _pending_created_at(entry: dict) -> float:
+    """Index key of a pending entry. Entries saved before `created_at` existed fall back to their display
+    timestamp, or 0 if it's missing or unreadable: never the clock, or the key would change between calls."""
+    if entry.get('created_at') is not None:
+        return float(entry['created_at'])
+    try:
+        return datetime.strptime(entry.get('timestamp') or '', '%Y-%m-%d %H:%M:%S').timestamp()
+    except (TypeError, ValueError):
+        return 0.0
 
-async def pay_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    keyboard = [
-        [InlineKeyboardButton("💳 Pay with Paystack", url=PAYSTACK_LINK)],
-        [InlineKeyboardButton("💳 100 GHS - 10 Odds", callback_data='subscribe_tier3')],
-    ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await update.message.reply_html(
-        "<b>Secure Payment</b>\n\n"
-        "Tap the button below to pay with Paystack.\n\n"
-        "If you pay via mobile money directly, please send a screenshot for verification.",
-        reply_markup=reply_markup,
-    )
 
+def _stamp_created_at(entry: dict) -> dict:
+    """Copy of a pending entry with its numeric `created_at` fixed at the first save."""
+    entry = dict(entry)
+    if entry.get('created_at') is None:
+        entry['created_at'] = _pending_created_at(entry) or float(int(time.time()))
+    return entry
 
-async def menu_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    keyboard = [
-        [InlineKeyboardButton("💳 Pay with Paystack", url=PAYSTACK_LINK)],
-        [InlineKeyboardButton("💳 100 GHS - 10 Odds", callback_data='subscribe_tier3')],
-        [InlineKeyboardButton("ℹ️ How It Works", callback_data='how_it_works')],
+
+def _pending_media(entry: dict) -> list:
+    """Payloads for every screenshot in a pending entry; single uploads only carry photo_id/document_id."""
+    if entry.get('media'):
+        return entry['media']
+    if entry.get('photo_id'):
+        return [{'type': 'photo', 'file_id': entry['photo_id']}]
+    return [{'type': 'document', 'file_id': entry['document_id']}]
+
+
+class KeyedLocks:
+    """asyncio locks keyed by name; a lock is dropped once nobody holds or waits for it."""
+
+    def __init__(self):
+        self._locks = {}  # key -> [lock, users]
+
+    @contextlib.asynccontextmanager
+    async def __call__(self, key):
+        slot = self._locks.setdefault(key, [asyncio.Lock(), 0])
+        slot[1] += 1
+        try:
+            async with slot[0]:
+                yield
+        finally:
+            slot[1] -= 1
+            if not slot[1]:
+                del self._locks[key]
+
+
+class MemoryStorage:
+    """Process-local storage. Everything is lost on restart; useful for local runs."""
+
+    def __init__(self):
+        self.users = {}
+        self.pending = {}
+        self.pending_index = []  # sorted (created_at, user_id) keys
+        self.compose_targets = {}
+        self.meta = {}
+        self.processed_payments = set()
+        self.screenshots = {}  # (file_unique_id, user_id) -> phash
+        self.screenshot_log = []
+        self.expiry_heap = []  # (expires_at, user_id); stale entries are skipped when popped
+        self.indexed_expiry = {}  # user_id -> expires_at last pushed
+        self.outbox = {}  # key -> outbound job
+        self.outbox_heap = []  # (due, key); stale entries are skipped when popped
+        self.lock = KeyedLocks()
+
+    async def open(self) -> None:
+        pass
+
+    async def flush(self) -> None:
+        pass
+
+    async def close(self) -> None:
+        pass
+
+    async def get_user(self, user_id: int):
+        user = self.users.get(user_id)
+        return dict(user) if user else None
+
+    async def save_user(self, user_id: int, user: dict) -> None:
+        self.users[user_id] = dict(user)
+        expires = user.get('subscription_expires')
+        if user.get('is_premium') and expires and self.indexed_expiry.get(user_id) != expires:
+            self.indexed_expiry[user_id] = expires
+            heapq.heappush(self.expiry_heap, (expires, user_id))
+
+    async def premium_user_ids(self) -> list:
+        return [uid for uid, user in self.users.items() if user.get('is_premium')]
+
+    async def expiring_user_ids(self, before: float, limit: int) -> list:
+        """Premium users whose subscription ends at or before `before`, soonest first."""
+        ids = []
+        while self.expiry_heap and self.expiry_heap[0][0] <= before and len(ids) < limit:
+            expires, uid = heapq.heappop(self.expiry_heap)
+            user = self.users.get(uid)
+            if self.indexed_expiry.get(uid) != expires or not user or not user.get('is_premium'):
+                continue
+            del self.indexed_expiry[uid]
+            ids.append(uid)
+        return ids
+
+    async def get_pending(self, user_id: int):
+        entry = self.pending.get(user_id)
+        return dict(entry) if entry else None
+
+    async def save_pending(self, user_id: int, entry: dict) -> None:
+        entry = _stamp_created_at(entry)
+        self._unindex_pending(user_id)
+        self.pending[user_id] = entry
+        bisect.insort(self.pending_index, (_pending_created_at(entry), user_id))
+
+    def _unindex_pending(self, user_id: int) -> None:
+        if user_id in self.pending:
+            key = (_pending_created_at(self.pending[user_id]), user_id)
+            idx = bisect.bisect_left(self.pending_index, key)
+            if idx < len(self.pending_index) and self.pending_index[idx] == key:
+                del self.pending_index[idx]
+
+    async def delete_pending(self, user_id: int):
+        self._unindex_pending(user_id)
+        return self.pending.pop(user_id, None)
+
+    async def page_pending(self, limit: int, cursor=None, backward=False, inclusive=False,
+                           tier=None, created_before=None, min_confidence=None) -> list:
+        keys = self.pending_index
+        if backward:
+            end = len(keys) if cursor is None else (
+                bisect.bisect_right(keys, cursor) if inclusive else bisect.bisect_left(keys, cursor))
+            indexes = range(end - 1, -1, -1)
+        else:
+            start = 0 if cursor is None else (
+                bisect.bisect_left(keys, cursor) if inclusive else bisect.bisect_right(keys, cursor))
+            indexes = range(start, len(keys))
+        page = []
+        for idx in indexes:
+            created_at, uid = keys[idx]
+            if created_before is not None and created_at > created_before:
+                if backward:
+                    continue
+                break
+            entry = self.pending[uid]
+            if entry.get('status', 'pending') != 'pending' or (tier and entry.get('tier') != tier):
+                continue
+            if min_confidence is not None and (entry.get('confidence') or 0) < min_confidence:
+                continue
+            page.append((uid, dict(entry)))
+            if len(page) == limit:
+                break
+        return page[::-1] if backward else page
+
+    async def pending_stats(self) -> tuple:
+        """(number of pending payments, created_at of the oldest or None)."""
+        return len(self.pending_index), self.pending_index[0][0] if self.pending_index else None
+
+    async def pending_load(self) -> dict:
+        """Pending payments assigned to each admin."""
+        load = {}
+        for entry in self.pending.values():
+            if entry.get('assignee'):
+                load[entry['assignee']] = load.get(entry['assignee'], 0) + 1
+        return load
+
+    async def clear_pending(self) -> None:
+        self.pending.clear()
+        self.pending_index.clear()
+
+    async def get_compose_target(self, admin_id: str):
+        return self.compose_targets.get(admin_id)
+
+    async def set_compose_target(self, admin_id: str, target) -> None:
+        self.compose_targets[admin_id] = target
+
+    async def clear_compose_target(self, admin_id: str) -> None:
+        self.compose_targets.pop(admin_id, None)
+
+    async def save_screenshot(self, file_unique_id: str, user_id: int, phash) -> None:
+        if (file_unique_id, user_id) not in self.screenshots and phash is not None:
+            self.screenshot_log.append((phash, user_id))
+        self.screenshots[(file_unique_id, user_id)] = phash
+
+    async def find_screenshot_users(self, file_unique_id: str) -> list:
+        return [uid for (fuid, uid) in self.screenshots if fuid == file_unique_id]
+
+    async def screenshot_hashes(self, cursor=None) -> tuple:
+        """Hashes recorded since `cursor`, plus the cursor to continue from."""
+        start = cursor or 0
+        return self.screenshot_log[start:], len(self.screenshot_log)
+
+    async def payment_processed(self, reference: str) -> bool:
+        return reference in self.processed_payments
+
+    async def mark_payment_processed(self, reference: str, user_id: int) -> bool:
+        if reference in self.processed_payments:
+            return False
+        self.processed_payments.add(reference)
+        return True
+
+    async def enqueue_outbound(self, job: dict) -> bool:
+        """Queue an outbound job; False if a job with the same key was already queued, sent or dead-lettered."""
+        if job['key'] in self.outbox:
+            return False
+        await self.save_outbound(job)
+        return True
+
+    async def save_outbound(self, job: dict) -> None:
+        self.outbox[job['key']] = dict(job)
+        if job['status'] == 'queued':
+            heapq.heappush(self.outbox_heap, (job['due'], job['key']))
+
+    async def claim_outbound(self, now: float, lease: float, limit: int) -> list:
+        """Due jobs, soonest first. Each is pushed back by `lease` so it is retried if its worker dies."""
+        jobs = []
+        while self.outbox_heap and self.outbox_heap[0][0] <= now and len(jobs) < limit:
+            due, key = heapq.heappop(self.outbox_heap)
+            job = self.outbox.get(key)
+            if not job or job['status'] != 'queued' or job['due'] != due:
+                continue
+            job['due'] = now + lease
+            heapq.heappush(self.outbox_heap, (job['due'], key))
+            jobs.append(dict(job))
+        return jobs
+
+    async def outbound_stats(self) -> dict:
+        counts = {}
+        for job in self.outbox.values():
+            counts[job['status']] = counts.get(job['status'], 0) + 1
+        return counts
+
+    async def dead_outbound(self, limit: int) -> list:
+        dead = sorted((job for job in self.outbox.values() if job['status'] == 'dead'), key=lambda j: j['updated_at'])
+        return [dict(job) for job in dead[:limit]]
+
+    async def purge_outbound(self, before: float) -> int:
+        keys = [key for key, job in self.outbox.items() if job['status'] == 'sent' and job['updated_at'] < before]
+        for key in keys:
+            del self.outbox[key]
+        return len(keys)
+
+    async def get_meta(self, key: str, default=None):
+        return self.meta.get(key, default)
+
+    async def set_meta(self, key: str, value) -> None:
+        self.meta[key] = value
+
+    async def reset(self) -> None:
+        self.users.clear()
+        await self.clear_pending()
+        self.compose_targets.clear()
+        self.expiry_heap.clear()
+        self.indexed_expiry.clear()
+
+
+class SQLiteStorage:
+    """SQLite backend in WAL mode.
+
+    All queries run on a single background thread so handlers never block the event
+    loop. Writes are group-committed: every write inside a SQLITE_COMMIT_INTERVAL
+    window shares one transaction (and one fsync). Nothing is preloaded on open.
+    """
+
+    # Each entry upgrades the schema by one version (PRAGMA user_version)
+    MIGRATIONS = [
+        """
+        CREATE TABLE users (
+            user_id INTEGER PRIMARY KEY,
+            is_premium INTEGER NOT NULL DEFAULT 0,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX idx_users_premium ON users (is_premium, user_id);
+        CREATE TABLE pending_payments (
+            user_id INTEGER PRIMARY KEY,
+            status TEXT NOT NULL,
+            tier TEXT,
+            created_at REAL NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX idx_pending_status_created ON pending_payments (status, created_at);
+        CREATE TABLE compose_targets (admin_id TEXT PRIMARY KEY, target TEXT NOT NULL);
+        CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        """,
+        """
+        CREATE TABLE processed_payments (
+            reference TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            processed_at REAL NOT NULL
+        );
+        """,
+        """
+        CREATE INDEX idx_pending_status_tier_created ON pending_payments (status, tier, created_at);
+        """,
+        """
+        CREATE TABLE screenshots (
+            file_unique_id TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            phash INTEGER,
+            created_at REAL NOT NULL,
+            PRIMARY KEY (file_unique_id, user_id)
+        );
+        """,
+        """
+        ALTER TABLE pending_payments ADD COLUMN confidence REAL;
+        """,
+        """
+        ALTER TABLE users ADD COLUMN expires_at REAL;
+        CREATE INDEX idx_users_premium_expires ON users (is_premium, expires_at);
+        """,
+        """
+        CREATE TABLE outbox (
+            key TEXT PRIMARY KEY,
+            status TEXT NOT NULL,
+            due REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            data TEXT NOT NULL
+        );
+        CREATE INDEX idx_outbox_status_due ON outbox (status, due);
+        """,
+        """
+        ALTER TABLE pending_payments ADD COLUMN assignee INTEGER;
+        CREATE INDEX idx_pending_assignee ON pending_payments (assignee);
+        """,
     ]
-    reply_markup = InlineKeyboardMarkup(keyboard)
-    await update.message.reply_html(
-        f"<b>Welcome to {BOT_OWNER}! 🎲</b>\n\n"
-        f"<b>Available Plan:</b>\n"
-        f"💰 100 GHS - 10 Odds\n\n",
-        reply_markup=reply_markup,
-    )
 
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = None
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='sqlite')
+        self._commit_task = None
+        self._dirty = False
+        self.lock = KeyedLocks()
 
-async def refreshcommands_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    app = context.application
-    try:
-        await _set_bot_commands(app)
-        await update.message.reply_text("✅ Commands refreshed. Open the side menu to see them.")
-    except Exception as e:
-        await update.message.reply_text(f"❌ Failed to refresh commands: {e}")
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
 
+    def _connect(self) -> None:
+        conn = sqlite3.connect(self.path, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA busy_timeout=5000')
+        version = conn.execute('PRAGMA user_version').fetchone()[0]
+        for number, script in enumerate(self.MIGRATIONS[version:], version + 1):
+            conn.executescript(script)
+            conn.execute(f'PRAGMA user_version={number}')
+            logger.info(f"Storage schema migrated to v{number}")
+        conn.commit()
+        self._conn = conn
 
-# Admin utilities
-async def clear_pending_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    user_id = update.effective_user.id
-    if not ADMIN_ID or str(user_id) != str(ADMIN_ID):
-        await update.message.reply_text("This command is for admin only.")
-        return
-    pending_payments.clear()
-    await update.message.reply_text("✅ Cleared all pending payments.")
+    async def open(self) -> None:
+        await self._run(self._connect)
 
+    async def flush(self) -> None:
+        if self._dirty:
+            self._dirty = False
+            await self._run(self._conn.commit)
 
-async def reset_data_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    user_id = update.effective_user.id
-    if not ADMIN_ID or str(user_id) != str(ADMIN_ID):
-        await update.message.reply_text("This command is for admin only.")
-        return
-    users_db.clear()
-    pending_payments.clear()
-    pending_game_targets.clear()
-    await update.message.reply_text("✅ Reset in-memory data: users, pending payments, and compose targets.")
+    async def close(self) -> None:
+        if self._commit_task:
+            self._commit_task.cancel()
+            self._commit_task = None
+        if self._conn:
+            await self.flush()
+            await self._run(self._conn.close)
+            self._conn = None
+        self._executor.shutdown(wait=False)
 
+    async def _commit_later(self) -> None:
+        await asyncio.sleep(SQLITE_COMMIT_INTERVAL)
+        self._commit_task = None
+        await self.flush()
 
-async def pending_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    if not pending_payments:
-        await update.message.reply_html(
-            "<b>✅ No Pending Payments</b>\n\nAll payments have been processed!"
+    def _mark_dirty(self) -> None:
+        self._dirty = True
+        if not self._commit_task:
+            self._commit_task = asyncio.get_running_loop().create_task(self._commit_later())
+
+    async def _write(self, sql: str, params=()) -> sqlite3.Cursor:
+        cursor = await self._run(self._conn.execute, sql, params)
+        self._mark_dirty()
+        return cursor
+
+    def _fetchone(self, sql: str, params=()):
+        return self._conn.execute(sql, params).fetchone()
+
+    def _fetchall(self, sql: str, params=()):
+        return self._conn.execute(sql, params).fetchall()
+
+    async def get_user(self, user_id: int):
+        row = await self._run(self._fetchone, 'SELECT data FROM users WHERE user_id = ?', (user_id,))
+        return json.loads(row[0]) if row else None
+
+    async def save_user(self, user_id: int, user: dict) -> None:
+        await self._write(
+            'INSERT OR REPLACE INTO users (user_id, is_premium, expires_at, data) VALUES (?, ?, ?, ?)',
+            (user_id, int(bool(user.get('is_premium'))), user.get('subscription_expires'), json.dumps(user)),
         )
-        return
-    message = "<b>📋 Pending Payments</b>\n\n"
-    for idx, (uid, info) in enumerate(pending_payments.items(), 1):
-        tier_info = SUBSCRIPTION_TIERS.get(info.get('tier', 'tier3'), SUBSCRIPTION_TIERS['tier3'])
-        message += (
-            f"<b>Payment #{idx}</b>\n"
-            f"User: {info.get('username','')}\n"
-            f"User ID: {uid}\n"
-            f"Plan: {tier_info.get('name','10 Odds')}\n"
-            f"Amount: {tier_info.get('price',100)} GHS\n"
-            f"Odds: {tier_info.get('odds',10)}\n"
-            f"Status: ⏳ Awaiting Approval\n"
-            f"Screenshot: Received ✅\n"
-            f"Time: {info.get('timestamp','')}\n\n"
+
+    async def premium_user_ids(self) -> list:
+        rows = await self._run(self._fetchall, 'SELECT user_id FROM users WHERE is_premium = 1')
+        return [row[0] for row in rows]
+
+    async def expiring_user_ids(self, before: float, limit: int) -> list:
+        rows = await self._run(
+            self._fetchall,
+            'SELECT user_id FROM users WHERE is_premium = 1 AND expires_at <= ? ORDER BY expires_at LIMIT ?',
+            (before, limit),
         )
-    await update.message.reply_html(message)
+        return [row[0] for row in rows]
 
+    async def get_pending(self, user_id: int):
+        row = await self._run(self._fetchone, 'SELECT data FROM pending_payments WHERE user_id = ?', (user_id,))
+        return json.loads(row[0]) if row else None
 
-async def myid_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    user_id = update.effective_user.id
-    await update.message.reply_html(
-        f"<b>Your Telegram User ID:</b>\n\n<code>{user_id}</code>\n\n"
-        f"Add to .env as ADMIN_ID and restart bot."
-    )
+    async def save_pending(self, user_id: int, entry: dict) -> None:
+        entry = _stamp_created_at(entry)
+        await self._write(
+            'INSERT OR REPLACE INTO pending_payments (user_id, status, tier, created_at, confidence, assignee, data) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?)',
+            (user_id, entry.get('status', 'pending'), entry.get('tier'), _pending_created_at(entry),
+             entry.get('confidence'), entry.get('assignee'), json.dumps(entry)),
+        )
 
+    async def delete_pending(self, user_id: int):
+        entry = await self.get_pending(user_id)
+        if entry is not None:
+            await self._write('DELETE FROM pending_payments WHERE user_id = ?', (user_id,))
+        return entry
 
-async def test_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    user_id = update.effective_user.id
-    if str(user_id) == str(ADMIN_ID):
-        await update.message.reply_html(
-            f"<b>✅ Admin Mode Active!</b>\n\nYour ID: {ADMIN_ID}\nReady to receive payments!"
+    async def page_pending(self, limit: int, cursor=None, backward=False, inclusive=False,
+                           tier=None, created_before=None, min_confidence=None) -> list:
+        """Keyset page of pending payments ordered by (created_at, user_id), starting at `cursor`."""
+        conditions = ["status = 'pending'"]
+        params = []
+        if tier:
+            conditions.append('tier = ?')
+            params.append(tier)
+        if created_before is not None:
+            conditions.append('created_at <= ?')
+            params.append(created_before)
+        if min_confidence is not None:
+            conditions.append('confidence >= ?')
+            params.append(min_confidence)
+        if cursor is not None:
+            op = ('<' if backward else '>') + ('=' if inclusive else '')
+            conditions.append(f'(created_at, user_id) {op} (?, ?)')
+            params.extend(cursor)
+        order = 'DESC' if backward else 'ASC'
+        rows = await self._run(
+            self._fetchall,
+            f"SELECT user_id, data FROM pending_payments WHERE {' AND '.join(conditions)} "
+            f"ORDER BY created_at {order}, user_id {order} LIMIT ?",
+            (*params, limit),
         )
-    else:
-        await update.message.reply_text(
-            f"✅ Bot is working!\n\nYour ID: {user_id}"
+        page = [(row[0], json.loads(row[1])) for row in rows]
+        return page[::-1] if backward else page
+
+    async def pending_stats(self) -> tuple:
+        return tuple(await self._run(self._fetchone, 'SELECT COUNT(*), MIN(created_at) FROM pending_payments'))
+
+    async def pending_load(self) -> dict:
+        rows = await self._run(
+            self._fetchall,
+            'SELECT assignee, COUNT(*) FROM pending_payments WHERE assignee IS NOT NULL GROUP BY assignee',
         )
+        return dict(rows)
 
+    async def clear_pending(self) -> None:
+        await self._write('DELETE FROM pending_payments')
 
-async def approve_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    if not context.args:
-        await update.message.reply_text("Usage: /approve [user_id]")
-        return
-    try:
-        user_id_to_approve = int(context.args[0])
-    except ValueError:
-        await update.message.reply_text("Invalid user ID")
-        return
-    if user_id_to_approve not in pending_payments:
-        await update.message.reply_text(f"No pending payment found for user {user_id_to_approve}")
-        return
+    async def get_compose_target(self, admin_id: str):
+        row = await self._run(self._fetchone, 'SELECT target FROM compose_targets WHERE admin_id = ?', (admin_id,))
+        return json.loads(row[0]) if row else None
 
-    payment_info = pending_payments[user_id_to_approve]
-    tier_key = payment_info.get('tier', 'tier3')
-    if user_id_to_approve in users_db:
-        users_db[user_id_to_approve]['is_premium'] = True
-        users_db[user_id_to_approve]['subscription_tier'] = tier_key
-    del pending_payments[user_id_to_approve]
+    async def set_compose_target(self, admin_id: str, target) -> None:
+        await self._write(
+            'INSERT OR REPLACE INTO compose_targets (admin_id, target) VALUES (?, ?)', (admin_id, json.dumps(target))
+        )
 
-    await update.message.reply_html(
-        f"<b>✅ Payment Approved!</b>\n\nUser: {payment_info['username']}\n"
-        f"Plan: {SUBSCRIPTION_TIERS[tier_key]['name']}\nAmount: {SUBSCRIPTION_TIERS[tier_key]['price']} GHS\n\n"
-        f"Use /send {user_id_to_approve} to deliver the predictions now."
-    )
+    async def clear_compose_target(self, admin_id: str) -> None:
+        await self._write('DELETE FROM compose_targets WHERE admin_id = ?', (admin_id,))
 
+    async def save_screenshot(self, file_unique_id: str, user_id: int, phash) -> None:
+        # SQLite integers are signed 64-bit
+        signed = phash - (1 << 64) if phash is not None and phash >= (1 << 63) else phash
+        # OR IGNORE keeps rowids stable so screenshot_hashes() can resume from one
+        await self._write(
+            'INSERT OR IGNORE INTO screenshots (file_unique_id, user_id, phash, created_at) VALUES (?, ?, ?, ?)',
+            (file_unique_id, user_id, signed, time.time()),
+        )
 
-# Buttons
-async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    query = update.callback_query
-    await query.answer()
+    async def find_screenshot_users(self, file_unique_id: str) -> list:
+        rows = await self._run(
+            self._fetchall, 'SELECT user_id FROM screenshots WHERE file_unique_id = ?', (file_unique_id,),
+        )
+        return [row[0] for row in rows]
 
-    user_id = query.from_user.id
-    if user_id not in users_db:
-        users_db[user_id] = {
-            'username': query.from_user.username or query.from_user.first_name,
-            'is_premium': False,
-            'tips_received': 0,
-            'joined_date': datetime.now().isoformat(),
-            'pending_payment': None,
-        }
+    async def screenshot_hashes(self, cursor=None) -> tuple:
+        """Hashes recorded since `cursor` (a rowid), plus the cursor to continue from."""
+        rows = await self._run(
+            self._fetchall,
+            'SELECT rowid, phash, user_id FROM screenshots WHERE phash IS NOT NULL AND rowid > ? ORDER BY rowid',
+            (cursor or 0,),
+        )
+        if not rows:
+            return [], cursor
+        return [(phash & ((1 << 64) - 1), uid) for _, phash, uid in rows], rows[-1][0]
 
-    if query.data.startswith('subscribe_tier'):
-        tier = query.data.replace('subscribe_tier', '')
-        tier_key = f'tier{tier}'
-        if tier_key not in SUBSCRIPTION_TIERS:
-            tier_key = 'tier3'
-        tier_info = SUBSCRIPTION_TIERS[tier_key]
-        users_db[user_id]['pending_payment'] = tier_key
-
-        keyboard = [
-            [InlineKeyboardButton("💳 Pay with Paystack", url=PAYSTACK_LINK)],
-            [InlineKeyboardButton("📸 Send Payment Screenshot", callback_data=f'upload_screenshot_{tier_key}')],
-            [InlineKeyboardButton("❌ Cancel", callback_data='cancel')],
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(
-            text=(
-                f"<b>Subscribe to {tier_info['name']}</b>\n\n"
-                f"<b>Price: {tier_info['price']} GHS</b>\n"
-                f"<b>You'll get: {tier_info['odds']} Odds</b>\n\n"
-                f"<b>📱 Payment Details:</b>\n"
-                f"Method: {PAYMENT_METHOD}\n"
-                f"Number: {PAYMENT_NUMBER}\n"
-                f"Name: {PAYMENT_NAME}\n\n"
-                f"<b>Send {tier_info['price']} GHS to the above number</b>\n\n"
-                f"After payment:\n"
-                f"1️⃣ Take a screenshot of the payment\n"
-                f"2️⃣ Click 'Send Payment Screenshot'\n"
-                f"3️⃣ Upload the screenshot\n"
-                f"4️⃣ Wait for approval from {BOT_OWNER}\n\n"
-                f"<i>Your odds will be sent after approval</i>"
-            ),
-            reply_markup=reply_markup,
-            parse_mode='HTML',
+    async def payment_processed(self, reference: str) -> bool:
+        row = await self._run(self._fetchone, 'SELECT 1 FROM processed_payments WHERE reference = ?', (reference,))
+        return row is not None
+
+    async def mark_payment_processed(self, reference: str, user_id: int) -> bool:
+        """Record a payment reference; False if it was already processed."""
+        cursor = await self._write(
+            'INSERT OR IGNORE INTO processed_payments (reference, user_id, processed_at) VALUES (?, ?, ?)',
+            (reference, user_id, time.time()),
         )
-        return
+        return cursor.rowcount == 1
 
-    if query.data.startswith('upload_screenshot_'):
-        tier_key = query.data.replace('upload_screenshot_', '')
-        context.user_data['waiting_for_screenshot'] = True
-        context.user_data['pending_tier'] = tier_key
-        await query.edit_message_text(
-            text=(
-                "<b>📸 Send Payment Screenshot</b>\n\n"
-                "Please send a screenshot of your payment confirmation.\n"
-                "Make sure it clearly shows your amount, recipient number, reference, and name."
-            ),
-            parse_mode='HTML',
+    async def enqueue_outbound(self, job: dict) -> bool:
+        cursor = await self._write(
+            'INSERT OR IGNORE INTO outbox (key, status, due, updated_at, data) VALUES (?, ?, ?, ?, ?)',
+            (job['key'], job['status'], job['due'], job['updated_at'], json.dumps(job)),
         )
-        return
+        return cursor.rowcount == 1
 
-    if query.data == 'get_tips':
-        if not users_db[user_id]['is_premium']:
-            keyboard = [
-                [InlineKeyboardButton("💳 Pay with Paystack", url=PAYSTACK_LINK)],
-                [InlineKeyboardButton("💳 100 GHS - 10 Odds", callback_data='subscribe_tier3')],
-            ]
-            reply_markup = InlineKeyboardMarkup(keyboard)
-            await query.edit_message_text(
-                text="<b>Premium Content</b>\n\nSubscribe to get access to today's betting tips!",
-                reply_markup=reply_markup,
-                parse_mode='HTML',
-            )
-        else:
-            await query.edit_message_text(
-                text=(
-                    "<b>🎯 Premium Tips Delivery</b>\n\nYour odds will be sent to you as an image by the admin shortly."
-                ),
-                parse_mode='HTML',
-            )
-        return
+    async def save_outbound(self, job: dict) -> None:
+        await self._write(
+            'INSERT OR REPLACE INTO outbox (key, status, due, updated_at, data) VALUES (?, ?, ?, ?, ?)',
+            (job['key'], job['status'], job['due'], job['updated_at'], json.dumps(job)),
+        )
 
-    if query.data == 'how_it_works':
-        await query.edit_message_text(
-            text=(
-                f"<b>How {BOT_OWNER} Works</b>\n\n"
-                f"1️⃣ <b>Choose Plan</b> - 100 GHS for 10 Odds\n"
-                f"2️⃣ <b>Pay</b> - Use the Paystack button or pay via {PAYMENT_METHOD} to {PAYMENT_NUMBER}\n"
-                f"3️⃣ <b>Send Screenshot</b> - If you didn't use Paystack\n"
-                f"4️⃣ <b>Get Approved</b> - Wait for {BOT_OWNER} to verify\n"
-                f"5️⃣ <b>Receive Tips</b> - Get your daily betting odds\n\n"
-                f"<b>Available Plan:</b>\n💰 100 GHS - 10 Odds\n\n"
-                f"<b>Payment To:</b> {PAYMENT_NAME}\n<b>{PAYMENT_METHOD}:</b> {PAYMENT_NUMBER}"
-            ),
-            parse_mode='HTML',
+    def _claim_outbound(self, now: float, lease: float, limit: int) -> list:
+        rows = self._conn.execute(
+            "SELECT data FROM outbox WHERE status = 'queued' AND due <= ? ORDER BY due LIMIT ?", (now, limit),
+        ).fetchall()
+        jobs = [json.loads(row[0]) for row in rows]
+        for job in jobs:
+            job['due'] = now + lease
+        self._conn.executemany(
+            'UPDATE outbox SET due = ?, data = ? WHERE key = ?',
+            [(job['due'], json.dumps(job), job['key']) for job in jobs],
         )
-        return
+        return jobs
 
-    if query.data == 'cancel':
-        users_db[user_id]['pending_payment'] = None
-        keyboard = [
-            [InlineKeyboardButton("💳 Pay with Paystack", url=PAYSTACK_LINK)],
-            [InlineKeyboardButton("💳 100 GHS - 10 Odds", callback_data='subscribe_tier3')],
-            [InlineKeyboardButton("ℹ️ How It Works", callback_data='how_it_works')],
-        ]
-        reply_markup = InlineKeyboardMarkup(keyboard)
-        await query.edit_message_text(
-            text=(
-                f"<b>Welcome to {BOT_OWNER}! 🎲</b>\n\nGet expert betting predictions and tips from our AI-powered analysis."
-            ),
-            reply_markup=reply_markup,
-            parse_mode='HTML',
+    async def claim_outbound(self, now: float, lease: float, limit: int) -> list:
+        # Select and update run back to back on the storage thread, so no other query interleaves
+        jobs = await self._run(self._claim_outbound, now, lease, limit)
+        if jobs:
+            self._mark_dirty()
+        return jobs
+
+    async def outbound_stats(self) -> dict:
+        return dict(await self._run(self._fetchall, 'SELECT status, COUNT(*) FROM outbox GROUP BY status'))
+
+    async def dead_outbound(self, limit: int) -> list:
+        rows = await self._run(
+            self._fetchall, "SELECT data FROM outbox WHERE status = 'dead' ORDER BY updated_at LIMIT ?", (limit,),
         )
-        return
+        return [json.loads(row[0]) for row in rows]
 
+    async def purge_outbound(self, before: float) -> int:
+        cursor = await self._write("DELETE FROM outbox WHERE status = 'sent' AND updated_at < ?", (before,))
+        return cursor.rowcount
 
-# Messages
-async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    user_id = update.effective_user.id
+    async def get_meta(self, key: str, default=None):
+        row = await self._run(self._fetchone, 'SELECT value FROM meta WHERE key = ?', (key,))
+        return json.loads(row[0]) if row else default
 
-    # Admin compose delivery
-    if pending_game_targets.get(str(user_id)):
-        target_id = pending_game_targets.get(str(user_id))
-        try:
-            if update.message.text and not update.message.photo and not update.message.document:
-                await context.bot.send_message(chat_id=target_id, text=update.message.text)
-            elif update.message.photo:
-                await context.bot.send_photo(chat_id=target_id, photo=update.message.photo[-1].file_id, caption=update.message.caption)
-            elif update.message.document:
-                await context.bot.send_document(chat_id=target_id, document=update.message.document.file_id, caption=update.message.caption)
-            else:
-                await update.message.reply_text("Unsupported message type. Send text, photo, or document.")
-                return
-            await update.message.reply_text("✅ Game delivered to customer.")
-            pending_game_targets.pop(str(user_id), None)
-        except Exception as e:
-            logger.error(f"Failed to deliver game to {target_id}: {e}")
-            await update.message.reply_text("❌ Failed to deliver. Please try again.")
+    async def set_meta(self, key: str, value) -> None:
+        await self._write('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, json.dumps(value)))
+
+    async def reset(self) -> None:
+        await self._write('DELETE FROM users')
+        await self._write('DELETE FROM pending_payments')
+        await self._write('DELETE FROM compose_targets')
+
+
+async def _import_legacy_data(path: str) -> None:
+    """One-off migration from a JSON dump of the old users_db/pending_payments/pending_game_targets dicts."""
+    if await storage.get_meta('legacy_imported'):
         return
+    with open(path) as f:
+        legacy = json.load(f)
+    for uid, user in legacy.get('users_db', {}).items():
+        await storage.save_user(int(uid), user)
+    for uid, entry in legacy.get('pending_payments', {}).items():
+        await storage.save_pending(int(uid), entry)
+    for admin_id, target in legacy.get('pending_game_targets', {}).items():
+        await storage.set_compose_target(str(admin_id), target)
+    await storage.set_meta('legacy_imported', datetime.now().isoformat())
+    logger.info(f"Imported legacy data from {path}")
 
-    # Treat photos/documents as payment screenshots (non-admin)
-    if (update.message.photo or update.message.document) and (not ADMIN_ID or str(user_id) != str(ADMIN_ID)):
-        pending_tier = context.user_data.get('pending_tier') or users_db.get(user_id, {}).get('pending_payment') or 'tier3'
-        tier_info = SUBSCRIPTION_TIERS.get(pending_tier, SUBSCRIPTION_TIERS['tier3'])
 
-        if user_id not in users_db:
-            users_db[user_id] = {
-                'username': update.effective_user.username or update.effective_user.first_name,
-                'is_premium': False,
-                'tips_received': 0,
-                'joined_date': datetime.now().isoformat(),
-                'pending_payment': pending_tier,
-            }
+class RedisStorage:
+    """Redis backend shared by every replica of the bot.
 
-        entry = {
-            'username': update.effective_user.username or update.effective_user.first_name,
-            'tier': pending_tier,
-            'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
-            'status': 'pending',
-        }
-        if update.message.photo:
-            entry['photo_id'] = update.message.photo[-1].file_id
-        else:
-            entry['document_id'] = update.message.document.file_id
-        pending_payments[user_id] = entry
+    Users and pending payments are JSON strings; a set tracks premium users, a sorted
+    set scored by subscription expiry feeds the expiry job, and a sorted set (score
+    created_at, member zero-padded user id) orders the pending queue. `lock()` is a Redis lock so replicas never process the same payment twice.
+    A hash maps pending user ids to their assigned admin. Outbound jobs live in one hash, with sorted
+    sets of queued (by due time), sent and dead keys.
+    """
 
-        await update.message.reply_html(
-            "<b>✅ Screenshot Received!</b>\n\n"
-            f"Thank you for sending your payment proof.\n\n"
-            f"Plan: {tier_info.get('name')}\n"
-            f"Amount: {tier_info.get('price')} GHS\n"
-            f"Odds: {tier_info.get('odds')}\n\n"
-            f"Your screenshot has been sent to {BOT_OWNER} for verification.\nYou'll receive your odds once approved."
-        )
+    # Take due outbound jobs and push their due time back by the lease, atomically across replicas
+    CLAIM_OUTBOUND = """
+    local keys = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[3])
+    for _, key in ipairs(keys) do
+        redis.call('ZADD', KEYS[1], ARGV[2], key)
+    end
+    return keys
+    """
 
-        if ADMIN_ID:
-            try:
-                await context.bot.copy_message(
-                    chat_id=int(ADMIN_ID),
-                    from_chat_id=update.effective_chat.id,
-                    message_id=update.message.message_id,
-                )
-                keyboard = [[InlineKeyboardButton("✉️ Send Game", callback_data=f'admin_send_{user_id}')]]
-                await context.bot.send_message(
-                    chat_id=int(ADMIN_ID),
-                    text=(
-                        "<b>📸 New Payment Screenshot</b>\n\n"
-                        f"User: {update.effective_user.username or update.effective_user.first_name}\n"
-                        f"User ID: {user_id}\n"
-                        f"Plan: {tier_info.get('name')}\n"
-                        f"Amount: {tier_info.get('price')} GHS\n"
-                        f"Odds: {tier_info.get('odds')}\n\n"
-                        "Tap below to send the game now."
-                    ),
-                    parse_mode='HTML',
-                    reply_markup=InlineKeyboardMarkup(keyboard),
-                )
-            except Exception as e:
-                logger.error(f"Could not copy screenshot to admin: {e}")
-        return
+    def __init__(self, url: str, prefix: str):
+        self.url = url
+        self.prefix = prefix
+        self.redis = None
 
-    # Regular help/support
-    user_message = update.message.text.lower() if update.message.text else ""
-    if 'support' in user_message:
-        await update.message.reply_html(
-            "📧 <b>Support Request Received</b>\n\n"
-            f"Contact {BOT_OWNER} directly for support. Use /help for common questions."
-        )
-    else:
-        await update.message.reply_html(
-            f"<b>Welcome to {BOT_OWNER}! 🎲</b>\n\nUse /start to get started or /help for more information."
-        )
+    def _key(self, *parts) -> str:
+        return self.prefix + ':'.join(str(part) for part in parts)
 
+    async def open(self) -> None:
+        aioredis = _optional_module('redis.asyncio')
+        if aioredis is None:
+            raise RuntimeError('STORAGE_BACKEND=redis needs the redis package')
+        self.redis = aioredis.from_url(self.url, decode_responses=True)
+        await self.redis.ping()
+        self._claim_outbound = self.redis.register_script(self.CLAIM_OUTBOUND)
 
-async def cancel_send_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    user_id = update.effective_user.id
-    if pending_game_targets.get(str(user_id)):
-        pending_game_targets.pop(str(user_id), None)
-        await update.message.reply_text("✅ Cancelled. Compose mode ended.")
-    else:
-        await update.message.reply_text("Nothing to cancel.")
+    async def flush(self) -> None:
+        pass
 
+    async def close(self) -> None:
+        if self.redis is not None:
+            await self.redis.aclose()
+            self.redis = None
 
-async def send_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
-    user_id = update.effective_user.id
-    if not ADMIN_ID or str(user_id) != str(ADMIN_ID):
-        await update.message.reply_text("This command is for admin only.")
-        return
-    if not context.args:
-        await update.message.reply_text("Usage: /send <user_id>")
-        return
-    try:
-        target_id = int(context.args[0])
-    except ValueError:
-        await update.message.reply_text("Invalid user_id. Usage: /send <user_id>")
-        return
-    if target_id not in users_db:
-        await update.message.reply_text("Warning: user not found in database. You can still send.")
-    pending_game_targets[str(user_id)] = target_id
-    await update.message.reply_text(
-        "✉️ Compose mode: send the odds now (text/photo/document).\nUse /cancel_send to cancel."
-    )
+    def lock(self, key: str):
+        return self.redis.lock(self._key('lock', key), timeout=REDIS_LOCK_TIMEOUT, blocking_timeout=REDIS_LOCK_TIMEOUT)
 
+    async def get_user(self, user_id: int):
+        value = await self.redis.get(self._key('user', user_id))
+        return json.loads(value) if value else None
 
-def main() -> None:
-    application = Application.builder().token(BOT_TOKEN).build()
+    async def save_user(self, user_id: int, user: dict) -> None:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.set(self._key('user', user_id), json.dumps(user))
+            if user.get('is_premium'):
+                pipe.sadd(self._key('premium'), user_id)
+            else:
+                pipe.srem(self._key('premium'), user_id)
+            if user.get('is_premium') and user.get('subscription_expires'):
+                pipe.zadd(self._key('expiry'), {user_id: user['subscription_expires']})
+            else:
+                pipe.zrem(self._key('expiry'), user_id)
+            await pipe.execute()
 
-    # Command handlers
+    async def premium_user_ids(self) -> list:
+        return [int(uid) for uid in await self.redis.smembers(self._key('premium'))]
+
+    async def expiring_user_ids(self, before: float, limit: int) -> list:
+        return [int(uid) for uid in await self.redis.zrangebyscore(self._key('expiry'), '-inf', before, 0, limit)]
+
+    async def get_pending(self, user_id: int):
+        value = await self.redis.get(self._key('pending', user_id))
+        return json.loads(value) if value else None
+
+    async def save_pending(self, user_id: int, entry: dict) -> None:
+        entry = _stamp_created_at(entry)
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.set(self._key('pending', user_id), json.dumps(entry))
+            pipe.zadd(self._key('pending_index'), {f'{user_id:020d}': _pending_created_at(entry)})
+            if entry.get('assignee'):
+                pipe.hset(self._key('pending_assignee'), user_id, entry['assignee'])
+            else:
+                pipe.hdel(self._key('pending_assignee'), user_id)
+            await pipe.execute()
+
+    async def delete_pending(self, user_id: int):
+        # GETDEL is atomic: only one replica gets the entry back
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.getdel(self._key('pending', user_id))
+            pipe.zrem(self._key('pending_index'), f'{user_id:020d}')
+            pipe.hdel(self._key('pending_assignee'), user_id)
+            value, _, _ = await pipe.execute()
+        return json.loads(value) if value else None
+
+    async def page_pending(self, limit: int, cursor=None, backward=False, inclusive=False,
+                           tier=None, created_before=None, min_confidence=None) -> list:
+        index = self._key('pending_index')
+        low = cursor[0] if cursor is not None and not backward else '-inf'
+        high = '+inf' if created_before is None else created_before
+        if cursor is not None and backward:
+            high = cursor[0] if created_before is None else min(cursor[0], created_before)
+        page, offset, batch = [], 0, max(limit * 2, 50)
+        while len(page) < limit:
+            if backward:
+                members = await self.redis.zrevrangebyscore(index, high, low, start=offset, num=batch, withscores=True)
+            else:
+                members = await self.redis.zrangebyscore(index, low, high, start=offset, num=batch, withscores=True)
+            if not members:
+                break
+            offset += len(members)
+            candidates = []
+            for member, score in members:
+                key = (score, int(member))
+                if cursor is not None:
+                    if backward and (key > cursor or (key == cursor and not inclusive)):
+                        continue
+                    if not backward and (key < cursor or (key == cursor and not inclusive)):
+                        continue
+                candidates.append(int(member))
+            values = await self.redis.mget([self._key('pending', uid) for uid in candidates]) if candidates else []
+            for uid, value in zip(candidates, values):
+                if not value:
+                    continue
+                entry = json.loads(value)
+                if entry.get('status', 'pending') != 'pending' or (tier and entry.get('tier') != tier):
+                    continue
+                if min_confidence is not None and (entry.get('confidence') or 0) < min_confidence:
+                    continue
+                page.append((uid, entry))
+                if len(page) == limit:
+                    break
+        return page[::-1] if backward else page
+
+    async def pending_stats(self) -> tuple:
+        index = self._key('pending_index')
+        async with self.redis.pipeline(transaction=False) as pipe:
+            pipe.zcard(index)
+            pipe.zrange(index, 0, 0, withscores=True)
+            count, oldest = await pipe.execute()
+        return count, oldest[0][1] if oldest else None
+
+    async def clear_pending(self) -> None:
+        members = await self.redis.zrange(self._key('pending_index'), 0, -1)
+        keys = [self._key('pending', int(member)) for member in members]
+        await self.redis.delete(self._key('pending_index'), self._key('pending_assignee'), *keys)
+
+    async def pending_load(self) -> dict:
+        load = {}
+        for admin_id in await self.redis.hvals(self._key('pending_assignee')):
+            load[int(admin_id)] = load.get(int(admin_id), 0) + 1
+        return load
+
+    async def get_compose_target(self, admin_id: str):
+        value = await self.redis.hget(self._key('compose'), admin_id)
+        return json.loads(value) if value else None
+
+    async def set_compose_target(self, admin_id: str, target) -> None:
+        await self.redis.hset(self._key('compose'), admin_id, json.dumps(target))
+
+    async def clear_compose_target(self, admin_id: str) -> None:
+        await self.redis.hdel(self._key('compose'), admin_id)
+
+    async def save_screenshot(self, file_unique_id: str, user_id: int, phash) -> None:
+        is_new = await self.redis.hsetnx(self._key('screenshot', file_unique_id), user_id, '' if phash is None else phash)
+        if is_new and phash is not None:
+            await self.redis.rpush(self._key('phash_log'), f'{phash}:{user_id}')
+
+    async def find_screenshot_users(self, file_unique_id: str) -> list:
+        return [int(uid) for uid in await self.redis.hkeys(self._key('screenshot', file_unique_id))]
+
+    async def screenshot_hashes(self, cursor=None) -> tuple:
+        """Hashes recorded since `cursor` (by any replica), plus the cursor to continue from."""
+        start = cursor or 0
+        items = await self.redis.lrange(self._key('phash_log'), start, -1)
+        hashes = [tuple(int(part) for part in item.split(':')) for item in items]
+        return hashes, start + len(items)
+
+    async def payment_processed(self, reference: str) -> bool:
+        return bool(await self.redis.exists(self._key('paystack', reference)))
+
+    async def mark_payment_processed(self, reference: str, user_id: int) -> bool:
+        return bool(await self.redis.set(self._key('paystack', reference), user_id, nx=True))
+
+    async def enqueue_outbound(self, job: dict) -> bool:
+        if not await self.redis.hsetnx(self._key('outbox'), job['key'], json.dumps(job)):
+            return False
+        await self.redis.zadd(self._key('outbox_due'), {job['key']: job['due']})
+        return True
+
+    async def save_outbound(self, job: dict) -> None:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.hset(self._key('outbox'), job['key'], json.dumps(job))
+            for status in ('sent', 'dead'):
+                if job['status'] == status:
+                    pipe.zadd(self._key(f'outbox_{status}'), {job['key']: job['updated_at']})
+                else:
+                    pipe.zrem(self._key(f'outbox_{status}'), job['key'])
+            if job['status'] == 'queued':
+                pipe.zadd(self._key('outbox_due'), {job['key']: job['due']})
+            else:
+                pipe.zrem(self._key('outbox_due'), job['key'])
+            await pipe.execute()
+
+    async def _outbound_jobs(self, keys: list) -> list:
+        if not keys:
+            return []
+        return [json.loads(value) for value in await self.redis.hmget(self._key('outbox'), keys) if value]
+
+    async def claim_outbound(self, now: float, lease: float, limit: int) -> list:
+        keys = await self._claim_outbound(keys=[self._key('outbox_due')], args=[now, now + lease, limit])
+        jobs = await self._outbound_jobs(keys)
+        for job in jobs:
+            job['due'] = now + lease
+        return jobs
+
+    async def outbound_stats(self) -> dict:
+        async with self.redis.pipeline(transaction=False) as pipe:
+            for status in ('due', 'sent', 'dead'):
+                pipe.zcard(self._key(f'outbox_{status}'))
+            queued, sent, dead = await pipe.execute()
+        return {'queued': queued, 'sent': sent, 'dead': dead}
+
+    async def dead_outbound(self, limit: int) -> list:
+        return await self._outbound_jobs(await self.redis.zrange(self._key('outbox_dead'), 0, limit - 1))
+
+    async def purge_outbound(self, before: float) -> int:
+        keys = await self.redis.zrangebyscore(self._key('outbox_sent'), '-inf', before)
+        if keys:
+            async with self.redis.pipeline(transaction=True) as pipe:
+                pipe.hdel(self._key('outbox'), *keys)
+                pipe.zrem(self._key('outbox_sent'), *keys)
+                await pipe.execute()
+        return len(keys)
+
+    async def get_meta(self, key: str, default=None):
+        value = await self.redis.hget(self._key('meta'), key)
+        return json.loads(value) if value else default
+
+    async def set_meta(self, key: str, value) -> None:
+        await self.redis.hset(self._key('meta'), key, json.dumps(value))
+
+    async def get_session(self, user_id: int) -> tuple:
+        """(version, user_data); the version goes up by one on every save."""
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.get(self._key('session_version', user_id))
+            pipe.get(self._key('session', user_id))
+            version, value = await pipe.execute()
+        return int(version or 0), json.loads(value) if value else {}
+
+    async def session_version(self, user_id: int) -> int:
+        return int(await self.redis.get(self._key('session_version', user_id)) or 0)
+
+    async def save_session(self, user_id: int, data: dict) -> int:
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.set(self._key('session', user_id), json.dumps(data))
+            pipe.incr(self._key('session_version', user_id))
+            _, version = await pipe.execute()
+        return version
+
+    async def drop_session(self, user_id: int) -> int:
+        # The version keeps counting, so other replicas notice the drop
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.delete(self._key('session', user_id))
+            pipe.incr(self._key('session_version', user_id))
+            _, version = await pipe.execute()
+        return version
+
+    async def reset(self) -> None:
+        keys = [
+            self._key('premium'), self._key('expiry'), self._key('pending_index'), self._key('pending_assignee'),
+            self._key('compose'),
+        ]
+        for pattern in ('user:*', 'pending:*'):
+            keys += [key async for key in self.redis.scan_iter(match=self._key(pattern))]
+        await self.redis.delete(*keys)
+
+
+class RedisPersistence(BasePersistence):
+    """Keeps PTB user_data (e.g. waiting_for_screenshot) in Redis so any replica can handle a user's next update.
+
+    Nothing is loaded at startup. Right before one of a user's updates is handled, their data is
+    reloaded if another replica saved a newer version of it; otherwise local changes that haven't
+    been flushed yet (every SHARED_PERSISTENCE_INTERVAL seconds) are kept.
+    """
+
+    def __init__(self, redis_storage: RedisStorage):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=SHARED_PERSISTENCE_INTERVAL,
+        )
+        self.storage = redis_storage
+        self.versions = {}  # user id -> session version this replica last loaded or saved
+
+    async def get_user_data(self) -> dict:
+        return {}
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        return {}
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        pass
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self.versions[user_id] = await self.storage.save_session(user_id, data)
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self.versions[user_id] = await self.storage.drop_session(user_id)
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        # -1 for users this replica hasn't seen, so sessions saved before versioning still load once
+        if await self.storage.session_version(user_id) <= self.versions.get(user_id, -1):
+            return
+        version, stored = await self.storage.get_session(user_id)
+        self.versions[user_id] = version
+        user_data.clear()
+        user_data.update(stored)
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def flush(self) -> None:
+        pass
+
+
+class JournalPersistence(BasePersistence):
+    """Keeps PTB user_data (e.g. waiting_for_screenshot, pending_tier) across restarts without Redis.
+
+    Changes are appended to a write-ahead journal; once it holds SESSION_JOURNAL_MAX records, the
+    whole state is written as a snapshot and the journal starts over. Records carry a sequence
+    number, so recovery loads the snapshot and replays only the journal tail after it. PTB hands
+    over changed user_data every SESSION_FLUSH_INTERVAL seconds; each batch is written (and fsynced)
+    in one go in a thread, so handlers never wait on the disk.
+    """
+
+    def __init__(self, path: str):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=False, chat_data=False, user_data=True, callback_data=False),
+            update_interval=SESSION_FLUSH_INTERVAL,
+        )
+        self.snapshot_path = f'{path}.snapshot'
+        self.journal_path = f'{path}.journal'
+        self.sessions = {}  # user id -> user_data, as last handed over
+        self.seq = 0
+        self._journal_records = 0
+        self._pending = []  # journal lines not written yet
+        self._writer = None
+
+    def _recover(self) -> tuple:
+        started = time.perf_counter()
+        sessions, seq, replayed = {}, 0, 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, encoding='utf-8') as f:
+                snapshot = json.load(f)
+            seq = snapshot['seq']
+            sessions = {int(user_id): data for user_id, data in snapshot['sessions'].items()}
+        if os.path.exists(self.journal_path):
+            with open(self.journal_path, 'rb+') as f:
+                good = 0  # end of the last complete record
+                for line in f:
+                    try:
+                        if not line.endswith(b'\n'):
+                            raise ValueError
+                        record = json.loads(line)
+                    except ValueError:
+                        # A write cut short by the crash; drop it so new records start on a clean line
+                        logger.warning("Dropping a torn record at the end of the session journal")
+                        f.truncate(good)
+                        break
+                    good += len(line)
+                    self._journal_records += 1
+                    if record['seq'] <= seq:
+                        continue  # already in the snapshot
+                    seq = record['seq']
+                    replayed += 1
+                    if record['data'] is None:
+                        sessions.pop(record['user'], None)
+                    else:
+                        sessions[record['user']] = record['data']
+        logger.info(
+            f"Recovered {len(sessions)} session(s), replayed {replayed} journal record(s) "
+            f"in {(time.perf_counter() - started) * 1000:.0f} ms"
+        )
+        return sessions, seq
+
+    async def get_user_data(self) -> dict:
+        self.sessions, self.seq = await asyncio.to_thread(self._recover)
+        return {user_id: dict(data) for user_id, data in self.sessions.items()}
+
+    async def get_chat_data(self) -> dict:
+        return {}
+
+    async def get_bot_data(self) -> dict:
+        return {}
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        return {}
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        pass
+
+    def _append(self, user_id: int, data) -> None:
+        if data is None:
+            self.sessions.pop(user_id, None)
+        elif self.sessions.get(user_id) == data:
+            return
+        else:
+            self.sessions[user_id] = dict(data)
+        self.seq += 1
+        self._pending.append(json.dumps({'seq': self.seq, 'user': user_id, 'data': data}, default=str) + '\n')
+        if self._writer is None:
+            self._writer = asyncio.get_running_loop().create_task(self._write_pending())
+
+    async def _write_pending(self) -> None:
+        """Group commit: everything appended before this task runs goes out in one write."""
+        try:
+            while self._pending:
+                lines, self._pending = self._pending, []
+                self._journal_records += len(lines)
+                snapshot = None
+                if self._journal_records >= SESSION_JOURNAL_MAX:
+                    snapshot = {'seq': self.seq, 'sessions': dict(self.sessions)}
+                    self._journal_records = 0
+                try:
+                    await asyncio.to_thread(self._write, lines, snapshot)
+                except (OSError, TypeError, ValueError) as e:
+                    logger.error(f"Could not persist {len(lines)} session change(s): {e}")
+        finally:
+            self._writer = None
+
+    def _write(self, lines: list, snapshot: dict = None) -> None:
+        with open(self.journal_path, 'a', encoding='utf-8') as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        if snapshot is None:
+            return
+        temp_path = f'{self.snapshot_path}.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(snapshot, f, default=str, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.snapshot_path)
+        # Only now is the journal redundant; a crash before this line just replays records the seq skips
+        open(self.journal_path, 'w').close()
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._append(user_id, data)
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        pass
+
+    async def update_bot_data(self, data: dict) -> None:
+        pass
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        pass
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._append(user_id, None)
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def flush(self) -> None:
+        """On shutdown: write what is left and compact, so the next start reads just the snapshot."""
+        if self._writer:
+            await self._writer
+        lines, self._pending = self._pending, []
+        await asyncio.to_thread(self._write, lines, {'seq': self.seq, 'sessions': dict(self.sessions)})
+        self._journal_records = 0
+
+
+def _make_storage():
+    if STORAGE_BACKEND == 'memory':
+        return MemoryStorage()
+    if STORAGE_BACKEND == 'redis':
+        return RedisStorage(REDIS_URL, REDIS_PREFIX)
+    return SQLiteStorage(DATABASE_PATH)
+
+
+storage = _make_storage()
+
+
+async def _get_or_create_user(tg_user, pending_payment=None) -> dict:
+    user = await storage.get_user(tg_user.id)
+    if user is None:
+        user = _new_user(tg_user, pending_payment)
+        await storage.save_user(tg_user.id, user)
+    return user
+
+
+class StartupTimer:
+    """Startup phases, timed from BOOT_STARTED, for the startup log, /readyz and metrics."""
+
+    def __init__(self):
+        self.phases = []
+        self.ready_after = None
+        self.first_update_after = None
+        self._last = BOOT_STARTED
+
+    @property
+    def ready(self) -> bool:
+        return self.ready_after is not None
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - BOOT_STARTED
+
+    def mark(self, phase: str) -> None:
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def mark_ready(self) -> None:
+        self.ready_after = self.elapsed()
+        phases = ', '.join(f'{phase} {seconds * 1000:.0f} ms' for phase, seconds in self.phases)
+        logger.info(f"Ready in {self.ready_after:.2f}s ({phases})")
+
+    def mark_first_update(self) -> None:
+        if self.first_update_after is None:
+            self.first_update_after = self.elapsed()
+            logger.info(f"First update handled {self.first_update_after:.2f}s after start")
+
+
+startup = StartupTimer()
+
+
+async def _post_init(app: Application) -> None:
+    await storage.open()
+    if LEGACY_DATA_FILE and os.path.exists(LEGACY_DATA_FILE):
+        await _import_legacy_data(LEGACY_DATA_FILE)
+    await _backfill_subscriptions()
+    await _restore_broadcast_state(app)
+    await _restore_releases(app)
+    global outbox_task
+    outbox_task = asyncio.get_running_loop().create_task(_outbox_worker(app.bot))
+    global events_task
+    events_task = asyncio.get_running_loop().create_task(_events_worker())
+    if app.job_queue:
+        app.job_queue.run_repeating(
+            _subscription_job, SUBSCRIPTION_CHECK_INTERVAL, first=10, name='subscription_expiry',
+        )
+    else:
+        logger.warning("JobQueue unavailable (install python-telegram-bot[job-queue]); subscriptions won't expire")
+    startup.mark('post_init')
+
+
+async def _after_startup(app: Application) -> None:
+    """Work that can wait until updates are already being handled."""
+    try:
+        await _set_bot_commands(app)
+    except TelegramError as e:
+        logger.warning(f"Could not refresh the command menu: {e}")
+    # Pillow is only needed once the first screenshot arrives; import it off the event loop
+    await asyncio.to_thread(_optional_module, 'PIL.Image')
+
+
+async def _post_shutdown(app: Application) -> None:
+    if outbox_task:
+        outbox_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await outbox_task
+    if events_task:
+        events_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await events_task
+    broadcast_task = broadcast_state.get('task')
+    if broadcast_task:
+        broadcast_task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await broadcast_task
+    await events.flush()
+    _shutdown_ocr_pool()
+    await storage.close()
+
+
+async def _activate_premium(user_id: int, tier_key: str, username: str = None) -> dict:
+    """Start a subscription, or extend a running one: days are added after its expiry and odds accumulate."""
+    tier_info = SUBSCRIPTION_TIERS.get(tier_key, SUBSCRIPTION_TIERS[DEFAULT_TIER])
+    async with storage.lock(f'user:{user_id}'):
+        user = await storage.get_user(user_id)
+        if user is None:
+            user = {
+                'username': username or str(user_id),
+                'is_premium': False,
+                'tips_received': 0,
+                'joined_date': datetime.now().isoformat(),
+                'pending_payment': None,
+            }
+        now = time.time()
+        active = user.get('is_premium') and (user.get('subscription_expires') or 0) > now
+        if not active:
+            user['subscription_start'] = now
+            user['subscription_expires'] = now
+            user['odds_remaining'] = 0
+        user['subscription_expires'] += tier_info.get('days', SUBSCRIPTION_DAYS) * 86400
+        user['odds_remaining'] = (user.get('odds_remaining') or 0) + tier_info['odds']
+        user['subscription_status'] = 'active'
+        user['is_premium'] = True
+        user['subscription_tier'] = tier_key
+        user['pending_payment'] = None
+        await storage.save_user(user_id, user)
+    return user
+
+
+async def _set_bot_commands(app: Application, force: bool = False) -> bool:
+    """Publish the command menu, unless Telegram already has this exact list (hash kept in meta)."""
+    commands = [
+        BotCommand("start", "Open main menu"),
+        BotCommand("pay", "Pay with Paystack"),
+        BotCommand("status", "View your status"),
+        BotCommand("tips", "Get today's tips"),
+        BotCommand("help", "Help and info"),
+    ]
+    digest = hashlib.sha256(json.dumps(
+        [app.bot.id] + [[command.command, command.description] for command in commands]
+    ).encode()).hexdigest()
+    if not force and await storage.get_meta('bot_commands_hash') == digest:
+        logger.info("Command menu unchanged; skipped setMyCommands")
+        return False
+    await app.bot.set_my_commands(commands)
+    await storage.set_meta('bot_commands_hash', digest)
+    return True
+
+
+async def _set_webhook(bot) -> None:
+    """Register the webhook, unless Telegram already delivers the same updates to the same URL."""
+    url = f"{WEBHOOK_URL}/{BOT_TOKEN}"
+    info = await bot.get_webhook_info()
+    if info.url == url and set(info.allowed_updates or ()) == set(Update.ALL_TYPES):
+        logger.info("Webhook already registered; skipped setWebhook")
+        return
+    await bot.set_webhook(url=url, allowed_updates=Update.ALL_TYPES)
+
+
+# Metrics
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+APPROVAL_BUCKETS = (60, 300, 900, 1800, 3600, 7200, 21600, 43200, 86400, 259200)
+
+
+def _format_labels(names, values) -> str:
+    if not names:
+        return ''
+    pairs = (
+        f'{name}="' + str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') + '"'
+        for name, value in zip(names, values)
+    )
+    return '{' + ','.join(pairs) + '}'
+
+
+class Counter:
+    """Monotonic counter keyed by label values."""
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name, self.help, self.labels = name, help_text, tuple(labels)
+        self.series = {}
+
+    def inc(self, *label_values, amount: float = 1) -> None:
+        self.series[label_values] = self.series.get(label_values, 0) + amount
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+        for values, total in sorted(self.series.items()):
+            lines.append(f'{self.name}{_format_labels(self.labels, values)} {total}')
+        return lines
+
+
+class Histogram:
+    """Fixed-bucket histogram keyed by label values; observe() is a bisect and two adds."""
+
+    def __init__(self, name: str, help_text: str, labels=(), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help_text, tuple(labels), tuple(buckets)
+        self.series = {}  # label values -> [count per bucket..., count above last bucket, sum]
+
+    def observe(self, value: float, *label_values) -> None:
+        series = self.series.get(label_values)
+        if series is None:
+            series = self.series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect.bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> list:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+        for values, series in sorted(self.series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, '+Inf'), series):
+                cumulative += count
+                labels = _format_labels((*self.labels, 'le'), (*values, bound))
+                lines.append(f'{self.name}_bucket{labels} {cumulative}')
+            labels = _format_labels(self.labels, values)
+            lines.append(f'{self.name}_sum{labels} {series[-1]}')
+            lines.append(f'{self.name}_count{labels} {cumulative}')
+        return lines
+
+
+HANDLER_LATENCY = Histogram('bot_handler_duration_seconds', 'Handler callback latency.', ['handler'])
+HANDLER_ERRORS = Counter('bot_handler_errors_total', 'Handler callbacks that raised.', ['handler'])
+UPDATE_WAIT = Histogram('bot_update_wait_seconds', 'Time an update waited for its user lock and a slot.')
+API_LATENCY = Histogram('telegram_api_duration_seconds', 'Bot API request latency.', ['method'])
+API_ERRORS = Counter('telegram_api_errors_total', 'Failed Bot API requests.', ['method', 'code'])
+API_RETRY_AFTER = Counter('telegram_api_retry_after_total', 'Bot API 429 (RetryAfter) responses.', ['method'])
+APPROVAL_LATENCY = Histogram(
+    'bot_approval_latency_seconds', 'Screenshot received to payment approved.', buckets=APPROVAL_BUCKETS,
+)
+SUBSCRIPTIONS_ENDED = Counter('bot_subscriptions_ended_total', 'Subscriptions ended, by reason.', ['reason'])
+OUTBOX_JOBS = Counter('bot_outbox_jobs_total', 'Outbound queue jobs, by outcome.', ['result'])
+ADMIN_DECISIONS = Counter('bot_admin_decisions_total', 'Payments approved or rejected, by admin.', ['admin', 'decision'])
+RATE_LIMITED = Counter(
+    'bot_rate_limited_updates_total', 'Updates dropped by flood protection, by kind and action.', ['kind', 'action'],
+)
+POOL_REQUESTS = Counter('telegram_pool_requests_total', 'HTTP requests sent, by connection pool.', ['pool'])
+POOL_CONNECTIONS_OPENED = Counter(
+    'telegram_pool_connections_opened_total', 'New TCP connections; the rest reused a kept-alive one.', ['pool'],
+)
+METRICS = (
+    HANDLER_LATENCY, HANDLER_ERRORS, UPDATE_WAIT, API_LATENCY, API_ERRORS, API_RETRY_AFTER, APPROVAL_LATENCY,
+    SUBSCRIPTIONS_ENDED, POOL_REQUESTS, POOL_CONNECTIONS_OPENED, OUTBOX_JOBS, ADMIN_DECISIONS, RATE_LIMITED,
+)
+
+
+def _instrumented(callback):
+    """Wrap a handler callback to record its latency and failures under its function name."""
+    name = callback.__name__
+
+    @functools.wraps(callback)
+    async def wrapper(update, context, *args):
+        started = time.perf_counter()
+        try:
+            return await callback(update, context, *args)
+        except ApplicationHandlerStop:
+            raise
+        except Exception:
+            HANDLER_ERRORS.inc(name)
+            raise
+        finally:
+            HANDLER_LATENCY.observe(time.perf_counter() - started, name)
+
+    return wrapper
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest that applies per-method timeouts and records latency, errors, 429s and
+    connection reuse for its pool ('updates' or 'outbound')."""
+
+    instances = weakref.WeakSet()
+
+    def __init__(self, pool: str, method_timeouts: dict = None, **kwargs):
+        self.pool = pool
+        self.method_timeouts = method_timeouts or {}
+        super().__init__(**kwargs)
+        InstrumentedRequest.instances.add(self)
+
+    def _build_client(self):
+        client = super()._build_client()
+        client.event_hooks['request'].append(self._trace_request)
+        return client
+
+    async def _trace_request(self, request) -> None:
+        POOL_REQUESTS.inc(self.pool)
+        request.extensions['trace'] = self._trace
+
+    async def _trace(self, event: str, info: dict) -> None:
+        if event == 'connection.connect_tcp.complete':
+            POOL_CONNECTIONS_OPENED.inc(self.pool)
+
+    def connection_counts(self):
+        """(idle, busy) connections in the pool, or None if httpx internals changed."""
+        try:
+            connections = self._client._transport._pool.connections
+        except AttributeError:
+            return None
+        idle = sum(1 for connection in connections if connection.is_idle())
+        return idle, len(connections) - idle
+
+    async def do_request(self, url: str, method: str, request_data=None,
+                         read_timeout=BaseRequest.DEFAULT_NONE, write_timeout=BaseRequest.DEFAULT_NONE,
+                         connect_timeout=BaseRequest.DEFAULT_NONE, pool_timeout=BaseRequest.DEFAULT_NONE) -> tuple:
+        api_method = 'fileDownload' if '/file/bot' in url else url.rsplit('/', 1)[-1]
+        timeout = self.method_timeouts.get(api_method)
+        if timeout is not None:
+            read_timeout = write_timeout = timeout
+        started = time.perf_counter()
+        try:
+            code, payload = await super().do_request(
+                url, method, request_data, read_timeout, write_timeout, connect_timeout, pool_timeout,
+            )
+        except TelegramError as e:
+            API_ERRORS.inc(api_method, type(e).__name__)
+            raise
+        finally:
+            API_LATENCY.observe(time.perf_counter() - started, api_method)
+        if code == 429:
+            API_RETRY_AFTER.inc(api_method)
+        if code >= 400:
+            API_ERRORS.inc(api_method, str(code))
+        return code, payload
+
+
+def _make_request(pool: str, http_version: str = '1.1', **kwargs) -> InstrumentedRequest:
+    try:
+        return InstrumentedRequest(pool, http_version=http_version, **kwargs)
+    except RuntimeError as e:  # HTTP/2 without the h2 package
+        logger.warning(f"{e} Using HTTP/1.1 for the {pool} pool.")
+        return InstrumentedRequest(pool, http_version='1.1', **kwargs)
+
+
+async def _render_metrics(application: Application) -> str:
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    count, oldest = await storage.pending_stats()
+    outbox = await storage.outbound_stats()
+    stats = getattr(application, 'update_stats', {})
+    gauges = (
+        ('bot_pending_payments', 'Payments waiting for approval.', count),
+        ('bot_pending_oldest_age_seconds', 'Age of the oldest pending payment.',
+         max(time.time() - oldest, 0) if oldest is not None else 0),
+        ('bot_updates_running', 'Updates being handled.', stats.get('running', 0)),
+        ('bot_updates_waiting', 'Updates waiting for their user or a slot.',
+         stats.get('waiting', 0) + application.update_queue.qsize()),
+        ('bot_outbox_queued', 'Outbound jobs waiting to be sent or retried.', outbox.get('queued', 0)),
+        ('bot_outbox_dead', 'Outbound jobs that gave up (see /outbox).', outbox.get('dead', 0)),
+        ('bot_muted_users', 'Users currently muted or banned by flood protection.', flood_guard.muted_count()),
+        ('bot_ready', 'Whether the bot is handling updates (what /readyz reports).', int(startup.ready)),
+        ('bot_startup_seconds', 'Seconds from process start until ready.', startup.ready_after or 0),
+    )
+    for name, help_text, value in gauges:
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {value}']
+    lines += ['# HELP telegram_pool_connections Open Bot API connections.', '# TYPE telegram_pool_connections gauge']
+    for request in list(InstrumentedRequest.instances):
+        counts = request.connection_counts()
+        if counts:
+            for state, value in zip(('idle', 'busy'), counts):
+                lines.append(f'telegram_pool_connections{_format_labels(("pool", "state"), (request.pool, state))} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+# Delivery
+class TokenBucket:
+    """Async token bucket: refills `rate` tokens per second up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or max(rate, 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds: float) -> None:
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class SendLimiter:
+    """Global token bucket plus per-chat spacing for outgoing messages."""
+
+    def __init__(self, global_rate: float, chat_rate: float):
+        self.global_bucket = TokenBucket(global_rate)
+        self.chat_interval = 1.0 / chat_rate
+        self._chat_next = {}
+
+    async def wait(self, chat_id: int) -> None:
+        now = time.monotonic()
+        ready = self._chat_next.get(chat_id, now)
+        self._chat_next[chat_id] = max(ready, now) + self.chat_interval
+        if len(self._chat_next) > 10000:
+            self._chat_next = {cid: t for cid, t in self._chat_next.items() if t > now}
+        if ready > now:
+            await asyncio.sleep(ready - now)
+        await self.global_bucket.acquire()
+
+    def pause(self, seconds: float) -> None:
+        self.global_bucket.pause(seconds)
+
+
+send_limiter = SendLimiter(BROADCAST_GLOBAL_RATE, BROADCAST_CHAT_RATE)
+
+
+def _payload_from_message(message) -> dict:
+    """Describe a message by its already-uploaded file_id so it can be re-sent without re-uploading."""
+    if message.photo:
+        return {'type': 'photo', 'file_id': message.photo[-1].file_id, 'caption': message.caption}
+    if message.document:
+        return {'type': 'document', 'file_id': message.document.file_id, 'caption': message.caption}
+    if message.text:
+        return {'type': 'text', 'text': message.text}
+    return None
+
+
+async def _send_payload(bot, chat_id: int, payload: dict):
+    if payload['type'] == 'album':
+        return await _send_media(bot, chat_id, payload['media'], payload.get('caption'))
+    if payload['type'] == 'photo':
+        return await bot.send_photo(chat_id=chat_id, photo=payload['file_id'], caption=payload.get('caption'))
+    if payload['type'] == 'document':
+        return await bot.send_document(chat_id=chat_id, document=payload['file_id'], caption=payload.get('caption'))
+    return await bot.send_message(
+        chat_id=chat_id, text=payload['text'], parse_mode=payload.get('parse_mode'),
+        reply_markup=payload.get('reply_markup'),
+    )
+
+
+async def _send_media(bot, chat_id: int, media: list, caption: str = None):
+    """Send photo/document payloads; more than one goes out as a single album."""
+    if len(media) == 1:
+        return await _send_payload(bot, chat_id, {**media[0], 'caption': caption or media[0].get('caption')})
+    album = [
+        (InputMediaPhoto if item['type'] == 'photo' else InputMediaDocument)(
+            item['file_id'], caption=caption if i == 0 and caption else item.get('caption'),
+        )
+        for i, item in enumerate(media[:10])  # Telegram's album limit
+    ]
+    return await bot.send_media_group(chat_id=chat_id, media=album)
+
+
+async def _deliver(bot, chat_id: int, payload: dict):
+    """Send a payload through the shared rate limiter, backing off on RetryAfter."""
+    for attempt in range(BROADCAST_MAX_RETRIES + 1):
+        await send_limiter.wait(chat_id)
+        try:
+            return await _send_payload(bot, chat_id, payload)
+        except RetryAfter as e:
+            if attempt == BROADCAST_MAX_RETRIES:
+                raise
+            logger.warning(f"Flood limit hit sending to {chat_id}, retrying in {e.retry_after}s")
+            send_limiter.pause(e.retry_after)
+
+
+# Outbound queue
+# A job is one or more payloads for one chat, sent in order. It is stored before anything is sent, so
+# a failed or interrupted send is retried with backoff instead of lost; after OUTBOX_MAX_ATTEMPTS it is
+# dead-lettered for /outbox. Jobs with a key that was already queued are dropped as duplicates.
+# Kinds: 'admin' (to the admin), 'notice' (to a user), 'delivery' (a tip; counted once sent), 'reminder'.
+outbox_wakeup = asyncio.Event()
+outbox_task = None
+
+
+def _outbound_part(payload: dict) -> dict:
+    """Jobs are stored as JSON, so keyboards are kept as dicts until they are sent."""
+    markup = payload.get('reply_markup')
+    if markup is not None and not isinstance(markup, dict):
+        payload = {**payload, 'reply_markup': markup.to_dict()}
+    return payload
+
+
+async def _enqueue(chat_id: int, parts: list, kind: str, key: str = None, notify: int = None) -> bool:
+    """Queue payloads for `chat_id`; False if a job with `key` was queued before. `notify` is the admin
+    told if a notice or delivery is dead-lettered (default: the owner)."""
+    now = time.time()
+    job = {
+        'key': key or uuid.uuid4().hex,
+        'chat_id': chat_id,
+        'kind': kind,
+        'notify': notify,
+        'parts': [_outbound_part(part) for part in parts],
+        'sent': 0,
+        'attempts': 0,
+        'status': 'queued',
+        'due': now,
+        'error': None,
+        'created_at': now,
+        'updated_at': now,
+    }
+    queued = await storage.enqueue_outbound(job)
+    OUTBOX_JOBS.inc('queued' if queued else 'duplicate')
+    if queued:
+        outbox_wakeup.set()
+    return queued
+
+
+async def _send_job(bot, job: dict) -> None:
+    for payload in job['parts'][job['sent']:]:
+        if isinstance(payload.get('reply_markup'), dict):
+            payload = {**payload, 'reply_markup': InlineKeyboardMarkup.de_json(payload['reply_markup'], bot)}
+        await send_limiter.wait(job['chat_id'])
+        await _send_payload(bot, job['chat_id'], payload)
+        job['sent'] += 1  # a retry picks up after the parts that already went out
+
+
+async def _run_outbound(bot, job: dict) -> None:
+    try:
+        await _send_job(bot, job)
+        job['status'] = 'sent'
+    except RetryAfter as e:
+        # Flood control is not the job's fault: wait it out without using up an attempt
+        send_limiter.pause(e.retry_after)
+        job['due'] = time.time() + e.retry_after
+    except (Forbidden, BadRequest) as e:
+        # Blocked bot, unknown chat, bad file id: retrying won't help
+        job['status'] = 'dead'
+        job['error'] = str(e)
+    except Exception as e:
+        job['attempts'] += 1
+        job['error'] = str(e)
+        if job['attempts'] >= OUTBOX_MAX_ATTEMPTS:
+            job['status'] = 'dead'
+        else:
+            job['due'] = time.time() + min(OUTBOX_RETRY_BASE * 2 ** (job['attempts'] - 1), OUTBOX_RETRY_MAX)
+    job['updated_at'] = time.time()
+    await storage.save_outbound(job)
+    OUTBOX_JOBS.inc('retried' if job['status'] == 'queued' else job['status'])
+
+    if job['status'] == 'sent' and job['kind'] == 'delivery':
+        await _record_delivery(job['chat_id'], 'send')
+    elif job['status'] == 'dead':
+        logger.error(f"Outbound {job['kind']} {job['key']} to {job['chat_id']} dead-lettered: {job['error']}")
+        notify = job.get('notify') or (int(ADMIN_ID) if ADMIN_ID else None)
+        if notify and job['kind'] in ('notice', 'delivery'):
+            await _enqueue(notify, [{
+                'type': 'text',
+                'text': (
+                    f"📭 A message to {job['chat_id']} could not be delivered "
+                    f"({job['sent']}/{len(job['parts'])} parts sent): {job['error']}\n\n"
+                    "Use /outbox to review and /outbox_retry to try again."
+                ),
+            }], 'admin', key=f"dead:{job['key']}:{job['updated_at']:.0f}")
+
+
+async def _outbox_worker(bot) -> None:
+    """Send due jobs, OUTBOX_WORKERS at a time. Woken by _enqueue; polls for retries coming due."""
+    running = set()
+    purged_at = 0
+    try:
+        while True:
+            try:
+                if len(running) >= OUTBOX_WORKERS:
+                    await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                outbox_wakeup.clear()
+                free = OUTBOX_WORKERS - len(running)
+                jobs = await storage.claim_outbound(time.time(), OUTBOX_LEASE, free)
+                for job in jobs:
+                    task = asyncio.get_running_loop().create_task(_run_outbound(bot, job))
+                    running.add(task)
+                    task.add_done_callback(running.discard)
+                if time.time() - purged_at > 3600:
+                    purged_at = time.time()
+                    await storage.purge_outbound(purged_at - OUTBOX_KEEP)
+                if len(jobs) == free:
+                    continue  # there may be more due right away
+                wakeup = asyncio.get_running_loop().create_task(outbox_wakeup.wait())
+                try:
+                    await asyncio.wait([wakeup], timeout=OUTBOX_POLL_INTERVAL)
+                finally:
+                    wakeup.cancel()
+            except Exception as e:
+                logger.error(f"Outbox worker error: {e}")
+                await asyncio.sleep(OUTBOX_POLL_INTERVAL)
+    finally:
+        # Interrupted jobs keep their lease and are picked up again after a restart
+        for task in running:
+            task.cancel()
+
+
+# Subscriptions
+def _end_subscription(user: dict, reason: str) -> None:
+    user['is_premium'] = False
+    user['subscription_status'] = reason  # 'expired' or 'used_up'
+    SUBSCRIPTIONS_ENDED.inc(reason)
+
+
+async def _record_delivery(user_id: int, source: str) -> None:
+    """Count a delivered tip against the user's odds; the last one ends the subscription."""
+    events.record('delivery', user_id=user_id, source=source)
+    used_up = False
+    async with storage.lock(f'user:{user_id}'):
+        user = await storage.get_user(user_id)
+        if user is None:
+            return
+        user['tips_received'] = user.get('tips_received', 0) + 1
+        if user.get('is_premium') and user.get('odds_remaining') is not None:
+            user['odds_remaining'] = max(user['odds_remaining'] - 1, 0)
+            if not user['odds_remaining']:
+                _end_subscription(user, 'used_up')
+                used_up = True
+        await storage.save_user(user_id, user)
+    if used_up:
+        await _send_renewal_reminders([user_id], 'renewal_used_up')
+
+
+async def _send_renewal_reminders(user_ids: list, template: str) -> None:
+    payload = {
+        'type': 'text',
+        'parse_mode': 'HTML',
+        'text': templates.text(template),
+        'reply_markup': templates.keyboard('plans'),
+    }
+    for user_id in user_ids:
+        await _enqueue(user_id, [payload], 'reminder')
+
+
+async def _expire_subscriptions() -> int:
+    """End every subscription past its expiry, a batch at a time off the expiry index."""
+    now = time.time()
+    total = 0
+    while True:
+        expired = []
+        user_ids = await storage.expiring_user_ids(now, SUBSCRIPTION_EXPIRY_BATCH)
+        for user_id in user_ids:
+            async with storage.lock(f'user:{user_id}'):
+                user = await storage.get_user(user_id)
+                # Re-check under the lock: the user may have renewed, or another replica got here first
+                if not user or not user.get('is_premium') or (user.get('subscription_expires') or now + 1) > now:
+                    continue
+                _end_subscription(user, 'expired')
+                await storage.save_user(user_id, user)
+                expired.append(user_id)
+        await _send_renewal_reminders(expired, 'renewal_expired')
+        total += len(expired)
+        if len(user_ids) < SUBSCRIPTION_EXPIRY_BATCH or not expired:
+            break
+    if total:
+        logger.info(f"Expired {total} subscriptions")
+    return total
+
+
+async def _subscription_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    await _expire_subscriptions()
+
+
+async def _backfill_subscriptions() -> None:
+    """Premium users from before subscriptions expired get a fresh term starting now."""
+    if await storage.get_meta('subscriptions_backfilled'):
+        return
+    count = 0
+    for user_id in await storage.premium_user_ids():
+        async with storage.lock(f'user:{user_id}'):
+            user = await storage.get_user(user_id)
+            if not user or user.get('subscription_expires'):
+                continue
+            tier_info = SUBSCRIPTION_TIERS.get(user.get('subscription_tier'), SUBSCRIPTION_TIERS[DEFAULT_TIER])
+            user['subscription_start'] = time.time()
+            user['subscription_expires'] = user['subscription_start'] + tier_info.get('days', SUBSCRIPTION_DAYS) * 86400
+            user['odds_remaining'] = tier_info['odds']
+            user['subscription_status'] = 'active'
+            await storage.save_user(user_id, user)
+            count += 1
+    await storage.set_meta('subscriptions_backfilled', datetime.now().isoformat())
+    if count:
+        logger.info(f"Started subscription terms for {count} existing premium users")
+
+
+# Duplicate screenshots
+class BKTree:
+    """Burkhard-Keller tree over 64-bit hashes with Hamming distance."""
+
+    def __init__(self):
+        self.root = None  # [hash, items, {distance: child}]
+
+    def add(self, value: int, item) -> None:
+        if self.root is None:
+            self.root = [value, [item], {}]
+            return
+        node = self.root
+        while True:
+            distance = (value ^ node[0]).bit_count()
+            if distance == 0:
+                node[1].append(item)
+                return
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [value, [item], {}]
+                return
+            node = child
+
+    def search(self, value: int, radius: int) -> list:
+        results = []
+        stack = [self.root] if self.root else []
+        while stack:
+            node = stack.pop()
+            distance = (value ^ node[0]).bit_count()
+            if distance <= radius:
+                results.extend((distance, item) for item in node[1])
+            for child_distance, child in node[2].items():
+                if distance - radius <= child_distance <= distance + radius:
+                    stack.append(child)
+        return results
+
+
+_screenshot_tree = BKTree()
+_screenshot_tree_cursor = None
+_screenshot_tree_lock = asyncio.Lock()
+duplicate_reports = []
+
+
+async def _screenshot_index() -> BKTree:
+    """BK-tree over every stored screenshot hash. Built from storage on first use, then
+    topped up with hashes recorded since (including those from other replicas)."""
+    global _screenshot_tree_cursor
+    async with _screenshot_tree_lock:
+        hashes, _screenshot_tree_cursor = await storage.screenshot_hashes(_screenshot_tree_cursor)
+        for phash, uid in hashes:
+            _screenshot_tree.add(phash, uid)
+    return _screenshot_tree
+
+
+def _dhash(data: bytes):
+    """64-bit difference hash: compare adjacent pixels of a 9x8 grayscale thumbnail."""
+    Image = _optional_module('PIL.Image')
+    try:
+        image = Image.open(io.BytesIO(data)).convert('L').resize((9, 8), Image.LANCZOS)
+    except Exception:
+        return None
+    pixels = list(image.getdata())
+    value = 0
+    for row in range(8):
+        for col in range(8):
+            value = (value << 1) | (pixels[row * 9 + col] > pixels[row * 9 + col + 1])
+    return value
+
+
+async def _download_screenshot(bot, media):
+    if (media.file_size or 0) > SCREENSHOT_MAX_DOWNLOAD:
+        return None
+    try:
+        file = await bot.get_file(media.file_id)
+        return bytes(await file.download_as_bytearray())
+    except TelegramError as e:
+        logger.error(f"Could not download screenshot {media.file_id}: {e}")
+        return None
+
+
+async def _find_duplicates(bot, media, user_id: int) -> tuple:
+    """Record a screenshot and return (phash, ids of users who sent the same or a near-identical image,
+    downloaded bytes). Exact file_unique_id matches skip the download entirely."""
+    matches = await storage.find_screenshot_users(media.file_unique_id)
+    phash = data = None
+    hashing = _optional_module('PIL.Image') is not None
+    if not matches and (hashing or OCR_ENABLED):
+        data = await _download_screenshot(bot, media)
+    if data and hashing:
+        phash = await asyncio.to_thread(_dhash, data)
+        if phash is not None:
+            index = await _screenshot_index()
+            matches = [uid for _, uid in index.search(phash, DUPLICATE_HASH_DISTANCE)]
+    await storage.save_screenshot(media.file_unique_id, user_id, phash)
+    return phash, sorted(set(matches)), data
+
+
+async def _queue_duplicate_report(application, admin_id: int, user_id: int, username: str,
+                                  matches: list) -> None:
+    """Collect flagged screenshots and send each admin one grouped message about theirs."""
+    duplicate_reports.append((admin_id, user_id, username, matches))
+    if application.job_queue is None:
+        # No JobQueue to delay the report with: send it straight away
+        await _send_duplicate_report()
+    elif len(duplicate_reports) == 1:
+        application.job_queue.run_once(_duplicate_report_job, DUPLICATE_REPORT_DELAY, name='duplicate_report')
+
+
+async def _duplicate_report_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    await _send_duplicate_report()
+
+
+async def _send_duplicate_report() -> None:
+    reports = {}
+    for admin_id, *report in duplicate_reports:
+        reports.setdefault(admin_id, []).append(report)
+    duplicate_reports.clear()
+    for admin_id, items in reports.items():
+        lines = [
+            f"• {html.escape(username or '')} (<code>{uid}</code>) matches "
+            + ', '.join('own earlier upload' if m == uid else str(m) for m in matches)
+            for uid, username, matches in items[:40]
+        ]
+        if len(items) > 40:
+            lines.append(f"…and {len(items) - 40} more")
+        await _enqueue(admin_id, [{
+            'type': 'text',
+            'parse_mode': 'HTML',
+            'text': (
+                f"<b>⚠️ {len(items)} Duplicate Payment Screenshot(s)</b>\n\n"
+                + "\n".join(lines)
+                + "\n\nThey are marked ⚠️ in /pending."
+            ),
+        }], 'admin')
+
+
+# OCR pre-verification
+_ocr_pool = None
+
+
+def _ocr_text(data: bytes) -> str:
+    """Runs in a worker process."""
+    image = _optional_module('PIL.Image').open(io.BytesIO(data)).convert('L')
+    return _optional_module('pytesseract').image_to_string(image)
+
+
+def _parse_momo_receipt(text: str) -> dict:
+    """Pull amount, recipient number/name and transaction reference out of OCR text."""
+    # Join digit groups split by spaces or dashes (e.g. "050 301 3078")
+    compact = re.sub(r'(?<=\d)[ \-](?=\d)', '', text)
+    amounts = [
+        float(value.replace(',', ''))
+        for value in re.findall(r'(?:GHS|GH¢|GH₵|GHC|¢|₵)\s*([\d,]+(?:\.\d{1,2})?)', compact, re.IGNORECASE)
+    ]
+    amounts += [
+        float(value.replace(',', ''))
+        for value in re.findall(r'([\d,]+\.\d{2})\s*(?:GHS|GHC|cedis?)', compact, re.IGNORECASE)
+    ]
+    numbers = ['0' + match for match in re.findall(r'(?<!\d)(?:\+?233|0)(\d{9})(?!\d)', compact)]
+    reference = re.search(
+        r'(?:Transaction\s*ID|Trans\.?\s*ID|Financial\s*Transaction\s*Id|Reference|Ref)\s*[:#.]?\s*([A-Z0-9.]{6,})',
+        text, re.IGNORECASE,
+    )
+    lowered = text.lower()
+    name_tokens = [token for token in PAYMENT_NAME.lower().split() if len(token) > 1]
+    name_match = sum(token in lowered for token in name_tokens) / len(name_tokens) if name_tokens else 0.0
+    return {
+        'amounts': amounts,
+        'numbers': numbers,
+        'name_match': name_match,
+        'reference': reference.group(1) if reference else None,
+    }
+
+
+def _score_receipt(receipt: dict, tier_key: str) -> dict:
+    """Check a parsed receipt against PAYMENT_NUMBER, PAYMENT_NAME and the tier price."""
+    price = SUBSCRIPTION_TIERS.get(tier_key, SUBSCRIPTION_TIERS['tier3'])['price']
+    receipt['amount_ok'] = any(abs(amount - price) < 0.01 for amount in receipt['amounts'])
+    receipt['number_ok'] = '0' + re.sub(r'\D', '', PAYMENT_NUMBER)[-9:] in receipt['numbers']
+    score = 0.4 * receipt['amount_ok'] + 0.3 * receipt['number_ok'] + 0.2 * receipt['name_match']
+    if receipt['reference']:
+        score += 0.1
+    receipt['confidence'] = round(score, 2)
+    return receipt
+
+
+async def _ocr_verify(data: bytes, tier_key: str):
+    """Return the parsed receipt with a confidence score, or None if OCR is unavailable or fails."""
+    global _ocr_pool
+    if not OCR_ENABLED or not data:
+        return None
+    if _optional_module('pytesseract') is None or _optional_module('PIL.Image') is None:
+        return None
+    if _ocr_pool is None:
+        import multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        # spawn: forking a process that already runs threads (SQLite, HTTP) is not safe
+        _ocr_pool = ProcessPoolExecutor(max_workers=OCR_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+    try:
+        text = await asyncio.get_running_loop().run_in_executor(_ocr_pool, _ocr_text, data)
+    except Exception as e:
+        logger.error(f"OCR failed: {e}")
+        return None
+    return _score_receipt(_parse_momo_receipt(text), tier_key)
+
+
+def _shutdown_ocr_pool() -> None:
+    global _ocr_pool
+    if _ocr_pool is not None:
+        _ocr_pool.shutdown(wait=False, cancel_futures=True)
+        _ocr_pool = None
+
+
+# Broadcast
+# Last broadcast run: kept (and persisted) so a run cut off by a restart picks up again on the next boot,
+# and one stopped with /broadcast_cancel can be resumed with /broadcast_resume.
+broadcast_state = {}
+BROADCAST_SAVE_EVERY = 100
+
+
+async def _save_broadcast_state() -> None:
+    state = {key: value for key, value in broadcast_state.items() if key != 'task'}
+    state['done'] = list(state['done'])
+    state['failed_ids'] = list(state['failed_ids'])
+    await storage.set_meta('broadcast', state)
+
+
+async def _restore_broadcast_state(application) -> None:
+    state = await storage.get_meta('broadcast')
+    if not state:
+        return
+    state['done'] = set(state['done'])
+    state['failed_ids'] = set(state['failed_ids'])
+    if state['status'] in ('pending', 'running'):
+        state['status'] = 'interrupted'
+    broadcast_state.update(state)
+    admin_id = state.get('admin_id') or (int(ADMIN_ID) if ADMIN_ID else None)
+    if state['status'] == 'interrupted' and admin_id:
+        logger.info(f"Resuming broadcast: {len(state['recipients']) - len(state['done'])} recipients left")
+        _spawn_broadcast(application.bot, admin_id)
+
+
+async def _run_broadcast(bot, admin_id: int) -> None:
+    state = broadcast_state
+    queue = asyncio.Queue()
+    for chat_id in state['recipients']:
+        if chat_id not in state['done']:
+            queue.put_nowait(chat_id)
+
+    async def worker() -> None:
+        while True:
+            try:
+                chat_id = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            try:
+                await _deliver(bot, chat_id, state['payload'])
+                state['delivered'] += 1
+                state['done'].add(chat_id)
+                await _record_delivery(chat_id, 'broadcast')
+            except Forbidden:
+                state['blocked'] += 1
+                state['done'].add(chat_id)
+            except TelegramError as e:
+                logger.error(f"Broadcast to {chat_id} failed: {e}")
+                state['failed'] += 1
+                state['failed_ids'].add(chat_id)
+                state['done'].add(chat_id)
+            if len(state['done']) % BROADCAST_SAVE_EVERY == 0:
+                await _save_broadcast_state()
+
+    state['status'] = 'running'
+    started = time.monotonic()
+    try:
+        await asyncio.gather(*(worker() for _ in range(min(BROADCAST_WORKERS, queue.qsize()) or 1)))
+    except asyncio.CancelledError:
+        # /broadcast_cancel sets 'cancelled' first; anything else is a shutdown, resumed on the next boot
+        if state['status'] != 'cancelled':
+            state['status'] = 'interrupted'
+        raise
+    finally:
+        state['elapsed'] = state.get('elapsed', 0) + time.monotonic() - started
+        # A resume may already have replaced this task
+        if state.get('task') is asyncio.current_task():
+            state['task'] = None
+        await _save_broadcast_state()
+    state['status'] = 'finished'
+    await _save_broadcast_state()
+    try:
+        await bot.send_message(chat_id=admin_id, text=_broadcast_report(state), parse_mode='HTML')
+    except TelegramError as e:
+        logger.error(f"Could not send broadcast report to admin: {e}")
+
+
+def _broadcast_report(state: dict) -> str:
+    total = len(state['recipients'])
+    return (
+        f"<b>📣 Broadcast {state['status'].title()}</b>\n\n"
+        f"Recipients: {total}\n"
+        f"Delivered: {state['delivered']}\n"
+        f"Failed: {state['failed']}\n"
+        f"Blocked: {state['blocked']}\n"
+        f"Remaining: {total - len(state['done'])}\n"
+        f"Time: {state.get('elapsed', 0):.1f}s"
+    )
+
+
+async def _start_broadcast(application, admin_id: int, payload: dict) -> int:
+    recipients = await storage.premium_user_ids()
+    broadcast_state.clear()
+    broadcast_state.update({
+        'payload': payload,
+        'recipients': recipients,
+        'done': set(),
+        'failed_ids': set(),
+        'delivered': 0,
+        'failed': 0,
+        'blocked': 0,
+        'status': 'pending',
+        'admin_id': admin_id,
+    })
+    _spawn_broadcast(application.bot, admin_id)
+    return len(recipients)
+
+
+def _spawn_broadcast(bot, admin_id: int) -> None:
+    # A plain task rather than application.create_task, which Application.stop() would wait on;
+    # _post_shutdown cancels it and the run can be resumed after a restart.
+    broadcast_state['task'] = asyncio.get_running_loop().create_task(_run_broadcast(bot, admin_id))
+
+
+# Scheduled releases
+# The day's tips are uploaded once and released to every premium user at a set time, wave by wave.
+# Each release is stored under meta 'release:<id>'; meta 'releases' lists the ids, newest last.
+release_tasks = {}  # release id -> running asyncio task
+cancelled_releases = set()  # ids stopped by /schedule_cancel; any other cancellation is a shutdown
+
+
+def _parse_release_time(args: list) -> datetime:
+    """'HH:MM [YYYY-MM-DD]' in RELEASE_TIMEZONE; without a date, the next time that clock time comes round."""
+    now = datetime.now(RELEASE_TIMEZONE)
+    clock = datetime.strptime(args[0], '%H:%M').time()
+    if len(args) > 1:
+        day = datetime.strptime(args[1], '%Y-%m-%d').date()
+        return datetime.combine(day, clock, RELEASE_TIMEZONE)
+    when = datetime.combine(now.date(), clock, RELEASE_TIMEZONE)
+    if when <= now:
+        when = datetime.combine(now.date() + timedelta(days=1), clock, RELEASE_TIMEZONE)
+    return when
+
+
+def _format_release_time(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, RELEASE_TIMEZONE).strftime('%Y-%m-%d %H:%M %Z')
+
+
+async def _save_release(release: dict) -> None:
+    await storage.set_meta(f"release:{release['id']}", release)
+
+
+async def _release_ids() -> list:
+    return await storage.get_meta('releases') or []
+
+
+def _schedule_release_job(application, release: dict) -> None:
+    delay = max(release['release_at'] - time.time(), 0)
+    application.job_queue.run_once(_release_job, delay, data=release['id'], name=f"release:{release['id']}")
+
+
+async def _create_release(application, admin_id: int, payload: dict, release_at: float) -> dict:
+    """Send the admin a preview, reuse the file_id Telegram returns for it, and schedule the release."""
+    preview = await _send_payload(application.bot, admin_id, payload)
+    if payload['type'] == 'photo' and preview.photo:
+        payload = {**payload, 'file_id': preview.photo[-1].file_id}
+    elif payload['type'] == 'document' and preview.document:
+        payload = {**payload, 'file_id': preview.document.file_id}
+    release = {
+        'id': str(int(time.time() * 1000)),
+        'release_at': release_at,
+        'payload': payload,
+        'admin_id': admin_id,
+        'status': 'scheduled',
+        'recipients': [],
+        'done': [],
+        'failed_ids': [],
+        'delivered': 0,
+        'failed': 0,
+        'blocked': 0,
+        'waves': 0,
+        'elapsed': 0,
+        'expected': len(await storage.premium_user_ids()),
+    }
+    await _save_release(release)
+    async with storage.lock('releases'):
+        ids = await _release_ids()
+        ids.append(release['id'])
+        await storage.set_meta('releases', ids[-RELEASE_HISTORY:])
+    _schedule_release_job(application, release)
+    return release
+
+
+async def _restore_releases(application) -> None:
+    """Re-register scheduled releases after a restart; releases cut off mid-run resume where they stopped."""
+    if application.job_queue is None:
+        return
+    for release_id in await _release_ids():
+        release = await storage.get_meta(f'release:{release_id}')
+        if not release:
+            continue
+        if release['status'] == 'running':
+            release['status'] = 'interrupted'
+            await _save_release(release)
+        if release['status'] in ('scheduled', 'interrupted'):
+            _schedule_release_job(application, release)
+
+
+async def _release_job(context: ContextTypes.DEFAULT_TYPE) -> None:
+    release_id = context.job.data
+    release_tasks[release_id] = asyncio.current_task()
+    try:
+        await _run_release(context.bot, release_id)
+    finally:
+        release_tasks.pop(release_id, None)
+
+
+async def _run_release(bot, release_id: str) -> None:
+    # Claim the release: with several replicas every one of them fires the job, only one runs it
+    async with storage.lock(f'release:{release_id}'):
+        release = await storage.get_meta(f'release:{release_id}')
+        if not release or release['status'] not in ('scheduled', 'interrupted'):
+            return
+        if release['status'] == 'scheduled':
+            if time.time() - release['release_at'] > RELEASE_MISSED_GRACE:
+                release['status'] = 'missed'
+                await _save_release(release)
+                await _release_progress(bot, release)
+                return
+            release['recipients'] = await storage.premium_user_ids()
+        release['status'] = 'running'
+        await _save_release(release)
+
+    done = set(release['done'])
+    failed_ids = set(release['failed_ids'])
+    remaining = [chat_id for chat_id in release['recipients'] if chat_id not in done]
+    slots = asyncio.Semaphore(BROADCAST_WORKERS)
+
+    async def send(chat_id: int) -> None:
+        async with slots:
+            try:
+                await _deliver(bot, chat_id, release['payload'])
+                release['delivered'] += 1
+                done.add(chat_id)
+                await _record_delivery(chat_id, 'release')
+            except Forbidden:
+                release['blocked'] += 1
+                done.add(chat_id)
+            except TelegramError as e:
+                logger.error(f"Release {release_id} to {chat_id} failed: {e}")
+                release['failed'] += 1
+                failed_ids.add(chat_id)
+                done.add(chat_id)
+
+    await _release_progress(bot, release)
+    started = time.monotonic()
+    try:
+        for offset in range(0, len(remaining), RELEASE_WAVE_SIZE):
+            await asyncio.gather(*(send(chat_id) for chat_id in remaining[offset:offset + RELEASE_WAVE_SIZE]))
+            release['waves'] += 1
+            release['done'], release['failed_ids'] = list(done), list(failed_ids)
+            release['elapsed'] += time.monotonic() - started
+            started = time.monotonic()
+            await _save_release(release)
+            await _release_progress(bot, release)
+    except asyncio.CancelledError:
+        # Stopped by a shutdown rather than /schedule_cancel: the next boot resumes from `done`
+        release['status'] = 'cancelled' if release_id in cancelled_releases else 'interrupted'
+        raise
+    finally:
+        cancelled_releases.discard(release_id)
+        release['done'], release['failed_ids'] = list(done), list(failed_ids)
+        if release['status'] == 'running':
+            release['status'] = 'finished'
+        await _save_release(release)
+        await _release_progress(bot, release)
+
+
+def _release_report(release: dict) -> str:
+    total = len(release['recipients'])
+    lines = [
+        f"<b>📅 Tip Release {release['status'].title()}</b>\n",
+        f"ID: <code>{release['id']}</code>",
+        f"Release time: {_format_release_time(release['release_at'])}",
+    ]
+    if release['status'] == 'scheduled':
+        expected = release.get('expected', 0)
+        lines.append(
+            f"Premium users now: {expected} (about {expected / BROADCAST_GLOBAL_RATE:.0f}s to deliver "
+            f"in waves of {RELEASE_WAVE_SIZE})"
+        )
+    else:
+        lines += [
+            f"Recipients: {total}",
+            f"Delivered: {release['delivered']}",
+            f"Failed: {release['failed']}",
+            f"Blocked: {release['blocked']}",
+            f"Remaining: {total - len(release['done'])}",
+            f"Waves: {release['waves']}",
+            f"Time: {release['elapsed']:.1f}s",
+        ]
+    return '\n'.join(lines)
+
+
+async def _release_progress(bot, release: dict) -> None:
+    """Keep one progress message per release up to date in the admin chat."""
+    text = _release_report(release)
+    try:
+        if release.get('progress_message_id'):
+            await bot.edit_message_text(
+                chat_id=release['admin_id'], message_id=release['progress_message_id'], text=text, parse_mode='HTML',
+            )
+        else:
+            message = await bot.send_message(chat_id=release['admin_id'], text=text, parse_mode='HTML')
+            release['progress_message_id'] = message.message_id
+    except BadRequest as e:
+        if 'not modified' not in str(e).lower():
+            logger.error(f"Could not update release progress: {e}")
+    except TelegramError as e:
+        logger.error(f"Could not update release progress: {e}")
+
+
+# Callback data
+class CallbackRouter:
+    """Callback queries dispatched with one dict lookup on the prefix of their data.
+
+    Data is "prefix:field:field…", at most 64 bytes (the Bot API limit): ints are written in base 36,
+    and signed routes (admin actions) end in a truncated HMAC, so nobody can craft callback data for
+    a button the bot never sent them. Each route declares its field types to decode them.
+    """
+
+    MAX_BYTES = 64
+
+    def __init__(self, secret: bytes):
+        self.secret = secret
+        self.routes = {}  # prefix -> (handler, field types, signed)
+
+    def route(self, prefix: str, *types, signed: bool = False, aliases=()):
+        """Register `handler(update, context, *fields)`; `aliases` are older data forms that still arrive
+        from buttons sent before (matched whole, or as "alias_<last field>")."""
+        def decorator(handler):
+            self.routes[prefix] = (_instrumented(handler), types, signed)
+            for alias in aliases:
+                self.routes[alias] = self.routes[prefix]
+            return handler
+        return decorator
+
+    @staticmethod
+    def _encode(value) -> str:
+        if isinstance(value, int):
+            digits = ''
+            number = abs(value)
+            while True:
+                number, digit = divmod(number, 36)
+                digits = '0123456789abcdefghijklmnopqrstuvwxyz'[digit] + digits
+                if not number:
+                    return ('-' if value < 0 else '') + digits
+        return str(value)
+
+    def _sign(self, data: str) -> str:
+        digest = hmac.new(self.secret, data.encode(), hashlib.sha256).digest()[:8]
+        return base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
+
+    def data(self, prefix: str, *fields) -> str:
+        data = ':'.join([prefix, *map(self._encode, fields)])
+        if self.routes.get(prefix, (None, (), False))[2]:
+            data += ':' + self._sign(data)
+        if len(data.encode()) > self.MAX_BYTES:
+            raise ValueError(f'Callback data over {self.MAX_BYTES} bytes: {data}')
+        return data
+
+    def pattern(self) -> re.Pattern:
+        """For CallbackQueryHandler: data this router has a route for."""
+        prefixes = '|'.join(sorted(map(re.escape, self.routes), key=len, reverse=True))
+        return re.compile(rf'^(?:{prefixes})(?:[:_]|$)')
+
+    def _resolve(self, data: str):
+        prefix, _, rest = data.partition(':')
+        if prefix in self.routes:
+            return self.routes[prefix], rest.split(':') if rest else []
+        alias = data
+        while '_' in alias:  # "subscribe_tier_x" -> "subscribe_tier", then "subscribe"
+            alias = alias.rpartition('_')[0]
+            if alias in self.routes:
+                return self.routes[alias], [data[len(alias) + 1:]]
+        return None, None
+
+    async def expired(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        """Buttons no route matches, e.g. from a removed feature: stop the client's spinner."""
+        await update.callback_query.answer("This button is no longer valid.")
+
+    async def dispatch(self, update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+        query = update.callback_query
+        route, fields = self._resolve(query.data or '')
+        if route is None:
+            await self.expired(update, context)
+            return
+        handler, types, signed = route
+        if signed:
+            signature = fields.pop() if fields else ''
+            unsigned = query.data[:-len(signature) - 1]
+            if not signature or not hmac.compare_digest(signature, self._sign(unsigned)):
+                await query.answer("This button is no longer valid.", show_alert=True)
+                return
+        try:
+            values = [int(field, 36) if kind is int else field for kind, field in zip(types, fields, strict=True)]
+        except ValueError:
+            await query.answer("This button is no longer valid.", show_alert=True)
+            return
+        await handler(update, context, *values)
+
+
+callbacks = CallbackRouter(
+    (CALLBACK_SECRET or '').encode() or hmac.new(BOT_TOKEN.encode(), b'callback-data', hashlib.sha256).digest()
+)
+
+
+# Templates
+# `{name}` is filled from config when templates are compiled; `{{name}}` is a per-user fragment
+# filled in at send time.
+TEMPLATES = {
+    'en': {
+        'plan_line': "💰 {price} GHS - {tier_name}",
+        'paystack_hint': (
+            "Enter your Telegram ID <code>{{user_id}}</code> on the Paystack page "
+            "and your plan activates automatically.\n\n"
+        ),
+        'admin_welcome': (
+            "<b>👋 Welcome Admin!</b>\n\n"
+            "You are now set up to receive payment screenshots and notifications.\n\n"
+            "Commands:\n/pending, /approve [user_id], /send [user_id], /broadcast, /test\n"
+            "Team: /admins, /online, /offline\n"
+            "Reports: /stats, /export"
+        ),
+        'welcome': (
+            "<b>Welcome to {owner}! 🎲</b>\n\n"
+            "Hi {{mention}}!\n\n"
+            "<b>Available Plan:</b>\n{plans}\n\n"
+            "<b>Features:</b>\n"
+            "✅ Daily betting odds\n✅ Expert analysis\n✅ Multiple sports covered\n✅ High accuracy predictions\n\n"
+            "Subscribe now to unlock premium tips!"
+        ),
+        'help': (
+            "<b>{owner} - Help</b>\n\n"
+            "<b>Commands:</b>\n"
+            "/start, /pay, /status, /tips, /help\n\n"
+            "<b>Available Plan:</b>\n{plans}\n\n"
+            "<b>How to subscribe:</b>\n"
+            "1. Open /start\n"
+            "2. Tap 'Pay with Paystack' or pay via MoMo\n"
+            "3. MOMO Number: {payment_number}\n"
+            "4. Send screenshot if you didn't use Paystack\n"
+            "5. Wait for approval and receive your odds\n\n"
+            "<b>Contact Support:</b> Reply with 'support'"
+        ),
+        'start_first': "Please use /start first to initialize your account.",
+        'status': (
+            "<b>Your Account Status</b>\n\n"
+            "Status: {{status}}\n"
+            "{{subscription}}"
+            "Tips Received: {{tips_received}}\n"
+            "Joined: {{joined}}\n"
+        ),
+        'status_subscription': "Odds Left: {{odds_remaining}}\nExpires: {{expires}}\n",
+        'status_premium': "✅ Premium",
+        'status_free': "❌ Free",
+        'tips_locked': (
+            "<b>Premium Content</b>\n\n"
+            "Subscribe to get access to today's betting tips!\n\n"
+            "Our premium members receive:\n"
+            "🎯 Daily expert predictions\n"
+            "📊 Detailed analysis\n"
+            "💰 High-value betting opportunities"
+        ),
+        'tips_delivery': (
+            "<b>🎯 Premium Tips Delivery</b>\n\n"
+            "Your odds will be sent to you as an image by the admin shortly.\n\n"
+            "If you haven't received it, reply with 'support' to contact {owner}."
+        ),
+        'pay': (
+            "<b>Secure Payment</b>\n\n"
+            "Tap the button below to pay with Paystack.\n\n"
+            "{paystack_hint}"
+            "If you pay via mobile money directly, please send a screenshot for verification."
+        ),
+        'menu': "<b>Welcome to {owner}! 🎲</b>\n\n<b>Available Plan:</b>\n{plans}\n\n",
+        'subscribe': (
+            "<b>Subscribe to {tier_name}</b>\n\n"
+            "<b>Price: {price} GHS</b>\n"
+            "<b>You'll get: {odds} Odds</b>\n\n"
+            "<b>📱 Payment Details:</b>\n"
+            "Method: {payment_method}\n"
+            "Number: {payment_number}\n"
+            "Name: {payment_name}\n\n"
+            "<b>Send {price} GHS to the above number</b>\n\n"
+            "After payment:\n"
+            "1️⃣ Take a screenshot of the payment\n"
+            "2️⃣ Click 'Send Payment Screenshot'\n"
+            "3️⃣ Upload the screenshot\n"
+            "4️⃣ Wait for approval from {owner}\n\n"
+            "<i>Your odds will be sent after approval</i>"
+        ),
+        'upload_screenshot': (
+            "<b>📸 Send Payment Screenshot</b>\n\n"
+            "Please send a screenshot of your payment confirmation.\n"
+            "Make sure it clearly shows your amount, recipient number, reference, and name."
+        ),
+        'get_tips_locked': "<b>Premium Content</b>\n\nSubscribe to get access to today's betting tips!",
+        'get_tips_delivery': (
+            "<b>🎯 Premium Tips Delivery</b>\n\nYour odds will be sent to you as an image by the admin shortly."
+        ),
+        'how_it_works': (
+            "<b>How {owner} Works</b>\n\n"
+            "1️⃣ <b>Choose Plan</b> - {price} GHS for {odds} Odds\n"
+            "2️⃣ <b>Pay</b> - Use the Paystack button or pay via {payment_method} to {payment_number}\n"
+            "3️⃣ <b>Send Screenshot</b> - If you didn't use Paystack\n"
+            "4️⃣ <b>Get Approved</b> - Wait for {owner} to verify\n"
+            "5️⃣ <b>Receive Tips</b> - Get your daily betting odds\n\n"
+            "<b>Available Plan:</b>\n{plans}\n\n"
+            "<b>Payment To:</b> {payment_name}\n<b>{payment_method}:</b> {payment_number}"
+        ),
+        'cancelled': (
+            "<b>Welcome to {owner}! 🎲</b>\n\nGet expert betting predictions and tips from our AI-powered analysis."
+        ),
+        'screenshot_received': (
+            "<b>✅ Screenshot Received!</b>\n\n"
+            "Thank you for sending your payment proof.\n\n"
+            "Plan: {tier_name}\n"
+            "Amount: {price} GHS\n"
+            "Odds: {odds}\n\n"
+            "Your screenshot has been sent to {owner} for verification.\nYou'll receive your odds once approved."
+        ),
+        'renewal_expired': (
+            "<b>⏰ Your Subscription Has Ended</b>\n\n"
+            "Renew now to keep receiving daily odds from {owner}.\n\n"
+            "<b>Available Plan:</b>\n{plans}"
+        ),
+        'renewal_used_up': (
+            "<b>🎯 That Was Your Last Odds</b>\n\n"
+            "You've received every odds in your plan. Renew to keep receiving tips from {owner}.\n\n"
+            "<b>Available Plan:</b>\n{plans}"
+        ),
+        'support': (
+            "📧 <b>Support Request Received</b>\n\n"
+            "Contact {owner} directly for support. Use /help for common questions."
+        ),
+        'fallback': "<b>Welcome to {owner}! 🎲</b>\n\nUse /start to get started or /help for more information.",
+        'btn_paystack': "💳 Pay with Paystack",
+        'btn_plan': "💳 {price} GHS - {tier_name}",
+        'btn_how_it_works': "ℹ️ How It Works",
+        'btn_subscribe_now': "🔔 Subscribe Now",
+        'btn_subscribe': "🔔 Subscribe",
+        'btn_upload_screenshot': "📸 Send Payment Screenshot",
+        'btn_cancel': "❌ Cancel",
+    },
+}
+_BASE_TIERS = {key: dict(info) for key, info in SUBSCRIPTION_TIERS.items()}
+
+
+def _escape_braces(value) -> str:
+    return str(value).replace('{', '{{').replace('}', '}}')
+
+
+class TemplateRegistry:
+    """Message bodies and keyboards compiled once per (locale, tier).
+
+    TEMPLATES_FILE, if set, is JSON like {"tiers": {"tier5": {...}}, "locales": {"fr": {...}}}:
+    tiers are merged over SUBSCRIPTION_TIERS and each locale over the default texts. The file is
+    checked every TEMPLATES_RELOAD_INTERVAL seconds and recompiled when it changes.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path
+        self.mtime = None
+        self.next_check = 0.0
+        self.texts = {}  # (locale, tier_key) -> {name: (text, has per-user fields)}
+        self.keyboards = {}  # (locale, tier_key) -> {name: InlineKeyboardMarkup}
+        self.locales = frozenset()
+
+    def load(self) -> None:
+        overrides, mtime = {}, None
+        if self.path and os.path.exists(self.path):
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, encoding='utf-8') as f:
+                overrides = json.load(f)
+        tiers = {key: dict(info) for key, info in _BASE_TIERS.items()}
+        tiers.update(overrides.get('tiers', {}))
+        locales = {DEFAULT_LOCALE: dict(TEMPLATES.get(DEFAULT_LOCALE, TEMPLATES['en']))}
+        for locale, texts in overrides.get('locales', {}).items():
+            locales[locale.lower()] = {**locales[DEFAULT_LOCALE], **texts}
+
+        compiled_texts, compiled_keyboards = {}, {}
+        for locale, raw in locales.items():
+            for tier_key in tiers:
+                context = self._context(raw, tiers, tier_key)
+                compiled_texts[(locale, tier_key)] = {name: self._compile(text, context) for name, text in raw.items()}
+                compiled_keyboards[(locale, tier_key)] = self._keyboards(raw, tiers, tier_key)
+
+        SUBSCRIPTION_TIERS.clear()
+        SUBSCRIPTION_TIERS.update(tiers)
+        self.texts, self.keyboards, self.locales, self.mtime = (
+            compiled_texts, compiled_keyboards, frozenset(locales), mtime)
+
+    @staticmethod
+    def _tier_context(tiers: dict, tier_key: str) -> dict:
+        info = tiers[tier_key]
+        return {'tier_name': info['name'], 'price': info['price'], 'odds': info['odds']}
+
+    def _context(self, raw: dict, tiers: dict, tier_key: str) -> dict:
+        context = {
+            'owner': BOT_OWNER,
+            'payment_method': PAYMENT_METHOD,
+            'payment_number': PAYMENT_NUMBER,
+            'payment_name': PAYMENT_NAME,
+            'paystack_link': PAYSTACK_LINK,
+            **self._tier_context(tiers, tier_key),
+        }
+        context = {key: _escape_braces(value) for key, value in context.items()}
+        context['plans'] = '\n'.join(
+            _escape_braces(raw['plan_line'].format(**self._tier_context(tiers, key))) for key in tiers
+        )
+        # Left unescaped: it carries the {user_id} fragment into the pay message
+        context['paystack_hint'] = raw['paystack_hint'].format(**context) if PAYSTACK_SECRET_KEY else ''
+        return context
+
+    @staticmethod
+    def _compile(template: str, context: dict) -> tuple:
+        text = template.format(**context)
+        has_fields = any(field is not None for _, field, _, _ in string.Formatter().parse(text))
+        return (text, True) if has_fields else (text.format(), False)
+
+    def _keyboards(self, raw: dict, tiers: dict, tier_key: str) -> dict:
+        paystack = [InlineKeyboardButton(raw['btn_paystack'], url=PAYSTACK_LINK)]
+        plans = [
+            [InlineKeyboardButton(raw['btn_plan'].format(**self._tier_context(tiers, key)),
+                                  callback_data=callbacks.data('sub', key))]
+            for key in tiers
+        ]
+        how_it_works = [InlineKeyboardButton(raw['btn_how_it_works'], callback_data=callbacks.data('how'))]
+        return {
+            'menu': InlineKeyboardMarkup([paystack, *plans, how_it_works]),
+            'plans': InlineKeyboardMarkup([paystack, *plans]),
+            'status': InlineKeyboardMarkup(
+                [paystack, [InlineKeyboardButton(raw['btn_subscribe_now'], callback_data=callbacks.data('sub', tier_key))]]),
+            'tips': InlineKeyboardMarkup(
+                [paystack, [InlineKeyboardButton(raw['btn_subscribe'], callback_data=callbacks.data('sub', tier_key))]]),
+            'subscribe': InlineKeyboardMarkup([
+                paystack,
+                [InlineKeyboardButton(raw['btn_upload_screenshot'], callback_data=callbacks.data('upl', tier_key))],
+                [InlineKeyboardButton(raw['btn_cancel'], callback_data=callbacks.data('cancel'))],
+            ]),
+        }
+
+    def _maybe_reload(self) -> None:
+        now = time.monotonic()
+        if not self.path or now < self.next_check:
+            return
+        self.next_check = now + TEMPLATES_RELOAD_INTERVAL
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            mtime = None
+        if mtime == self.mtime:
+            return
+        try:
+            self.load()
+            logger.info(f"Templates reloaded from {self.path}")
+        except (OSError, ValueError, KeyError) as e:
+            self.mtime = mtime  # don't retry a broken file until it changes again
+            logger.error(f"Could not reload templates from {self.path}: {e}")
+
+    def _bundle(self, table: dict, locale: str, tier_key: str) -> dict:
+        self._maybe_reload()
+        if locale not in self.locales:
+            locale = DEFAULT_LOCALE
+        return table.get((locale, tier_key)) or table[(locale, DEFAULT_TIER)]
+
+    def text(self, name: str, locale: str = DEFAULT_LOCALE, tier_key: str = DEFAULT_TIER, **fragments) -> str:
+        text, has_fields = self._bundle(self.texts, locale, tier_key)[name]
+        return text.format(**fragments) if has_fields else text
+
+    def keyboard(self, name: str, locale: str = DEFAULT_LOCALE, tier_key: str = DEFAULT_TIER) -> InlineKeyboardMarkup:
+        return self._bundle(self.keyboards, locale, tier_key)[name]
+
+    def locale_for(self, tg_user) -> str:
+        """Best compiled locale for a Telegram user's language_code (e.g. 'pt-br' -> 'pt-br' or 'pt')."""
+        self._maybe_reload()
+        code = ((tg_user.language_code if tg_user else None) or '').lower()
+        for candidate in (code, code.split('-')[0]):
+            if candidate in self.locales:
+                return candidate
+        return DEFAULT_LOCALE
+
+
+templates = TemplateRegistry(TEMPLATES_FILE)
+templates.load()
+
+
+# Admins
+# Every new pending payment is assigned to one online reviewer (ADMIN_DISPATCH) and leased to them for
+# ADMIN_CLAIM_LEASE seconds; acting on a payment (preview, approve, reject) claims or renews the lease.
+# Another admin can only take a payment over once its lease runs out.
+def _has_permission(user_id: int, permission: str) -> bool:
+    return permission in ROLE_PERMISSIONS.get(ADMINS.get(user_id), ())
+
+
+def _is_admin(user_id: int) -> bool:
+    return user_id in ADMINS
+
+
+def admin_only(permission: str):
+    """Handler decorator: only admins whose role grants `permission` get through."""
+    def decorator(callback):
+        @functools.wraps(callback)
+        async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE, *args):
+            if not _has_permission(update.effective_user.id, permission):
+                if update.callback_query:
+                    await update.callback_query.answer("This is for admin only.", show_alert=True)
+                else:
+                    await update.message.reply_text("This command is for admin only.")
+                return None
+            return await callback(update, context, *args)
+        return wrapper
+    return decorator
+
+
+async def _online_admins() -> list:
+    offline = set(await storage.get_meta('admins_offline', []))
+    return [admin_id for admin_id in ADMINS if _has_permission(admin_id, 'review') and admin_id not in offline]
+
+
+async def _dispatch_admin():
+    """Pick the online reviewer for a new pending payment, or None if nobody is online."""
+    candidates = await _online_admins()
+    if not candidates:
+        return None
+    if ADMIN_DISPATCH == 'round_robin':
+        async with storage.lock('admin_dispatch'):
+            turn = await storage.get_meta('admin_turn', 0)
+            await storage.set_meta('admin_turn', turn + 1)
+        return candidates[turn % len(candidates)]
+    load = await storage.pending_load()
+    return min(candidates, key=lambda admin_id: load.get(admin_id, 0))
+
+
+def _lease_holder(entry: dict):
+    """The admin a pending payment is leased to, or None once the lease ran out."""
+    if entry.get('assignee') and entry.get('lease_until', 0) > time.time():
+        return entry['assignee']
+    return None
+
+
+async def _claim_pending(user_id: int, admin_id: int) -> tuple:
+    """Lease a pending payment to `admin_id`; returns (entry, None), or (None, holder) if another admin
+    holds it, or (None, None) if it is no longer pending."""
+    async with storage.lock(f'pending:{user_id}'):
+        entry = await storage.get_pending(user_id)
+        if entry is None:
+            return None, None
+        holder = _lease_holder(entry)
+        if holder not in (None, admin_id):
+            return None, holder
+        entry['assignee'] = admin_id
+        entry['lease_until'] = time.time() + ADMIN_CLAIM_LEASE
+        await storage.save_pending(user_id, entry)
+    return entry, None
+
+
+async def _record_decision(admin_id: int, decision: str, entry: dict) -> None:
+    ADMIN_DECISIONS.inc(str(admin_id), decision)
+    async with storage.lock('admin_stats'):
+        stats = await storage.get_meta('admin_stats', {})
+        totals = stats.setdefault(str(admin_id), {'approved': 0, 'rejected': 0, 'seconds': 0.0})
+        totals[decision] += 1
+        totals['seconds'] += max(time.time() - _pending_created_at(entry), 0)
+        await storage.set_meta('admin_stats', stats)
+
+
+async def _reassign_pending(admin_id: int) -> int:
+    """Hand the payments assigned to `admin_id` to other online reviewers; returns how many moved."""
+    moved, cursor = 0, None
+    while True:
+        page = await storage.page_pending(200, cursor)
+        if not page:
+            return moved
+        cursor = (_pending_created_at(page[-1][1]), page[-1][0])
+        for uid, entry in page:
+            if entry.get('assignee') != admin_id:
+                continue
+            target = await _dispatch_admin()
+            async with storage.lock(f'pending:{uid}'):
+                entry = await storage.get_pending(uid)
+                if not entry or entry.get('assignee') != admin_id:
+                    continue
+                entry['assignee'] = target
+                entry['lease_until'] = time.time() + ADMIN_CLAIM_LEASE if target else 0
+                await storage.save_pending(uid, entry)
+            if target:
+                await _forward_screenshot_to_admin(
+                    target, _pending_media(entry), uid, entry.get('username', ''),
+                    entry.get('tier', DEFAULT_TIER), entry.get('ocr'),
+                )
+            moved += 1
+
+
+@admin_only('review')
+async def admins_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    online = set(await _online_admins())
+    load = await storage.pending_load()
+    stats = await storage.get_meta('admin_stats', {})
+    lines = [f"<b>👥 Admins</b> ({ADMIN_DISPATCH.replace('_', '-')} dispatch)\n"]
+    for admin_id, role in ADMINS.items():
+        totals = stats.get(str(admin_id), {})
+        decided = totals.get('approved', 0) + totals.get('rejected', 0)
+        lines.append(
+            f"{'🟢' if admin_id in online else '⚪'} <code>{admin_id}</code> · {role}\n"
+            f"     Open: {load.get(admin_id, 0)} · Approved: {totals.get('approved', 0)} · "
+            f"Rejected: {totals.get('rejected', 0)}"
+            + (f" · Avg: {_format_age(totals['seconds'] / decided)}" if decided else "")
+        )
+    await update.message.reply_html("\n".join(lines))
+
+
+@admin_only('review')
+async def online_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user_id = update.effective_user.id
+    async with storage.lock('admins_offline'):
+        offline = await storage.get_meta('admins_offline', [])
+        await storage.set_meta('admins_offline', [admin_id for admin_id in offline if admin_id != user_id])
+    await update.message.reply_text("🟢 You're online: new payments will be shared with you.")
+
+
+@admin_only('review')
+async def offline_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user_id = update.effective_user.id
+    async with storage.lock('admins_offline'):
+        offline = await storage.get_meta('admins_offline', [])
+        if user_id not in offline:
+            await storage.set_meta('admins_offline', offline + [user_id])
+    moved = await _reassign_pending(user_id)
+    await update.message.reply_text(
+        f"⚪ You're offline: no new payments will come to you. {moved} open payment(s) handed to other admins."
+    )
+
+
+# Commands
+async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user = update.effective_user
+    user_id = user.id
+    locale = templates.locale_for(user)
+
+    new = await storage.get_user(user_id) is None
+    events.record('start', user_id=user_id, new=new)
+    if new:
+        await storage.save_user(user_id, _new_user(user))
+        if _is_admin(user_id):
+            await update.message.reply_html(templates.text('admin_welcome', locale))
+
+    await update.message.reply_html(
+        templates.text('welcome', locale, mention=user.mention_html()),
+        reply_markup=templates.keyboard('menu', locale),
+    )
+
+
+async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await update.message.reply_html(templates.text('help', templates.locale_for(update.effective_user)))
+
+
+async def status_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user_id = update.effective_user.id
+    locale = templates.locale_for(update.effective_user)
+    user = await storage.get_user(user_id)
+    if user is None:
+        await update.message.reply_text(templates.text('start_first', locale))
+        return
+
+    subscription = ''
+    if user['is_premium'] and user.get('subscription_expires'):
+        subscription = templates.text(
+            'status_subscription', locale,
+            odds_remaining=user.get('odds_remaining', 0),
+            expires=datetime.fromtimestamp(user['subscription_expires'], RELEASE_TIMEZONE).strftime('%Y-%m-%d'),
+        )
+    message = templates.text(
+        'status', locale,
+        status=templates.text('status_premium' if user['is_premium'] else 'status_free', locale),
+        subscription=subscription,
+        tips_received=user['tips_received'],
+        joined=user['joined_date'][:10],
+    )
+    if not user['is_premium']:
+        await update.message.reply_html(message, reply_markup=templates.keyboard('status', locale))
+    else:
+        await update.message.reply_html(message)
+
+
+async def tips_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user_id = update.effective_user.id
+    locale = templates.locale_for(update.effective_user)
+    user = await storage.get_user(user_id)
+    if user is None:
+        await update.message.reply_text(templates.text('start_first', locale))
+        return
+
+    if not user['is_premium']:
+        await update.message.reply_html(
+            templates.text('tips_locked', locale), reply_markup=templates.keyboard('tips', locale),
+        )
+        return
+
+    await update.message.reply_html(templates.text('tips_delivery', locale))
+
+
+async def pay_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    locale = templates.locale_for(update.effective_user)
+    await update.message.reply_html(
+        templates.text('pay', locale, user_id=update.effective_user.id),
+        reply_markup=templates.keyboard('plans', locale),
+    )
+
+
+async def menu_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    locale = templates.locale_for(update.effective_user)
+    await update.message.reply_html(templates.text('menu', locale), reply_markup=templates.keyboard('menu', locale))
+
+
+async def refreshcommands_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    app = context.application
+    try:
+        await _set_bot_commands(app, force=True)
+        await update.message.reply_text("✅ Commands refreshed. Open the side menu to see them.")
+    except Exception as e:
+        await update.message.reply_text(f"❌ Failed to refresh commands: {e}")
+
+
+# Admin utilities
+@admin_only('manage')
+async def clear_pending_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await storage.clear_pending()
+    await update.message.reply_text("✅ Cleared all pending payments.")
+
+
+@admin_only('manage')
+async def reset_data_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await storage.reset()
+    await update.message.reply_text("✅ Reset stored data: users, pending payments, and compose targets.")
+
+
+@admin_only('review')
+async def pending_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    tier, age, verified = _parse_pending_filter(context.args or [])
+    view = context.user_data['pending_view'] = {'tier': tier, 'age': age, 'verified': verified}
+    text, reply_markup = await _render_pending_page(view)
+    await update.message.reply_html(text, reply_markup=reply_markup)
+
+
+async def myid_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user_id = update.effective_user.id
+    await update.message.reply_html(
+        f"<b>Your Telegram User ID:</b>\n\n<code>{user_id}</code>\n\n"
+        f"Add to .env as ADMIN_ID (or to ADMIN_IDS) and restart bot."
+    )
+
+
+async def test_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user_id = update.effective_user.id
+    if _is_admin(user_id):
+        await update.message.reply_html(
+            f"<b>✅ Admin Mode Active!</b>\n\nYour ID: {user_id}\nRole: {ADMINS[user_id]}\nReady to receive payments!"
+        )
+    else:
+        await update.message.reply_text(
+            f"✅ Bot is working!\n\nYour ID: {user_id}"
+        )
+
+
+@admin_only('review')
+async def approve_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user_id = update.effective_user.id
+    if not context.args:
+        await update.message.reply_text(
+            "Usage: /approve <user_id> [user_id ...]\n"
+            "Ranges: /approve 1000-2000\n"
+            "Everything: /approve all [tier] [older than, e.g. 6h or 2d] [verified]"
+        )
+        return
+    try:
+        user_ids = await _resolve_approve_targets(context.args)
+    except ValueError:
+        await update.message.reply_text("Invalid user ID")
+        return
+    if not user_ids:
+        await update.message.reply_text("No pending payments match.")
+        return
+
+    if len(user_ids) == 1:
+        user_id_to_approve = user_ids[0]
+        entry, holder = await _claim_pending(user_id_to_approve, user_id)
+        if holder:
+            await update.message.reply_text(f"🔒 Admin {holder} is handling user {user_id_to_approve}'s payment.")
+            return
+        payment_info = entry and await _approve_payment(user_id_to_approve, user_id)
+        if not payment_info:
+            await update.message.reply_text(f"No pending payment found for user {user_id_to_approve}")
+            return
+        tier_key = payment_info.get('tier', 'tier3')
+        await update.message.reply_html(
+            f"<b>✅ Payment Approved!</b>\n\nUser: {html.escape(payment_info.get('username') or '')}\n"
+            f"Plan: {SUBSCRIPTION_TIERS[tier_key]['name']}\nAmount: {SUBSCRIPTION_TIERS[tier_key]['price']} GHS\n\n"
+            f"Use /send {user_id_to_approve} to deliver the predictions now."
+        )
+        return
+
+    await update.message.reply_text(f"⏳ Approving {len(user_ids)} payments...")
+    started = time.monotonic()
+    results = await _approve_many(user_ids, user_id)
+    await update.message.reply_html(_approve_summary(results, time.monotonic() - started))
+
+
+async def _resolve_approve_targets(args) -> list:
+    """Expand /approve arguments (ids, id ranges, 'all' with optional tier/age filters) to user ids."""
+    if args[0].lower() == 'all':
+        tier, age, verified = _parse_pending_filter(args[1:])
+        created_before = time.time() - age * 3600 if age else None
+        min_confidence = OCR_VERIFIED_THRESHOLD if verified else None
+        user_ids, cursor = [], None
+        while True:
+            page = await storage.page_pending(
+                200, cursor, tier=tier, created_before=created_before, min_confidence=min_confidence,
+            )
+            if not page:
+                return user_ids
+            user_ids.extend(uid for uid, _ in page)
+            cursor = (_pending_created_at(page[-1][1]), page[-1][0])
+
+    user_ids, ranges = [], []
+    for arg in args:
+        low, sep, high = arg.partition('-')
+        if sep:
+            ranges.append((int(low), int(high)))
+        else:
+            user_ids.append(int(arg))
+    if ranges:
+        cursor = None
+        while True:
+            page = await storage.page_pending(200, cursor)
+            if not page:
+                break
+            user_ids.extend(uid for uid, _ in page if any(low <= uid <= high for low, high in ranges))
+            cursor = (_pending_created_at(page[-1][1]), page[-1][0])
+    return list(dict.fromkeys(user_ids))
+
+
+async def _approve_many(user_ids: list, admin_id: int) -> list:
+    semaphore = asyncio.Semaphore(BULK_APPROVE_CONCURRENCY)
+
+    async def approve_one(uid: int) -> tuple:
+        async with semaphore:
+            return uid, await _approve_payment(uid, admin_id)
+
+    return await asyncio.gather(*(approve_one(uid) for uid in user_ids))
+
+
+def _approve_summary(results: list, elapsed: float) -> str:
+    approved = [r for r in results if r[1] is not None]
+    missing = [r for r in results if r[1] is None]
+    message = (
+        "<b>✅ Bulk Approval Complete</b>\n\n"
+        f"Approved: {len(approved)} (notices queued)\n"
+        f"Not pending or held by another admin: {len(missing)}\n"
+        f"Time: {elapsed:.1f}s\n"
+    )
+    details = [f"➖ {uid}: not pending, or another admin is handling it" for uid, _ in missing]
+    if details:
+        # Stay well inside Telegram's 4096 character limit
+        shown = details[:40]
+        message += "\n" + "\n".join(shown)
+        if len(details) > len(shown):
+            message += f"\n…and {len(details) - len(shown)} more"
+    return message
+
+
+# Pending queue
+def _parse_pending_filter(args) -> tuple:
+    """`/pending [tier] [age] [verified]`: age is e.g. 6h or 2d (only payments older than that),
+    verified keeps only screenshots OCR matched with confidence >= OCR_VERIFIED_THRESHOLD."""
+    tier, age_hours, verified = None, 0, False
+    for arg in args:
+        arg = arg.lower()
+        if arg in SUBSCRIPTION_TIERS:
+            tier = arg
+        elif arg == 'verified':
+            verified = True
+        elif len(arg) > 1 and arg[:-1].isdigit() and arg[-1] in 'hd':
+            age_hours = int(arg[:-1]) * (24 if arg[-1] == 'd' else 1)
+    return tier, age_hours, verified
+
+
+def _format_age(seconds: float) -> str:
+    if seconds < 3600:
+        return f"{int(seconds // 60)}m"
+    if seconds < 86400:
+        return f"{int(seconds // 3600)}h"
+    return f"{int(seconds // 86400)}d"
+
+
+async def _render_pending_page(view: dict, cursor=None, backward=False, inclusive=False) -> tuple:
+    """Render a page of /pending. `view` is the admin's filters (tier, age, verified); the page's first and
+    last keys are written back to it, so buttons only need to carry an action and a user id."""
+    tier, age, verified = view.get('tier'), view.get('age', 0), view.get('verified', False)
+    created_before = time.time() - age * 3600 if age else None
+    min_confidence = OCR_VERIFIED_THRESHOLD if verified else None
+    page = await storage.page_pending(
+        PENDING_PAGE_SIZE, cursor, backward, inclusive, tier, created_before, min_confidence,
+    )
+    if not page and cursor is not None:
+        # The page emptied (e.g. its last rows were just approved): go back to the start
+        page = await storage.page_pending(
+            PENDING_PAGE_SIZE, tier=tier, created_before=created_before, min_confidence=min_confidence,
+        )
+    if not page:
+        return "<b>✅ No Pending Payments</b>\n\nAll payments have been processed!", None
+
+    first = (_pending_created_at(page[0][1]), page[0][0])
+    last = (_pending_created_at(page[-1][1]), page[-1][0])
+    has_prev = await storage.page_pending(
+        1, first, backward=True, tier=tier, created_before=created_before, min_confidence=min_confidence,
+    )
+    has_next = await storage.page_pending(
+        1, last, tier=tier, created_before=created_before, min_confidence=min_confidence,
+    )
+
+    view['first'], view['last'] = list(first), list(last)
+    filters_text = ", ".join(
+        f for f in (tier and SUBSCRIPTION_TIERS.get(tier, {}).get('name', tier), age and f"older than {age}h", verified and "OCR verified")
+        if f
+    )
+    message = "<b>📋 Pending Payments</b>" + (f" ({filters_text})" if filters_text else "") + "\n\n"
+    keyboard = []
+    now = time.time()
+    for idx, (uid, info) in enumerate(page, 1):
+        tier_info = SUBSCRIPTION_TIERS.get(info.get('tier', 'tier3'), SUBSCRIPTION_TIERS['tier3'])
+        message += (
+            f"<b>{idx}.</b> {html.escape(info.get('username') or '')} (<code>{uid}</code>)\n"
+            f"     {tier_info['name']} · {tier_info['price']} GHS · "
+            f"{_format_age(now - _pending_created_at(info))} ago"
+            + (f" · 🤖 {info['confidence']:.0%}" if info.get('confidence') is not None else "")
+            + (" · ⚠️ duplicate" if info.get('duplicate_of') else "")
+            + (f" · 🔒 {_lease_holder(info)}" if _lease_holder(info) else "")
+            + "\n"
+        )
+        keyboard.append([
+            InlineKeyboardButton(f"✅ {idx}", callback_data=callbacks.data('pa', int(uid))),
+            InlineKeyboardButton(f"❌ {idx}", callback_data=callbacks.data('pr', int(uid))),
+            InlineKeyboardButton(f"🖼 {idx}", callback_data=callbacks.data('pv', int(uid))),
+        ])
+    nav = []
+    if has_prev:
+        nav.append(InlineKeyboardButton("⬅️ Prev", callback_data=callbacks.data('pq', 'p')))
+    if has_next:
+        nav.append(InlineKeyboardButton("Next ➡️", callback_data=callbacks.data('pq', 'n')))
+    if nav:
+        keyboard.append(nav)
+    return message, InlineKeyboardMarkup(keyboard)
+
+
+async def _approve_payment(user_id: int, admin_id: int = None):
+    """Approve a pending payment and queue the user's notice; returns the payment, or None if it is not
+    pending (or, when an admin approves, leased to another admin)."""
+    async with storage.lock(f'pending:{user_id}'):
+        if admin_id is not None:
+            entry = await storage.get_pending(user_id)
+            if entry is None or _lease_holder(entry) not in (None, admin_id):
+                return None
+        payment_info = await storage.delete_pending(user_id)
+        if payment_info is None:
+            return None
+        tier_key = payment_info.get('tier', 'tier3')
+        await _activate_premium(user_id, tier_key, payment_info.get('username'))
+    latency = max(time.time() - _pending_created_at(payment_info), 0)
+    APPROVAL_LATENCY.observe(latency)
+    tier_info = SUBSCRIPTION_TIERS.get(tier_key, SUBSCRIPTION_TIERS['tier3'])
+    events.record(
+        'approval', user_id=user_id, tier=tier_key, amount=tier_info['price'],
+        method='manual' if admin_id is not None else 'auto', admin=admin_id, latency=round(latency, 1),
+    )
+    await _enqueue(user_id, [{
+        'type': 'text',
+        'parse_mode': 'HTML',
+        'text': (
+            "<b>✅ Payment Approved!</b>\n\n"
+            f"Plan: {tier_info['name']}\n"
+            f"Amount: {tier_info['price']} GHS\n\n"
+            f"Your premium access is active. {BOT_OWNER} will send your odds shortly."
+        ),
+    }], 'notice', key=f"approved:{user_id}:{payment_info.get('timestamp')}")
+    if admin_id is not None:
+        await _record_decision(admin_id, 'approved', payment_info)
+    return payment_info
+
+
+async def _reject_payment(user_id: int, admin_id: int):
+    async with storage.lock(f'pending:{user_id}'):
+        entry = await storage.get_pending(user_id)
+        if entry is None or _lease_holder(entry) not in (None, admin_id):
+            return None
+        payment_info = await storage.delete_pending(user_id)
+    events.record(
+        'rejection', user_id=user_id, tier=payment_info.get('tier'), admin=admin_id,
+        latency=round(max(time.time() - _pending_created_at(payment_info), 0), 1),
+    )
+    await _enqueue(user_id, [{
+        'type': 'text',
+        'parse_mode': 'HTML',
+        'text': (
+            "<b>❌ Payment Not Verified</b>\n\n"
+            "We could not verify your payment screenshot.\n"
+            "Please check the details and send it again, or reply with 'support'."
+        ),
+    }], 'notice', key=f"rejected:{user_id}:{payment_info.get('timestamp')}")
+    await _record_decision(admin_id, 'rejected', payment_info)
+    return payment_info
+
+
+async def _claimed(query, user_id: int):
+    """Claim a pending payment for the admin who pressed its button; None (and the query answered) if
+    another admin holds it."""
+    entry, holder = await _claim_pending(user_id, query.from_user.id)
+    if holder:
+        await query.answer(f"🔒 Admin {holder} is handling this payment.", show_alert=True)
+        return None
+    return entry or {}
+
+
+async def _refresh_pending_page(query, context, anchor: str, backward: bool, inclusive: bool) -> None:
+    """Re-render the admin's /pending page from its first or last row (`anchor`)."""
+    # Without a saved view (e.g. the bot restarted without persistence) start over, unfiltered
+    view = context.user_data.setdefault('pending_view', {})
+    cursor = tuple(view[anchor]) if view.get(anchor) else None
+    text, reply_markup = await _render_pending_page(view, cursor, backward, inclusive)
+    try:
+        await query.edit_message_text(text=text, reply_markup=reply_markup, parse_mode='HTML')
+    except BadRequest:
+        # Page content unchanged
+        pass
+
+
+@callbacks.route('pv', int, signed=True)
+@admin_only('review')
+async def pending_view_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int) -> None:
+    query = update.callback_query
+    # Looking at or deciding a payment claims it, so no other admin works on it meanwhile
+    entry = await _claimed(query, user_id)
+    if entry is None:
+        return
+    if not entry:
+        await query.answer("Already processed.")
+        return
+    await query.answer()
+    caption = f"{entry.get('username', '')} ({user_id}) · {entry.get('timestamp', '')}"
+    await _send_media(context.bot, query.message.chat_id, _pending_media(entry), caption)
+
+
+@callbacks.route('pa', int, signed=True)
+@admin_only('review')
+async def pending_approve_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int) -> None:
+    query = update.callback_query
+    entry = await _claimed(query, user_id)
+    if entry is None:
+        return
+    payment_info = entry and await _approve_payment(user_id, query.from_user.id)
+    await query.answer(f"✅ Approved {user_id}" if payment_info else "Already processed.")
+    await _refresh_pending_page(query, context, 'first', False, True)
+
+
+@callbacks.route('pr', int, signed=True)
+@admin_only('review')
+async def pending_reject_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, user_id: int) -> None:
+    query = update.callback_query
+    entry = await _claimed(query, user_id)
+    if entry is None:
+        return
+    payment_info = entry and await _reject_payment(user_id, query.from_user.id)
+    await query.answer(f"❌ Rejected {user_id}" if payment_info else "Already processed.")
+    await _refresh_pending_page(query, context, 'first', False, True)
+
+
+@callbacks.route('pq', str, signed=True)
+@admin_only('review')
+async def pending_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, mode: str) -> None:
+    await update.callback_query.answer()
+    backward = mode == 'p'
+    await _refresh_pending_page(update.callback_query, context, 'first' if backward else 'last', backward, False)
+
+
+@callbacks.route('as', int, signed=True)
+@admin_only('deliver')
+async def admin_send_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, target_id: int) -> None:
+    """The "Send Game" button on a payment card: compose mode for that user, as /send does."""
+    query = update.callback_query
+    await query.answer()
+    await storage.set_compose_target(str(query.from_user.id), target_id)
+    await query.message.reply_text(
+        f"✉️ Compose mode for {target_id}: send the odds now (text/photo/document).\nUse /cancel_send to cancel."
+    )
+
+
+# Buttons
+@callbacks.route('sub', str, aliases=('subscribe',))
+async def subscribe_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, tier_key: str) -> None:
+    query = update.callback_query
+    await query.answer()
+    user_id = query.from_user.id
+    user = await _get_or_create_user(query.from_user)
+    locale = templates.locale_for(query.from_user)
+    if tier_key not in SUBSCRIPTION_TIERS:
+        tier_key = DEFAULT_TIER
+    user['pending_payment'] = tier_key
+    await storage.save_user(user_id, user)
+    events.record('subscribe_click', user_id=user_id, tier=tier_key)
+    await query.edit_message_text(
+        text=templates.text('subscribe', locale, tier_key),
+        reply_markup=templates.keyboard('subscribe', locale, tier_key),
+        parse_mode='HTML',
+    )
+
+
+@callbacks.route('upl', str, aliases=('upload_screenshot',))
+async def upload_screenshot_callback(update: Update, context: ContextTypes.DEFAULT_TYPE, tier_key: str) -> None:
+    query = update.callback_query
+    await query.answer()
+    if tier_key not in SUBSCRIPTION_TIERS:
+        tier_key = DEFAULT_TIER
+    context.user_data['waiting_for_screenshot'] = True
+    context.user_data['pending_tier'] = tier_key
+    await query.edit_message_text(
+        text=templates.text('upload_screenshot', templates.locale_for(query.from_user)), parse_mode='HTML',
+    )
+
+
+@callbacks.route('tips', aliases=('get_tips',))
+async def get_tips_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    await query.answer()
+    user = await _get_or_create_user(query.from_user)
+    locale = templates.locale_for(query.from_user)
+    if not user['is_premium']:
+        await query.edit_message_text(
+            text=templates.text('get_tips_locked', locale),
+            reply_markup=templates.keyboard('plans', locale),
+            parse_mode='HTML',
+        )
+    else:
+        await query.edit_message_text(text=templates.text('get_tips_delivery', locale), parse_mode='HTML')
+
+
+@callbacks.route('how', aliases=('how_it_works',))
+async def how_it_works_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    await query.answer()
+    await query.edit_message_text(
+        text=templates.text('how_it_works', templates.locale_for(query.from_user)), parse_mode='HTML',
+    )
+
+
+@callbacks.route('cancel')
+async def cancel_callback(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    query = update.callback_query
+    await query.answer()
+    user = await _get_or_create_user(query.from_user)
+    locale = templates.locale_for(query.from_user)
+    user['pending_payment'] = None
+    await storage.save_user(query.from_user.id, user)
+    await query.edit_message_text(
+        text=templates.text('cancelled', locale),
+        reply_markup=templates.keyboard('menu', locale),
+        parse_mode='HTML',
+    )
+
+
+# Messages
+media_groups = {}  # media_group_id -> {'messages': [...], 'last': monotonic time of the latest one}
+
+
+async def _forward_screenshot_to_admin(admin_id: int, media: list, user_id: int, username: str,
+                                       tier_key: str, receipt: dict = None, auto_approved: bool = False) -> None:
+    if not admin_id:
+        return
+    tier_info = SUBSCRIPTION_TIERS.get(tier_key, SUBSCRIPTION_TIERS['tier3'])
+    verification = ""
+    if receipt:
+        verification = (
+            f"<b>🤖 OCR check: {receipt['confidence']:.0%}</b>\n"
+            f"Amount: {'✅' if receipt['amount_ok'] else '❌'} · "
+            f"Number: {'✅' if receipt['number_ok'] else '❌'} · "
+            f"Name: {receipt['name_match']:.0%}\n"
+            f"Reference: {html.escape(receipt['reference'] or '—')}\n"
+        )
+        if auto_approved:
+            verification += "<b>Auto-approved ✅</b>\n"
+        verification += "\n"
+    keyboard = [[InlineKeyboardButton("✉️ Send Game", callback_data=callbacks.data('as', user_id))]]
+    card = {
+        'type': 'text',
+        'parse_mode': 'HTML',
+        'text': (
+            f"<b>📸 New Payment Screenshot{'s' if len(media) > 1 else ''}</b>\n\n"
+            f"User: {html.escape(username or '')}\n"
+            f"User ID: {user_id}\n"
+            f"Plan: {tier_info.get('name')}\n"
+            f"Amount: {tier_info.get('price')} GHS\n"
+            f"Odds: {tier_info.get('odds')}\n"
+            + (f"Screenshots: {len(media)}\n" if len(media) > 1 else "")
+            + "\n"
+            f"{verification}"
+            "Tap below to send the game now."
+        ),
+        'reply_markup': InlineKeyboardMarkup(keyboard),
+    }
+    proof = {'type': 'album', 'media': media} if len(media) > 1 else media[0]
+    await _enqueue(admin_id, [proof, card], 'admin', key=f"proof:{admin_id}:{user_id}:{media[0]['file_id']}")
+
+
+async def _verify_screenshot(admin_id: int, media: list, user_id: int, username: str, tier_key: str,
+                             images: list) -> None:
+    """OCR the screenshots, attach the best result to the pending entry, then notify the admin."""
+    receipts = [receipt for receipt in [await _ocr_verify(data, tier_key) for data in images] if receipt]
+    receipt = max(receipts, key=lambda r: r['confidence'], default=None)
+    auto_approved = False
+    if receipt:
+        async with storage.lock(f'pending:{user_id}'):
+            entry = await storage.get_pending(user_id)
+            if entry is not None:
+                entry['ocr'] = receipt
+                entry['confidence'] = receipt['confidence']
+                await storage.save_pending(user_id, entry)
+        if entry is not None and OCR_AUTO_APPROVE and receipt['confidence'] >= OCR_AUTO_APPROVE:
+            auto_approved = await _approve_payment(user_id) is not None
+    await _forward_screenshot_to_admin(admin_id, media, user_id, username, tier_key, receipt, auto_approved)
+
+
+def _queue_media_group(context, message) -> None:
+    """Hold album parts until MEDIA_GROUP_DELAY passes without a new one, then submit them together."""
+    group = media_groups.get(message.media_group_id)
+    if group is None:
+        group = media_groups[message.media_group_id] = {'messages': [], 'last': 0}
+        context.application.create_task(_flush_media_group(context, message.media_group_id))
+    group['messages'].append(message)
+    group['last'] = time.monotonic()
+
+
+async def _flush_media_group(context, media_group_id: str) -> None:
+    while True:
+        wait = media_groups[media_group_id]['last'] + MEDIA_GROUP_DELAY - time.monotonic()
+        if wait <= 0:
+            break
+        await asyncio.sleep(wait)
+    messages = sorted(media_groups.pop(media_group_id)['messages'], key=lambda m: m.message_id)
+    await _submit_screenshots(context, messages[0].from_user, messages)
+
+
+async def _submit_screenshots(context, tg_user, messages: list) -> None:
+    """Store one pending entry for a screenshot or a whole album and pass it on for review."""
+    user_id = tg_user.id
+    user = await storage.get_user(user_id)
+    pending_tier = context.user_data.get('pending_tier') or (user or {}).get('pending_payment') or 'tier3'
+
+    if user is None:
+        await storage.save_user(user_id, _new_user(tg_user, pending_tier))
+
+    entry = {
+        'username': tg_user.username or tg_user.first_name,
+        'tier': pending_tier,
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'created_at': float(int(time.time())),
+        'status': 'pending',
+    }
+    files = [message.photo[-1] if message.photo else message.document for message in messages]
+    media = [_payload_from_message(message) for message in messages]
+    if messages[0].photo:
+        entry['photo_id'] = files[0].file_id
+    else:
+        entry['document_id'] = files[0].file_id
+    if len(media) > 1:
+        entry['media'] = [{'type': item['type'], 'file_id': item['file_id']} for item in media]
+    entry['file_unique_id'] = files[0].file_unique_id
+    found = await asyncio.gather(*(_find_duplicates(context.bot, file, user_id) for file in files))
+    entry['phash'] = found[0][0]
+    matches = sorted({uid for _, uids, _ in found for uid in uids})
+    images = [data for _, _, data in found if data]
+    if all(user_id in uids for _, uids, _ in found) and await storage.get_pending(user_id):
+        # A re-send of the screenshot still waiting for review: its entry and reviewer stay as they are
+        await messages[-1].reply_html(
+            templates.text('screenshot_received', templates.locale_for(tg_user), pending_tier)
+        )
+        return
+    # Anything else the user sent before was already reviewed, so it's flagged like another user's copy
+    duplicate_of = matches
+    if duplicate_of:
+        entry['duplicate_of'] = duplicate_of
+    entry['assignee'] = await _dispatch_admin()
+    if entry['assignee']:
+        entry['lease_until'] = time.time() + ADMIN_CLAIM_LEASE
+    async with storage.lock(f'pending:{user_id}'):
+        await storage.save_pending(user_id, entry)
+    events.record('screenshot', user_id=user_id, tier=pending_tier, files=len(files), duplicate=bool(duplicate_of))
+
+    await messages[-1].reply_html(templates.text('screenshot_received', templates.locale_for(tg_user), pending_tier))
+
+    # Nobody online: the owner still hears about it
+    admin_id = entry['assignee'] or (int(ADMIN_ID) if ADMIN_ID else None)
+    if admin_id and duplicate_of:
+        await _queue_duplicate_report(context.application, admin_id, user_id, entry['username'], duplicate_of)
+    elif not duplicate_of:
+        args = (admin_id, media, user_id, entry['username'], pending_tier)
+        if OCR_ENABLED and images:
+            # OCR takes a second or two; don't hold up the update queue for it
+            context.application.create_task(_verify_screenshot(*args, images))
+        else:
+            await _forward_screenshot_to_admin(*args)
+
+
+async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user_id = update.effective_user.id
+
+    # Admin compose delivery
+    target_id = await storage.get_compose_target(str(user_id))
+    if target_id:
+        payload = _payload_from_message(update.message)
+        if not payload:
+            await update.message.reply_text("Unsupported message type. Send text, photo, or document.")
+            return
+        if target_id == BROADCAST_TARGET:
+            await storage.clear_compose_target(str(user_id))
+            total = await _start_broadcast(context.application, user_id, payload)
+            await update.message.reply_text(
+                f"📣 Broadcasting to {total} premium users. Use /broadcast_status to follow progress."
+            )
+            return
+        if isinstance(target_id, str) and target_id.startswith(RELEASE_TARGET_PREFIX):
+            await storage.clear_compose_target(str(user_id))
+            release_at = float(target_id[len(RELEASE_TARGET_PREFIX):])
+            release = await _create_release(context.application, user_id, payload, release_at)
+            await update.message.reply_html(
+                "⬆️ That is the preview subscribers will get.\n\n"
+                + _release_report(release)
+                + f"\n\nUse /schedule_cancel {release['id']} to call it off."
+            )
+            return
+        # Keyed by the admin's message, so a redelivered update doesn't send the game twice
+        await _enqueue(
+            int(target_id), [payload], 'delivery', key=f'compose:{user_id}:{update.message.message_id}', notify=user_id,
+        )
+        await storage.clear_compose_target(str(user_id))
+        await update.message.reply_text("✅ Game queued for the customer. You'll be told if it can't be delivered.")
+        return
+
+    # Treat photos/documents as payment screenshots (non-admin)
+    if (update.message.photo or update.message.document) and not _is_admin(user_id):
+        if update.message.media_group_id:
+            _queue_media_group(context, update.message)
+        else:
+            await _submit_screenshots(context, update.effective_user, [update.message])
+        return
+
+    # Regular help/support
+    user_message = update.message.text.lower() if update.message.text else ""
+    locale = templates.locale_for(update.effective_user)
+    if 'support' in user_message:
+        await update.message.reply_html(templates.text('support', locale))
+    else:
+        await update.message.reply_html(templates.text('fallback', locale))
+
+
+async def cancel_send_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user_id = update.effective_user.id
+    if await storage.get_compose_target(str(user_id)):
+        await storage.clear_compose_target(str(user_id))
+        await update.message.reply_text("✅ Cancelled. Compose mode ended.")
+    else:
+        await update.message.reply_text("Nothing to cancel.")
+
+
+@admin_only('deliver')
+async def send_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user_id = update.effective_user.id
+    if not context.args:
+        await update.message.reply_text("Usage: /send <user_id>")
+        return
+    try:
+        target_id = int(context.args[0])
+    except ValueError:
+        await update.message.reply_text("Invalid user_id. Usage: /send <user_id>")
+        return
+    if await storage.get_user(target_id) is None:
+        await update.message.reply_text("Warning: user not found in database. You can still send.")
+    await storage.set_compose_target(str(user_id), target_id)
+    await update.message.reply_text(
+        "✉️ Compose mode: send the odds now (text/photo/document).\nUse /cancel_send to cancel."
+    )
+
+
+@admin_only('broadcast')
+async def broadcast_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user_id = update.effective_user.id
+    if broadcast_state.get('task'):
+        await update.message.reply_text("A broadcast is already running. Use /broadcast_status or /broadcast_cancel.")
+        return
+    await storage.set_compose_target(str(user_id), BROADCAST_TARGET)
+    await update.message.reply_text(
+        "📣 Broadcast mode: send the odds now (text/photo/document) and it will go to every premium user.\n"
+        "Use /cancel_send to cancel."
+    )
+
+
+@admin_only('broadcast')
+async def broadcast_status_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not broadcast_state:
+        await update.message.reply_text("No broadcast has been started yet.")
+        return
+    await update.message.reply_html(_broadcast_report(broadcast_state))
+
+
+@admin_only('broadcast')
+async def broadcast_cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    task = broadcast_state.get('task')
+    if not task:
+        await update.message.reply_text("No broadcast is running.")
+        return
+    broadcast_state['status'] = 'cancelled'
+    task.cancel()
+    broadcast_state['task'] = None
+    await update.message.reply_text("⏸ Broadcast stopped. Use /broadcast_resume to continue where it left off.")
+
+
+@admin_only('broadcast')
+async def broadcast_resume_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user_id = update.effective_user.id
+    if not broadcast_state or broadcast_state.get('task'):
+        await update.message.reply_text("Nothing to resume.")
+        return
+    # Failed chats are retried on resume
+    broadcast_state['done'] -= broadcast_state['failed_ids']
+    broadcast_state['failed'] -= len(broadcast_state['failed_ids'])
+    broadcast_state['failed_ids'].clear()
+    remaining = len(broadcast_state['recipients']) - len(broadcast_state['done'])
+    if not remaining:
+        await update.message.reply_text("The last broadcast already reached every recipient.")
+        return
+    broadcast_state['admin_id'] = user_id
+    _spawn_broadcast(context.bot, user_id)
+    await update.message.reply_text(f"▶️ Resuming broadcast for {remaining} remaining users.")
+
+
+@admin_only('broadcast')
+async def schedule_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    user_id = update.effective_user.id
+    if context.application.job_queue is None:
+        await update.message.reply_text("Scheduling needs python-telegram-bot[job-queue] installed.")
+        return
+    try:
+        when = _parse_release_time(context.args)
+    except (IndexError, ValueError):
+        await update.message.reply_text(
+            "Usage: /schedule HH:MM [YYYY-MM-DD]\n"
+            f"Times are {RELEASE_TIMEZONE.key}; without a date the next HH:MM is used."
+        )
+        return
+    await storage.set_compose_target(str(user_id), f'{RELEASE_TARGET_PREFIX}{when.timestamp()}')
+    await update.message.reply_text(
+        f"📅 Release at {_format_release_time(when.timestamp())}: send the tips now (text/photo/document) "
+        "and they go to every premium user at that time.\nUse /cancel_send to cancel."
+    )
+
+
+@admin_only('broadcast')
+async def schedule_status_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    ids = context.args[:1] or (await _release_ids())[-5:]
+    releases = [release for release in [await storage.get_meta(f'release:{rid}') for rid in ids] if release]
+    if not releases:
+        await update.message.reply_text("No releases scheduled. Use /schedule HH:MM to add one.")
+        return
+    await update.message.reply_html('\n\n'.join(_release_report(release) for release in releases))
+
+
+@admin_only('broadcast')
+async def schedule_cancel_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not context.args:
+        await update.message.reply_text("Usage: /schedule_cancel <release_id>")
+        return
+    release_id = context.args[0]
+    task = release_tasks.get(release_id)
+    if task:
+        cancelled_releases.add(release_id)
+        task.cancel()
+        await update.message.reply_text("⏹ Release stopped mid-way. /schedule_status shows who got it.")
+        return
+    async with storage.lock(f'release:{release_id}'):
+        release = await storage.get_meta(f'release:{release_id}')
+        if not release or release['status'] not in ('scheduled', 'interrupted'):
+            await update.message.reply_text("No scheduled release with that ID.")
+            return
+        release['status'] = 'cancelled'
+        await _save_release(release)
+    if context.application.job_queue:
+        for job in context.application.job_queue.get_jobs_by_name(f'release:{release_id}'):
+            job.schedule_removal()
+    await update.message.reply_text("✅ Release cancelled.")
+
+
+# Paystack
+def _verify_paystack_signature(body: bytes, signature: str) -> bool:
+    if not PAYSTACK_SECRET_KEY or not signature:
+        return False
+    expected = hmac.new(PAYSTACK_SECRET_KEY.encode(), body, hashlib.sha512).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+def _paystack_user_id(data: dict):
+    """Find the Telegram user a charge belongs to: metadata first, then a 'tg<user_id>-...' reference."""
+    metadata = data.get('metadata') or {}
+    if isinstance(metadata, str):
+        try:
+            metadata = json.loads(metadata)
+        except ValueError:
+            metadata = {}
+    if not isinstance(metadata, dict):
+        metadata = {}
+    candidates = [metadata.get('telegram_user_id'), metadata.get('telegram_id')]
+    custom_fields = metadata.get('custom_fields')
+    for field in custom_fields if isinstance(custom_fields, list) else []:
+        if isinstance(field, dict) and field.get('variable_name') in ('telegram_user_id', 'telegram_id'):
+            candidates.append(field.get('value'))
+    reference = data.get('reference') or ''
+    if reference.startswith('tg'):
+        candidates.append(reference[2:].lstrip('-').split('-', 1)[0])
+    for candidate in candidates:
+        try:
+            return int(str(candidate).strip())
+        except (TypeError, ValueError):
+            continue
+    return None
+
+
+def _tier_for_amount(amount: float):
+    """Highest tier the paid amount (in GHS) covers."""
+    covered = [(info['price'], key) for key, info in SUBSCRIPTION_TIERS.items() if amount >= info['price']]
+    return max(covered)[1] if covered else None
+
+
+async def _handle_paystack_event(application: Application, event: dict) -> str:
+    if event.get('event') != 'charge.success':
+        return 'ignored'
+    data = event.get('data') or {}
+    reference = data.get('reference')
+    user_id = _paystack_user_id(data)
+    # Amounts are only meaningful against our GHS price list
+    currency = str(data.get('currency') or '').upper()
+    tier_key = _tier_for_amount((data.get('amount') or 0) / 100) if currency == 'GHS' else None
+    if not reference or user_id is None or tier_key is None:
+        logger.warning(
+            f"Unmatched Paystack charge {reference}: user={user_id} "
+            f"amount={data.get('amount')} currency={data.get('currency')}"
+        )
+        return 'unmatched'
+
+    username = (data.get('customer') or {}).get('email')
+    async with storage.lock(f'pending:{user_id}'):
+        if await storage.payment_processed(reference):
+            return 'duplicate'
+        await _activate_premium(user_id, tier_key, username)
+        # Marked only once premium is on, so a failed activation is retried by Paystack
+        if not await storage.mark_payment_processed(reference, user_id):
+            return 'duplicate'
+        await storage.delete_pending(user_id)
+    tier_info = SUBSCRIPTION_TIERS[tier_key]
+    events.record(
+        'approval', user_id=user_id, tier=tier_key, amount=(data.get('amount') or 0) / 100,
+        method='paystack', reference=reference,
+    )
+    logger.info(f"Paystack payment {reference} activated {tier_key} for {user_id}")
+    await _notify_paystack_payment(user_id, tier_info, reference)
+    return 'activated'
+
+
+async def _notify_paystack_payment(user_id: int, tier_info: dict, reference: str) -> None:
+    await _enqueue(user_id, [{
+        'type': 'text',
+        'parse_mode': 'HTML',
+        'text': (
+            "<b>✅ Payment Confirmed!</b>\n\n"
+            f"Plan: {tier_info['name']}\n"
+            f"Amount: {tier_info['price']} GHS\n\n"
+            f"Your premium access is active. {BOT_OWNER} will send your odds shortly."
+        ),
+    }], 'notice', key=f'paystack:{reference}')
+    admin_id = await _dispatch_admin() or (int(ADMIN_ID) if ADMIN_ID else None)
+    if admin_id:
+        await _enqueue(admin_id, [{
+            'type': 'text',
+            'parse_mode': 'HTML',
+            'text': (
+                "<b>💳 Paystack Payment Activated</b>\n\n"
+                f"User ID: {user_id}\n"
+                f"Plan: {tier_info['name']}\n"
+                f"Reference: {html.escape(reference)}\n\n"
+                f"Use /send {user_id} to deliver the predictions now."
+            ),
+        }], 'admin', key=f'paystack:{reference}:admin')
+
+
+# Analytics
+class EventLog:
+    """Append-only event log: one JSONL file per day (RELEASE_TIMEZONE) in EVENTS_DIR, plus per-day counters.
+
+    `record()` only buffers. `flush()`, every EVENTS_FLUSH_INTERVAL seconds and at shutdown, appends the
+    lines in a thread and adds the buffered counts to the `stats:{day}` meta under a lock, so /stats
+    reads one small dict per day instead of rescanning history (and replicas add up). Each replica
+    writes its own files.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self._lines = []  # (day, json line)
+        self._counts = {}  # day -> {counter: value}
+        self._pruned_day = None
+
+    @staticmethod
+    def day(timestamp: float) -> str:
+        return datetime.fromtimestamp(timestamp, RELEASE_TIMEZONE).strftime('%Y-%m-%d')
+
+    def path(self, day: str) -> str:
+        return os.path.join(self.directory, f'events-{day}.jsonl')
+
+    def record(self, event: str, **fields) -> None:
+        now = time.time()
+        day = self.day(now)
+        self._lines.append((day, json.dumps({'ts': round(now, 3), 'event': event, **fields}, separators=(',', ':'))))
+        counts = self._counts.setdefault(day, {})
+        increments = {event: 1}
+        if event == 'start' and fields.get('new'):
+            increments['new_users'] = 1
+        if event == 'approval':
+            increments['revenue'] = fields.get('amount') or 0
+        if event in ('approval', 'rejection') and fields.get('latency') is not None:
+            increments[f'{event}_latency_sum'] = fields['latency']
+            increments[f'{event}_latency_count'] = 1
+        for name, value in increments.items():
+            counts[name] = counts.get(name, 0) + value
+
+    async def flush(self) -> None:
+        lines, self._lines = self._lines, []
+        counts, self._counts = self._counts, {}
+        if lines:
+            try:
+                await asyncio.to_thread(self._write, lines)
+            except OSError as e:
+                logger.error(f"Could not write {len(lines)} analytics events: {e}")
+        for day, increments in counts.items():
+            async with storage.lock(f'stats:{day}'):
+                stats = await storage.get_meta(f'stats:{day}') or {}
+                for name, value in increments.items():
+                    stats[name] = stats.get(name, 0) + value
+                await storage.set_meta(f'stats:{day}', stats)
+
+    def _write(self, lines: list) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        by_day = {}
+        for day, line in lines:
+            by_day.setdefault(day, []).append(line + '\n')
+        for day, day_lines in by_day.items():
+            with open(self.path(day), 'a', encoding='utf-8') as f:
+                f.writelines(day_lines)
+        today = self.day(time.time())
+        if self._pruned_day != today:
+            self._pruned_day = today
+            oldest = self.day(time.time() - EVENTS_KEEP_DAYS * 86400)
+            for name in os.listdir(self.directory):
+                if name.startswith('events-') and name[len('events-'):-len('.jsonl')] < oldest:
+                    os.remove(os.path.join(self.directory, name))
+
+    @staticmethod
+    def days(count: int) -> list:
+        """The last `count` days, oldest first."""
+        now = time.time()
+        return [EventLog.day(now - offset * 86400) for offset in range(count - 1, -1, -1)]
+
+
+events = EventLog(EVENTS_DIR)
+events_task = None
+
+
+async def _events_worker() -> None:
+    while True:
+        await asyncio.sleep(EVENTS_FLUSH_INTERVAL)
+        try:
+            await events.flush()
+        except Exception as e:
+            logger.error(f"Analytics flush failed: {e}")
+
+
+def _parse_days(args: list, default: int = 7, limit: int = 366) -> int:
+    try:
+        return min(max(int(args[0]), 1), limit) if args else default
+    except ValueError:
+        return default
+
+
+@admin_only('manage')
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    days = events.days(_parse_days(context.args))
+    await events.flush()
+    rows = [await storage.get_meta(f'stats:{day}') or {} for day in days]
+    totals = {}
+    for row in rows:
+        for name, value in row.items():
+            totals[name] = totals.get(name, 0) + value
+
+    lines = ["Day    Start  New Click Shot Paid  GHS"]
+    for day, row in zip(days, rows):
+        lines.append(
+            f"{day[5:]} {row.get('start', 0):>6} {row.get('new_users', 0):>4} {row.get('subscribe_click', 0):>5}"
+            f" {row.get('screenshot', 0):>4} {row.get('approval', 0):>4} {row.get('revenue', 0):>4.0f}"
+        )
+    new_users = totals.get('new_users', 0)
+    # Approvals include users who joined before the window (or paid on Paystack without /start),
+    # so the ratio can pass 100%; it is capped there rather than read as a per-user rate
+    conversion = f"{min(totals.get('approval', 0) / new_users, 1):.1%}" if new_users else "n/a"
+    latency_count = totals.get('approval_latency_count', 0)
+    latency = _format_duration(totals['approval_latency_sum'] / latency_count) if latency_count else "n/a"
+    await update.message.reply_html(
+        f"<b>📊 Stats, last {len(days)} day(s)</b>\n\n"
+        f"<pre>{chr(10).join(lines)}</pre>\n"
+        f"New users: {new_users}\n"
+        f"Payments: {totals.get('approval', 0)} approved, {totals.get('rejection', 0)} rejected\n"
+        f"Revenue: {totals.get('revenue', 0):.2f} GHS\n"
+        f"Paid ÷ new users (capped at 100%): {conversion}\n"
+        f"Avg approval time: {latency}\n"
+        f"Deliveries: {totals.get('delivery', 0)}\n\n"
+        "Use /stats [days] or /export [days] for the raw events."
+    )
+
+
+def _write_export(paths: list, target) -> None:
+    """Gzip the day files into `target` a block at a time; runs in a thread."""
+    with gzip.open(target, 'wb') as out:
+        for path in paths:
+            with open(path, 'rb') as f:
+                shutil.copyfileobj(f, out, 1 << 16)
+
+
+@admin_only('manage')
+async def export_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    days = events.days(_parse_days(context.args))
+    await events.flush()
+    paths = [events.path(day) for day in days if os.path.exists(events.path(day))]
+    if not paths:
+        await update.message.reply_text("No events recorded in that range.")
+        return
+    with tempfile.TemporaryFile() as export:
+        await asyncio.to_thread(_write_export, paths, export)
+        size = export.tell()
+        if size > EXPORT_MAX_BYTES:
+            await update.message.reply_text(
+                f"The export is {size / 1024 / 1024:.0f} MB, over the upload limit. Try fewer days."
+            )
+            return
+        export.seek(0)
+        await update.message.reply_document(
+            document=export,
+            filename=f'events-{days[0]}-to-{days[-1]}.jsonl.gz',
+            caption=f"{len(paths)} day file(s), {size / 1024:.0f} KB compressed",
+        )
+
+
+# Flood protection
+class FloodGuard:
+    """Per-user token buckets for each kind of update, with escalation for users who keep hitting them.
+
+    RATE_LIMIT_STRIKES dropped updates within RATE_LIMIT_WINDOW mute a user for RATE_LIMIT_MUTE
+    seconds, doubling with every further mute; RATE_LIMIT_BAN_AFTER mutes in a row become a
+    RATE_LIMIT_BAN. State lives in memory and is bounded: past `max_users` the least recently
+    seen user is forgotten. Every replica enforces its own limits.
+    """
+
+    def __init__(self, limits: dict, max_users: int):
+        self.limits = limits
+        self.max_users = max_users
+        self._users = OrderedDict()  # user id -> state, least recently seen first
+
+    def _state(self, user_id: int) -> dict:
+        state = self._users.get(user_id)
+        if state is None:
+            state = self._users[user_id] = {
+                'buckets': {},  # kind -> (tokens, updated)
+                'strikes': deque(maxlen=RATE_LIMIT_STRIKES),
+                'mutes': 0,
+                'muted_until': 0.0,
+            }
+            if len(self._users) > self.max_users:
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end(user_id)
+        return state
+
+    def check(self, user_id: int, kind: str, now: float = None) -> tuple:
+        """Take a token; returns (action, seconds muted) where action is 'ok', 'dropped', 'silenced'
+        (already muted), or 'muted'/'banned' when this update started the penalty."""
+        now = time.monotonic() if now is None else now
+        state = self._state(user_id)
+        if now < state['muted_until']:
+            return 'silenced', state['muted_until'] - now
+        burst, seconds = self.limits[kind]
+        tokens, updated = state['buckets'].get(kind, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * burst / seconds)
+        if tokens >= 1:
+            state['buckets'][kind] = (tokens - 1, now)
+            return 'ok', 0
+        state['buckets'][kind] = (tokens, now)
+
+        strikes = state['strikes']
+        strikes.append(now)
+        if len(strikes) < strikes.maxlen or now - strikes[0] > RATE_LIMIT_WINDOW:
+            return 'dropped', 0
+        strikes.clear()
+        if now - state['muted_until'] > RATE_LIMIT_BAN:
+            state['mutes'] = 0
+        state['mutes'] += 1
+        if state['mutes'] >= RATE_LIMIT_BAN_AFTER:
+            action, duration = 'banned', RATE_LIMIT_BAN
+        else:
+            action, duration = 'muted', RATE_LIMIT_MUTE * 2 ** (state['mutes'] - 1)
+        state['muted_until'] = now + duration
+        return action, duration
+
+    def lift(self, user_id: int) -> bool:
+        state = self._users.pop(user_id, None)
+        return bool(state and state['muted_until'] > time.monotonic())
+
+    def muted(self) -> list:
+        """(user id, seconds left) for users muted or banned right now."""
+        now = time.monotonic()
+        return [(user_id, state['muted_until'] - now) for user_id, state in self._users.items() if state['muted_until'] > now]
+
+    def muted_count(self) -> int:
+        return len(self.muted())
+
+
+flood_guard = FloodGuard(RATE_LIMITS, RATE_LIMIT_USERS)
+
+
+def _update_kind(update: Update):
+    if update.callback_query:
+        return 'callback'
+    message = update.message or update.edited_message
+    if message is None:
+        return None  # membership changes and the like are not user-driven floods
+    if message.photo or message.document or message.video or message.audio or message.voice or message.sticker:
+        return 'upload'
+    if message.text and message.text.startswith('/'):
+        return 'command'
+    return 'message'
+
+
+def _format_duration(seconds: float) -> str:
+    if seconds >= 3600:
+        return f"{seconds / 3600:.0f} h"
+    return f"{max(seconds / 60, 1):.0f} min"
+
+
+async def flood_guard_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Runs ahead of every other handler (group -1) and stops updates from users over their limits."""
+    user = update.effective_user
+    kind = _update_kind(update)
+    if user is None or kind is None or _is_admin(user.id):
+        return
+    action, duration = flood_guard.check(user.id, kind)
+    if action == 'ok':
+        return
+    RATE_LIMITED.inc(kind, action)
+    if action in ('muted', 'banned'):
+        logger.warning(f"Flood protection: user {user.id} {action} for {duration:.0f}s")
+        if update.effective_message:
+            with contextlib.suppress(TelegramError):
+                await update.effective_message.reply_text(
+                    f"⏳ You're sending too fast. Your messages will be ignored for {_format_duration(duration)}."
+                )
+        if action == 'banned' and ADMIN_ID:
+            await _enqueue(int(ADMIN_ID), [{
+                'type': 'text',
+                'parse_mode': 'HTML',
+                'text': (
+                    f"🚫 User <code>{user.id}</code> kept flooding the bot and is ignored for "
+                    f"{_format_duration(duration)}. /unmute {user.id} lifts it."
+                ),
+            }], 'admin')
+    raise ApplicationHandlerStop
+
+
+@admin_only('manage')
+async def unmute_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    if not context.args:
+        muted = flood_guard.muted()
+        lines = [f"• <code>{user_id}</code>, {_format_duration(left)} left" for user_id, left in muted[:40]]
+        await update.message.reply_html(
+            "<b>🔇 Muted Users</b>\n\n" + ("\n".join(lines) if lines else "None.") + "\n\nUsage: /unmute [user_id]"
+        )
+        return
+    try:
+        user_id = int(context.args[0])
+    except ValueError:
+        await update.message.reply_text("Usage: /unmute [user_id]")
+        return
+    if flood_guard.lift(user_id):
+        await update.message.reply_text(f"🔊 {user_id} can message the bot again.")
+    else:
+        await update.message.reply_text(f"{user_id} wasn't muted.")
+
+
+# Update processing
+class OrderedApplication(Application):
+    """Processes updates concurrently, but serializes updates from the same user (or chat).
+
+    PTB starts a task per update (bounded by UPDATE_MAX_PENDING). Each task first waits for its
+    user's lock, in arrival order, and only then for one of UPDATE_CONCURRENCY slots, so a user
+    sending a burst queues behind themself without holding slots other users need.
+    """
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._update_locks = KeyedLocks()
+        self._update_slots = asyncio.Semaphore(UPDATE_CONCURRENCY)
+        self.update_stats = {
+            'waiting': 0, 'running': 0, 'processed': 0,
+            'wait_total': 0.0, 'wait_max': 0.0,
+        }
+
+    @staticmethod
+    def _update_key(update: object):
+        if isinstance(update, Update):
+            if update.effective_user:
+                return f'user:{update.effective_user.id}'
+            if update.effective_chat:
+                return f'chat:{update.effective_chat.id}'
+        return None
+
+    async def process_update(self, update: object) -> None:
+        stats = self.update_stats
+        key = self._update_key(update)
+        queued = time.monotonic()
+        started = False
+        stats['waiting'] += 1
+        try:
+            async with self._update_locks(key) if key else contextlib.nullcontext():
+                async with self._update_slots:
+                    waited = time.monotonic() - queued
+                    started = True
+                    stats['waiting'] -= 1
+                    stats['running'] += 1
+                    stats['wait_total'] += waited
+                    stats['wait_max'] = max(stats['wait_max'], waited)
+                    UPDATE_WAIT.observe(waited)
+                    await super().process_update(update)
+                    startup.mark_first_update()
+        finally:
+            if started:
+                stats['running'] -= 1
+                stats['processed'] += 1
+            else:
+                stats['waiting'] -= 1
+
+    def update_report(self) -> str:
+        stats = self.update_stats
+        avg = stats['wait_total'] / stats['processed'] if stats['processed'] else 0.0
+        return (
+            "<b>⚙️ Update Processing</b>\n\n"
+            f"Concurrency: {UPDATE_CONCURRENCY} (max pending {UPDATE_MAX_PENDING})\n"
+            f"Running: {stats['running']}\n"
+            f"Waiting: {stats['waiting'] + self.update_queue.qsize()}\n"
+            f"Processed: {stats['processed']}\n"
+            f"Avg wait: {avg * 1000:.0f} ms\n"
+            f"Max wait: {stats['wait_max'] * 1000:.0f} ms"
+        )
+
+
+@admin_only('manage')
+async def queue_status_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    await update.message.reply_html(context.application.update_report())
+
+
+@admin_only('manage')
+async def outbox_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    stats = await storage.outbound_stats()
+    dead = await storage.dead_outbound(10)
+    lines = [
+        "<b>📬 Outbound Queue</b>\n",
+        f"Queued: {stats.get('queued', 0)}",
+        f"Sent (last {OUTBOX_KEEP / 3600:.0f}h): {stats.get('sent', 0)}",
+        f"Dead-lettered: {stats.get('dead', 0)}",
+    ]
+    if dead:
+        lines.append("")
+        lines += [
+            f"• {job['kind']} to <code>{job['chat_id']}</code>, "
+            f"{job['sent']}/{len(job['parts'])} sent: {job['error'] or '—'}"[:300]
+            for job in dead
+        ]
+        lines.append("\nUse /outbox_retry to queue them again.")
+    await update.message.reply_html("\n".join(lines))
+
+
+@admin_only('manage')
+async def outbox_retry_command(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    dead = await storage.dead_outbound(1000)
+    now = time.time()
+    for job in dead:
+        job.update(status='queued', attempts=0, due=now, updated_at=now)
+        await storage.save_outbound(job)
+    outbox_wakeup.set()
+    await update.message.reply_text(f"🔁 {len(dead)} dead-lettered message(s) queued again.")
+
+
+# Web server
+class TelegramWebhookHandler(tornado.web.RequestHandler):
+    def initialize(self, bot_application: Application) -> None:
+        self.bot_application = bot_application
+
+    async def post(self) -> None:
+        try:
+            update = Update.de_json(json.loads(self.request.body), self.bot_application.bot)
+        except ValueError:
+            self.send_error(400)
+            return
+        await self.bot_application.update_queue.put(update)
+
+
+class PaystackWebhookHandler(tornado.web.RequestHandler):
+    def initialize(self, bot_application: Application) -> None:
+        self.bot_application = bot_application
+
+    async def post(self) -> None:
+        if not _verify_paystack_signature(self.request.body, self.request.headers.get('x-paystack-signature')):
+            self.send_error(401)
+            return
+        try:
+            event = json.loads(self.request.body)
+        except ValueError:
+            self.send_error(400)
+            return
+        result = await _handle_paystack_event(self.bot_application, event)
+        self.write({'status': result})
+
+
+class MetricsHandler(tornado.web.RequestHandler):
+    def initialize(self, bot_application: Application) -> None:
+        self.bot_application = bot_application
+
+    async def get(self) -> None:
+        self.set_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.write(await _render_metrics(self.bot_application))
+
+
+class HealthHandler(tornado.web.RequestHandler):
+    """Liveness: the process is up and its HTTP server answers."""
+
+    def get(self) -> None:
+        self.write({'status': 'ok', 'uptime': round(startup.elapsed(), 1)})
+
+
+class ReadyHandler(tornado.web.RequestHandler):
+    """Readiness: storage is open and updates are being handled; 503 while starting or stopping."""
+
+    def get(self) -> None:
+        if not startup.ready:
+            self.set_status(503)
+        self.write({
+            'status': 'ready' if startup.ready else 'unavailable',
+            'startup_seconds': startup.ready_after and round(startup.ready_after, 2),
+        })
+
+
+def _web_routes(application: Application) -> list:
+    routes = [
+        (HEALTH_PATH, HealthHandler),
+        (READY_PATH, ReadyHandler),
+        (PAYSTACK_WEBHOOK_PATH, PaystackWebhookHandler, {'bot_application': application}),
+        (METRICS_PATH, MetricsHandler, {'bot_application': application}),
+    ]
+    if WEBHOOK_URL:
+        routes.append((f'/{BOT_TOKEN}', TelegramWebhookHandler, {'bot_application': application}))
+    return routes
+
+
+async def _serve(application: Application, stop: asyncio.Event = None) -> None:
+    """Run the bot and the HTTP server (Telegram webhook, Paystack webhook) on PORT until signalled
+    (or until `stop` is set, for callers such as bench.py)."""
+    stop = stop or asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+
+    # Listen first: /healthz answers right away, /readyz turns 200 once updates are handled.
+    # Webhook updates arriving before that wait in the update queue.
+    server = tornado.httpserver.HTTPServer(tornado.web.Application(_web_routes(application)))
+    server.listen(PORT, '0.0.0.0')
+    startup.mark('listen')
+    try:
+        async with application:
+            startup.mark('initialize')
+            if WEBHOOK_URL:
+                logger.info(f"Starting in WEBHOOK mode at {WEBHOOK_URL}")
+                await asyncio.gather(application.post_init(application), _set_webhook(application.bot))
+                startup.mark('webhook')
+            else:
+                logger.info("Starting in POLLING mode")
+                await application.post_init(application)
+                await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+                startup.mark('polling')
+            await application.start()
+            startup.mark('start')
+            startup.mark_ready()
+            application.create_task(_after_startup(application))
+            await stop.wait()
+
+            logger.info("Shutting down...")
+            startup.ready_after = None
+            server.stop()
+            if application.updater.running:
+                await application.updater.stop()
+            await application.stop()
+        # Same order as run_polling/run_webhook: leaving the block runs Application.shutdown(), whose
+        # final persistence update and flush still need storage, so post_shutdown comes after it
+        await application.post_shutdown(application)
+    finally:
+        server.stop()
+
+
+def build_application() -> Application:
+    builder = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .base_url(f'{TELEGRAM_API_URL}/bot')
+        .base_file_url(f'{TELEGRAM_API_URL}/file/bot')
+        .request(_make_request(
+            'outbound', TELEGRAM_HTTP_VERSION,
+            connection_pool_size=TELEGRAM_POOL_SIZE,
+            pool_timeout=TELEGRAM_POOL_TIMEOUT,
+            connect_timeout=TELEGRAM_TIMEOUT,
+            read_timeout=TELEGRAM_TIMEOUT,
+            write_timeout=TELEGRAM_TIMEOUT,
+            method_timeouts=TELEGRAM_METHOD_TIMEOUTS,
+        ))
+        # Long polling holds its one connection open; keep it off the outbound pool
+        .get_updates_request(_make_request('updates', connection_pool_size=1, pool_timeout=TELEGRAM_POOL_TIMEOUT))
+        .application_class(OrderedApplication)
+        .concurrent_updates(UPDATE_MAX_PENDING)
+    )
+    if isinstance(storage, RedisStorage):
+        builder = builder.persistence(RedisPersistence(storage))
+    elif isinstance(storage, SQLiteStorage):
+        builder = builder.persistence(JournalPersistence(SESSION_STATE_PATH))
+    application = builder.build()
+
+    # Flood protection ahead of everything else
+    application.add_handler(TypeHandler(Update, flood_guard_handler), group=-1)
+
+    # Command handlers
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("help", help_command))
     application.add_handler(CommandHandler("status", status_command))
@@ -567,29 +4611,48 @@ def main() -> None:
     application.add_handler(CommandHandler("approve", approve_command))
     application.add_handler(CommandHandler("cancel_send", cancel_send_command))
     application.add_handler(CommandHandler("send", send_command))
+    application.add_handler(CommandHandler("broadcast", broadcast_command))
+    application.add_handler(CommandHandler("broadcast_status", broadcast_status_command))
+    application.add_handler(CommandHandler("broadcast_cancel", broadcast_cancel_command))
+    application.add_handler(CommandHandler("broadcast_resume", broadcast_resume_command))
+    application.add_handler(CommandHandler("schedule", schedule_command))
+    application.add_handler(CommandHandler("schedule_status", schedule_status_command))
+    application.add_handler(CommandHandler("schedule_cancel", schedule_cancel_command))
+    application.add_handler(CommandHandler("queue_status", queue_status_command))
+    application.add_handler(CommandHandler("outbox", outbox_command))
+    application.add_handler(CommandHandler("outbox_retry", outbox_retry_command))
+    application.add_handler(CommandHandler("admins", admins_command))
+    application.add_handler(CommandHandler("online", online_command))
+    application.add_handler(CommandHandler("offline", offline_command))
+    application.add_handler(CommandHandler("unmute", unmute_command))
+    application.add_handler(CommandHandler("stats", stats_command))
+    application.add_handler(CommandHandler("export", export_command))
 
     # Callback and message handlers
-    application.add_handler(CallbackQueryHandler(button_callback))
+    application.add_handler(CallbackQueryHandler(callbacks.dispatch, pattern=callbacks.pattern()))
+    application.add_handler(CallbackQueryHandler(callbacks.expired))
     application.add_handler(MessageHandler(filters.PHOTO, handle_message))
     application.add_handler(MessageHandler(filters.Document.ALL, handle_message))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_message))
 
+    # Latency/error instrumentation for every handler registered above
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            handler.callback = _instrumented(handler.callback)
+
+    application.post_init = _post_init
+    application.post_shutdown = _post_shutdown
+    return application
+
+
+def main() -> None:
+    startup.mark('imports')
+    application = build_application()
+    startup.mark('build')
+
     # Start
     logger.info("BetTips Pro Bot starting...")
-    application.post_init = _set_bot_commands
-
-    if WEBHOOK_URL:
-        logger.info(f"Starting in WEBHOOK mode at {WEBHOOK_URL}")
-        application.run_webhook(
-            listen="0.0.0.0",
-            port=PORT,
-            url_path=BOT_TOKEN,
-            webhook_url=f"{WEBHOOK_URL}/{BOT_TOKEN}",
-            allowed_updates=Update.ALL_TYPES,
-        )
-    else:
-        logger.info("Starting in POLLING mode")
-        application.run_polling(allowed_updates=Update.ALL_TYPES)
+    asyncio.run(_serve(application))
 
 
 if __name__ == '__main__':
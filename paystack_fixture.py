@@ -0,0 +1,71 @@
+"""Post a signed Paystack `charge.success` fixture to a running bot.
+
+Stands in for Paystack when testing the webhook locally:
+
+    PAYSTACK_SECRET_KEY=sk_test_x python paystack_fixture.py 123456789 --repeat 3
+
+Repeats reuse the same reference, so only the first delivery should activate.
+"""
+import os
+import hmac
+import json
+import time
+import hashlib
+import argparse
+import urllib.error
+import urllib.request
+
+
+def build_event(user_id: int, amount_ghs: float, reference: str) -> dict:
+    return {
+        'event': 'charge.success',
+        'data': {
+            'reference': reference,
+            'amount': int(amount_ghs * 100),
+            'currency': 'GHS',
+            'status': 'success',
+            'customer': {'email': f'{user_id}@example.com'},
+            'metadata': {
+                'custom_fields': [
+                    {'display_name': 'Telegram ID', 'variable_name': 'telegram_id', 'value': str(user_id)},
+                ],
+            },
+        },
+    }
+
+
+def post_event(url: str, secret: str, event: dict) -> str:
+    body = json.dumps(event).encode()
+    signature = hmac.new(secret.encode(), body, hashlib.sha512).hexdigest()
+    request = urllib.request.Request(
+        url, data=body, method='POST',
+        headers={'Content-Type': 'application/json', 'x-paystack-signature': signature},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            return f"{response.status} {response.read().decode()}"
+    except urllib.error.HTTPError as e:
+        return f"{e.code} {e.reason}"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('user_id', type=int)
+    parser.add_argument('--amount', type=float, default=100)
+    parser.add_argument('--reference', default=None)
+    parser.add_argument('--repeat', type=int, default=1, help='deliver the same event N times')
+    parser.add_argument('--url', default=f"http://localhost:{os.getenv('PORT', '10000')}/paystack/webhook")
+    parser.add_argument('--bad-signature', action='store_true')
+    args = parser.parse_args()
+
+    secret = os.getenv('PAYSTACK_SECRET_KEY')
+    if not secret:
+        raise SystemExit('PAYSTACK_SECRET_KEY not set')
+    reference = args.reference or f'tg{args.user_id}-{int(time.time())}'
+    event = build_event(args.user_id, args.amount, reference)
+    for _ in range(args.repeat):
+        print(post_event(args.url, 'wrong' if args.bad_signature else secret, event))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,22 @@
+"""Shared setup: bot.py reads its configuration at import, so the environment is set first."""
+import os
+import sys
+import tempfile
+
+import pytest
+
+os.environ.setdefault('TELEGRAM_BOT_TOKEN', '1:test')
+os.environ['ADMIN_ID'] = '999'
+os.environ['STORAGE_BACKEND'] = 'memory'
+os.environ['PAYSTACK_SECRET_KEY'] = 'sk_test_secret'
+os.environ.setdefault('EVENTS_DIR', tempfile.mkdtemp(prefix='bot-events-'))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bot  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def fresh_storage(monkeypatch):
+    """Each test starts from an empty in-memory store."""
+    monkeypatch.setattr(bot, 'storage', bot.MemoryStorage())
+    return bot.storage
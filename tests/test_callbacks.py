@@ -0,0 +1,104 @@
+"""CallbackRouter: signed admin buttons can't be forged, legacy data still routes, data fits 64 bytes."""
+import asyncio
+import types
+
+import pytest
+
+import bot
+
+
+def _query_update(data: str, user_id: int = 1):
+    answers = []
+
+    async def answer(text=None, **kwargs):
+        answers.append(text)
+
+    query = types.SimpleNamespace(data=data, from_user=types.SimpleNamespace(id=user_id), answer=answer)
+    return types.SimpleNamespace(callback_query=query, effective_user=query.from_user), answers
+
+
+@pytest.fixture
+def router():
+    router = bot.CallbackRouter(b'test-secret')
+    router.calls = []
+
+    @router.route('adm', int, signed=True, aliases=('admin_send',))
+    async def admin_send(update, context, user_id):
+        router.calls.append(('adm', user_id))
+
+    @router.route('sub', str, aliases=('subscribe',))
+    async def subscribe(update, context, tier_key):
+        router.calls.append(('sub', tier_key))
+
+    @router.route('how', aliases=('how_it_works',))
+    async def how(update, context):
+        router.calls.append(('how',))
+
+    return router
+
+
+def _dispatch(router, data: str) -> list:
+    update, answers = _query_update(data)
+    asyncio.run(router.dispatch(update, None))
+    return answers
+
+
+def test_signed_data_round_trips(router):
+    data = router.data('adm', 123456789)
+    assert _dispatch(router, data) == []
+    assert router.calls == [('adm', 123456789)]
+
+
+@pytest.mark.parametrize('forge', [
+    lambda data: data[:-1] + ('A' if data[-1] != 'A' else 'B'),  # tampered signature
+    lambda data: data.rsplit(':', 1)[0],  # signature dropped
+    lambda data: 'adm:' + bot.CallbackRouter._encode(42) + ':' + data.rsplit(':', 1)[1],  # signature reused
+    lambda data: 'adm:' + bot.CallbackRouter._encode(42),  # crafted from scratch, unsigned
+    lambda data: 'admin_send_42',  # the legacy unsigned form of a signed route
+])
+def test_forged_signed_data_is_rejected(router, forge):
+    data = forge(router.data('adm', 123456789))
+    answers = _dispatch(router, data)
+    assert router.calls == []
+    assert answers == ["This button is no longer valid."]
+
+
+def test_signature_depends_on_the_secret(router):
+    other = bot.CallbackRouter(b'another-secret')
+    other.routes = router.routes
+    assert _dispatch(router, other.data('adm', 7)) == ["This button is no longer valid."]
+    assert router.calls == []
+
+
+def test_legacy_aliases_still_resolve(router):
+    for data in ('subscribe_tier3', 'subscribe_tier_x', 'sub:tier2', 'how_it_works', 'how'):
+        assert router.pattern().match(data)
+        assert _dispatch(router, data) == []
+    assert router.calls == [('sub', 'tier3'), ('sub', 'tier_x'), ('sub', 'tier2'), ('how',), ('how',)]
+
+
+def test_unknown_data_is_answered_as_expired(router):
+    assert not router.pattern().match('removed_feature')
+    assert _dispatch(router, 'removed_feature') == ["This button is no longer valid."]
+    assert router.calls == []
+
+
+def test_data_enforces_the_64_byte_limit(router):
+    assert len(router.data('sub', 'x' * (64 - len('sub:'))).encode()) == 64
+    with pytest.raises(ValueError):
+        router.data('sub', 'x' * (65 - len('sub:')))
+    with pytest.raises(ValueError):
+        router.data('sub', 'é' * 31)  # 62 bytes of UTF-8 in 31 characters
+    # Signed data leaves room for the signature
+    with pytest.raises(ValueError):
+        router.data('adm', int('z' * 52, 36))
+
+
+def test_bot_admin_buttons_are_signed():
+    """The bot's own admin routes are signed: a user can't craft "Send Game" data for themselves."""
+    for prefix in ('as', 'pa', 'pr', 'pv', 'pq'):
+        assert bot.callbacks.routes[prefix][2], prefix
+    update, answers = _query_update('as:' + bot.CallbackRouter._encode(555))
+    asyncio.run(bot.callbacks.dispatch(update, None))
+    assert answers == ["This button is no longer valid."]
+    assert asyncio.run(bot.storage.get_compose_target('1')) is None
@@ -0,0 +1,80 @@
+"""JournalPersistence recovery after a crash that tore the last journal record."""
+import asyncio
+import os
+
+import bot
+
+
+async def _apply(persistence, user_id: int, data) -> None:
+    if data is None:
+        await persistence.drop_user_data(user_id)
+    else:
+        await persistence.update_user_data(user_id, data)
+    if persistence._writer:
+        await persistence._writer
+
+
+def test_torn_journal_record_is_dropped(tmp_path, monkeypatch):
+    monkeypatch.setattr(bot, 'SESSION_JOURNAL_MAX', 4)
+    path = str(tmp_path / 'bot.db.sessions')
+    changes = [
+        (1, {'pending_tier': 'tier1'}),
+        (2, {'waiting_for_screenshot': True}),
+        (3, {'pending_tier': 'tier3'}),
+        (1, {'pending_tier': 'tier2', 'waiting_for_screenshot': True}),  # fourth record: snapshot taken
+        (2, None),  # replayed from the journal
+    ]
+    torn = (4, {'pending_tier': 'tier1'})
+
+    async def crash() -> int:
+        persistence = bot.JournalPersistence(path)
+        assert await persistence.get_user_data() == {}
+        for user_id, data in changes:
+            await _apply(persistence, user_id, data)
+        assert os.path.exists(persistence.snapshot_path)
+        intact = os.path.getsize(persistence.journal_path)
+        await _apply(persistence, *torn)
+        # The process dies halfway through writing the last record
+        written = os.path.getsize(persistence.journal_path)
+        os.truncate(persistence.journal_path, intact + (written - intact) // 2)
+        return intact
+
+    async def recover() -> tuple:
+        persistence = bot.JournalPersistence(path)
+        recovered = await persistence.get_user_data()
+        size = os.path.getsize(persistence.journal_path)
+        # New records must start on a clean line
+        await _apply(persistence, 5, {'pending_tier': 'tier2'})
+        return recovered, size
+
+    intact = asyncio.run(crash())
+    recovered, size = asyncio.run(recover())
+
+    expected = {}
+    for user_id, data in changes:
+        if data is None:
+            expected.pop(user_id, None)
+        else:
+            expected[user_id] = data
+    assert recovered == expected
+    assert size == intact
+
+    reopened = asyncio.run(bot.JournalPersistence(path).get_user_data())
+    assert reopened == {**expected, 5: {'pending_tier': 'tier2'}}
+
+
+def test_flush_compacts_into_the_snapshot(tmp_path):
+    path = str(tmp_path / 'bot.db.sessions')
+
+    async def run():
+        persistence = bot.JournalPersistence(path)
+        await persistence.get_user_data()
+        await _apply(persistence, 1, {'pending_tier': 'tier1'})
+        await _apply(persistence, 2, {'pending_tier': 'tier2'})
+        await persistence.flush()
+        return persistence
+
+    persistence = asyncio.run(run())
+    assert os.path.getsize(persistence.journal_path) == 0
+    reopened = asyncio.run(bot.JournalPersistence(path).get_user_data())
+    assert reopened == {1: {'pending_tier': 'tier1'}, 2: {'pending_tier': 'tier2'}}
@@ -0,0 +1,127 @@
+"""Paystack webhook: signature check, amount/currency matching and idempotent activation."""
+import asyncio
+import hashlib
+import hmac
+import json
+
+import pytest
+import tornado.httpclient
+import tornado.httpserver
+import tornado.testing
+import tornado.web
+
+import bot
+from paystack_fixture import build_event
+
+SECRET = 'sk_test_secret'
+USER_ID = 123456789
+
+
+@pytest.fixture(autouse=True)
+def paystack_secret(monkeypatch):
+    monkeypatch.setattr(bot, 'PAYSTACK_SECRET_KEY', SECRET)
+
+
+def _sign(body: bytes, secret: str = SECRET) -> str:
+    return hmac.new(secret.encode(), body, hashlib.sha512).hexdigest()
+
+
+def _post_all(requests: list) -> list:
+    """POST each (body, signature) to a PaystackWebhookHandler in turn; returns (status, json or None)."""
+    async def scenario():
+        sock, port = tornado.testing.bind_unused_port()
+        app = tornado.web.Application([(r'/paystack', bot.PaystackWebhookHandler, {'bot_application': None})])
+        server = tornado.httpserver.HTTPServer(app)
+        server.add_sockets([sock])
+        client = tornado.httpclient.AsyncHTTPClient()
+        results = []
+        try:
+            for body, signature in requests:
+                headers = {'Content-Type': 'application/json'}
+                if signature is not None:
+                    headers['x-paystack-signature'] = signature
+                response = await client.fetch(
+                    f'http://127.0.0.1:{port}/paystack', method='POST', body=body, headers=headers,
+                    raise_error=False,
+                )
+                payload = json.loads(response.body) if response.code == 200 else None
+                results.append((response.code, payload))
+        finally:
+            server.stop()
+        return results
+
+    return asyncio.run(scenario())
+
+
+def _event_body(**overrides) -> bytes:
+    event = build_event(USER_ID, bot.SUBSCRIPTION_TIERS['tier3']['price'], 'tg-ref-1')
+    event['data'].update(overrides)
+    return json.dumps(event).encode()
+
+
+def _user():
+    return asyncio.run(bot.storage.get_user(USER_ID))
+
+
+def test_signed_charge_activates_premium():
+    body = _event_body()
+    assert _post_all([(body, _sign(body))]) == [(200, {'status': 'activated'})]
+    user = _user()
+    assert user['is_premium']
+    assert user['subscription_tier'] == 'tier3'
+
+
+@pytest.mark.parametrize('signature', [None, '', 'deadbeef', _sign(b'{}'), _sign(b'x', 'sk_other')])
+def test_bad_or_missing_signature_is_rejected(signature):
+    body = _event_body()
+    [(status, _)] = _post_all([(body, signature)])
+    assert status == 401
+    assert _user() is None
+
+
+def test_signature_covers_the_exact_body():
+    body = _event_body()
+    tampered = body.replace(b'"amount": 10000', b'"amount": 99999')
+    assert tampered != body
+    [(status, _)] = _post_all([(tampered, _sign(body))])
+    assert status == 401
+
+
+def test_repeated_reference_activates_once():
+    body = _event_body()
+    results = _post_all([(body, _sign(body))] * 3)
+    assert [payload['status'] for _, payload in results] == ['activated', 'duplicate', 'duplicate']
+    assert _user()['odds_remaining'] == bot.SUBSCRIPTION_TIERS['tier3']['odds']
+
+
+@pytest.mark.parametrize('overrides', [
+    {'currency': 'USD'},
+    {'currency': None},
+    {'amount': 100},  # 1 GHS: no tier costs that
+    {'metadata': ['not', 'a', 'dict'], 'reference': 'no-user-in-here'},
+    {'metadata': 'plain text', 'reference': 'no-user-in-here'},
+])
+def test_unmatched_charges_grant_nothing(overrides):
+    body = _event_body(**overrides)
+    assert _post_all([(body, _sign(body))]) == [(200, {'status': 'unmatched'})]
+    assert _user() is None
+
+
+def test_non_charge_events_are_ignored():
+    body = json.dumps({'event': 'transfer.success', 'data': {}}).encode()
+    assert _post_all([(body, _sign(body))]) == [(200, {'status': 'ignored'})]
+
+
+def test_failed_activation_is_retried(monkeypatch):
+    event = json.loads(_event_body())
+    activate = bot._activate_premium
+
+    async def failing(*args, **kwargs):
+        raise RuntimeError('storage unavailable')
+
+    monkeypatch.setattr(bot, '_activate_premium', failing)
+    with pytest.raises(RuntimeError):
+        asyncio.run(bot._handle_paystack_event(None, event))
+    monkeypatch.setattr(bot, '_activate_premium', activate)
+    assert asyncio.run(bot._handle_paystack_event(None, event)) == 'activated'
+    assert asyncio.run(bot._handle_paystack_event(None, event)) == 'duplicate'
@@ -0,0 +1,59 @@
+"""/pending buttons stay within the Bot API's 64-byte callback data limit."""
+import asyncio
+import time
+import types
+
+import bot
+
+LARGE_USER_ID = 9_999_999_999_999
+
+
+def _admin_update(calls: list, data: str = None):
+    async def record(*args, **kwargs):
+        calls.append(kwargs.get('text', args[0] if args else None))
+        calls.append(kwargs.get('reply_markup'))
+
+    user = types.SimpleNamespace(id=999)
+    message = types.SimpleNamespace(chat_id=999, reply_text=record, reply_html=record)
+    query = None
+    if data is not None:
+        query = types.SimpleNamespace(data=data, from_user=user, message=message, answer=record,
+                                      edit_message_text=record)
+    return types.SimpleNamespace(effective_user=user, message=message, callback_query=query)
+
+
+def _buttons(markup) -> list:
+    return [button.callback_data for row in markup.inline_keyboard for button in row]
+
+
+def test_filtered_pages_with_longest_tier(monkeypatch):
+    longest = 'tier_' + 'x' * 59
+    monkeypatch.setitem(bot.SUBSCRIPTION_TIERS, longest, {'price': 999, 'odds': 99, 'name': 'Longest'})
+    tier = max(bot.SUBSCRIPTION_TIERS, key=len)
+    context = types.SimpleNamespace(args=[tier, '2d', 'verified'], user_data={})
+    created_at = time.time() - 3 * 86400
+
+    async def scenario():
+        for offset in range(bot.PENDING_PAGE_SIZE + 2):
+            await bot.storage.save_pending(LARGE_USER_ID - offset, {
+                'username': f'user{offset}', 'tier': tier, 'created_at': created_at + offset,
+                'confidence': 0.99,
+            })
+        calls = []
+        await bot.pending_command(_admin_update(calls), context)
+        first_page = calls[-1]
+        next_data = _buttons(first_page)[-1]
+
+        await bot.callbacks.dispatch(_admin_update(calls, next_data), context)
+        second_page = calls[-1]
+
+        approve_data = _buttons(second_page)[0]
+        await bot.callbacks.dispatch(_admin_update(calls, approve_data), context)
+        return first_page, second_page, calls[-2]
+
+    first_page, second_page, refreshed_text = asyncio.run(scenario())
+    for markup in (first_page, second_page):
+        assert all(len(data.encode()) <= bot.CallbackRouter.MAX_BYTES for data in _buttons(markup))
+    assert len(second_page.inline_keyboard) == 2 + 1  # the last two payments, then "Prev"
+    assert 'Longest' in refreshed_text
+    assert len(asyncio.run(bot.storage.page_pending(100))) == bot.PENDING_PAGE_SIZE + 1
@@ -0,0 +1,29 @@
+"""/reset_data followed by /pending on the in-memory backend."""
+import asyncio
+import time
+import types
+
+import bot
+
+
+def _admin_update(replies: list):
+    async def reply(text, **kwargs):
+        replies.append(text)
+
+    message = types.SimpleNamespace(reply_text=reply, reply_html=reply)
+    return types.SimpleNamespace(
+        effective_user=types.SimpleNamespace(id=999), message=message, callback_query=None,
+    )
+
+
+def test_pending_after_reset_data():
+    async def scenario():
+        await bot.storage.save_pending(42, {'username': 'alice', 'tier': 'tier1', 'created_at': time.time()})
+        replies = []
+        context = types.SimpleNamespace(args=[], user_data={})
+        await bot.reset_data_command(_admin_update(replies), context)
+        await bot.pending_command(_admin_update(replies), context)
+        return replies
+
+    replies = asyncio.run(scenario())
+    assert 'No Pending Payments' in replies[-1]